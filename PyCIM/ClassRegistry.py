@@ -0,0 +1,139 @@
+# Copyright (C) 2010-2011 Richard Lincoln
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+"""Resolved maps of element tag to CIM class and the associations between
+CIM classes.
+"""
+
+import importlib
+
+# Map of (packageMap id, tag base) to class registry.
+_registries = {}
+
+
+def class_registry(packageMap, nsURI=None):
+    """Returns the registry of CIM classes for the given package map.
+
+    Registries are cached, so repeated calls with the same package map and
+    namespace return the same registry.
+
+    @type packageMap: dict
+    @param packageMap: Map of class name to PyCIM package name (e.g.
+    CIM15.packageMap or CIM15.CDPSM.Balanced.packageMap).
+    @type nsURI: string
+    @param nsURI: CIM namespace URI. If given, the registry is keyed by
+    namespace qualified element tags
+    (e.g. {http://iec.ch/TC57/2010/CIM-schema-cim15#}Terminal), otherwise
+    by class name.
+    @rtype: ClassRegistry
+    @return: Map of element tag to CIM class.
+    """
+    base = "" if nsURI is None else "{%s#}" % nsURI
+    key = (id(packageMap), base)
+    try:
+        registry = _registries[key]
+    except KeyError:
+        pass
+    else:
+        # The registry holds a reference to the package map, so the id can
+        # not have been reused unless the map has been replaced.
+        if registry.packageMap is packageMap:
+            return registry
+
+    registry = _registries[key] = ClassRegistry(packageMap, base)
+    return registry
+
+
+class ClassRegistry(dict):
+    """Map of element tag to CIM class.
+
+    Classes are imported on first lookup and then kept in the map, so
+    resolving a tag costs a single dictionary lookup. Iteration only
+    covers the classes that have been resolved; call L{resolve_all} to
+    import every class in the package map.
+    """
+
+    def __init__(self, packageMap, base=""):
+        super(ClassRegistry, self).__init__()
+        #: Map of class name to PyCIM package name.
+        self.packageMap = packageMap
+        #: Prefix of the keys (e.g. {http://iec.ch/TC57/2010/CIM-schema-cim15#}).
+        self.base = base
+
+    def __missing__(self, tag):
+        base = self.base
+        if tag[:len(base)] != base:
+            raise KeyError(tag)
+        name = tag[len(base):]
+
+        # Raises KeyError for unknown classes.
+        mname = self.packageMap[name]
+
+        klass = getattr(importlib.import_module(mname), name)
+        self[tag] = klass
+        return klass
+
+    def resolve_all(self):
+        """Imports every class in the package map.
+        """
+        for name in self.packageMap:
+            self[self.base + name]
+        return self
+
+
+# Multiplicities of bidirectional associations, from the end of the
+# reference.
+ONE_TO_ONE, ONE_TO_MANY, MANY_TO_ONE, MANY_TO_MANY = range(4)
+
+
+def association_of(k, ref):
+    """Returns the (multiplicity, slot, inverse slot) of the given reference
+    of class k or None, if it has no inverse.
+
+    The association is not in the class tables, so it is derived from the
+    names used by the generated set or add method. For example,
+    Terminal.setConnectivityNode appends to '_Terminals' and
+    ConnectivityNode.addTerminals sets 'ConnectivityNode'.
+    """
+    slot = "_" + ref
+    if ref in k._many_refs:
+        method = k.__dict__.get("add" + ref)
+    else:
+        method = k.__dict__.get("set" + ref)
+    if method is None:
+        return None
+
+    names = method.__code__.co_names
+    inverse = [name for name in names if name[:1] == "_" and name != slot]
+
+    if ref not in k._many_refs:
+        if slot not in names or len(inverse) != 1:
+            return None
+        if "append" in names:
+            return ONE_TO_MANY, slot, inverse[0]
+        return ONE_TO_ONE, slot, inverse[0]
+
+    if slot in names:
+        if "append" in names and len(inverse) == 1:
+            return MANY_TO_MANY, slot, inverse[0]
+        return None
+    if len(names) == 1 and not inverse:
+        return MANY_TO_ONE, slot, "_" + names[0]
+    return None
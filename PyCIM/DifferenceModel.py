@@ -0,0 +1,338 @@
+# Copyright (C) 2010-2011 Richard Lincoln
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+"""Application of CIM difference models (IEC 61970-552) to parsed models.
+"""
+
+from time import time
+from uuid import uuid4
+
+import sys
+
+if sys.version_info[0] < 3:
+    from xml.etree.cElementTree import iterparse
+else:
+    from xml.etree.ElementTree import iterparse
+
+from PyCIM.ClassRegistry import class_registry
+from PyCIM.RDFXMLReader import get_cim_ns, get_rdf_ns, property_plan, \
+    ATTRIBUTE, ENUM, REFERENCE, MANY_REFERENCE, UNKNOWN, _RDF_NS
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Local names of the difference sets.
+FORWARD, REVERSE = "forwardDifferences", "reverseDifferences"
+
+# References of ChangeItem to the changed object, by class name.
+_CHANGED = ["PowerSystemResource", "Asset", "Document", "Location",
+            "Organisation", "NetworkDataSet"]
+
+
+def apply_difference(d, source, packageMap=None, nsURI=None, reverse=False,
+                     change_set=None):
+    """Applies a CIM difference model to a map of UUID to CIM object.
+
+    The statements of the reverse differences are removed and those of the
+    forward differences added, through the generated setters, so that both
+    ends of the associations stay consistent. Objects typed (e.g.
+    cim:Breaker rdf:about) in the reverse differences and not mentioned
+    in the forward differences are deleted, with all their references.
+    Objects typed in the forward differences that are not in the map are
+    created. Statements about existing objects may also be given by
+    rdf:Description elements.
+
+    The difference model is parsed incrementally and only the statements
+    are kept, so the time and memory used are proportional to the size of
+    the difference.
+
+    @type d: dict
+    @param d: Map of UUID to CIM object to update.
+    @type source: File-like object or a path to a file.
+    @param source: CIM RDF/XML difference model.
+    @param packageMap: Map of class name to PyCIM package name (see
+    L{cimread}).
+    @param nsURI: CIM namespace URI used in the difference model.
+    @type reverse: bool
+    @param reverse: Apply the difference backwards, adding the reverse and
+    removing the forward differences, e.g. to roll back a forward
+    application.
+    @type change_set: ChangeSet
+    @param change_set: If given, a ChangeItem of kind "add", "modify" or
+    "delete" is added to it for each changed object, in the order of
+    application. Items of objects still in the map are linked to them if
+    they are power system resources, assets, documents, locations,
+    organisations or network data sets. The items are not added to the
+    map.
+    @rtype: dict
+    @return: Map of the UUID of each changed object to the kind of change:
+    "add", "modify" or "delete".
+    """
+    t0 = time()
+
+    added, removed, packageMap, nsURI = \
+        _read_difference(source, packageMap, nsURI)
+    if reverse:
+        added, removed = removed, added
+
+    registry = class_registry(packageMap, nsURI)
+    base = "{%s#}" % nsURI
+    # Untyped statements (rdf:Description).
+    description = "{%s}Description" % _RDF_NS
+
+    mentioned = set(uuid for _, uuid, _ in added)
+    # Objects deleted, whatever the order of their statements.
+    deleting = set(uuid for tag, uuid, _ in removed
+                   if tag != description and uuid not in mentioned)
+
+    changes = {}
+    deleted = []
+    for tag, uuid, properties in removed:
+        if uuid in deleting:
+            if uuid not in changes:
+                changes[uuid] = "delete"
+                deleted.append(uuid)
+            continue
+
+        obj = d.get(uuid)
+        if obj is None:
+            logger.error("Missing '%s' object with uuid: %s",
+                         tag[len(base):], uuid)
+            continue
+        changes[uuid] = "modify"
+        _remove(d, obj, property_plan(obj.__class__, base), properties)
+
+    for uuid in deleted:
+        obj = d.pop(uuid, None)
+        if obj is None:
+            logger.error("Missing object to delete with uuid: %s", uuid)
+            del changes[uuid]
+        else:
+            _unlink(obj)
+
+    for tag, uuid, properties in added:
+        obj = d.get(uuid)
+        if obj is None:
+            try:
+                klass = registry[tag]
+            except KeyError:
+                logger.error("Unable to create '%s' object with uuid: %s",
+                             tag[len(base):], uuid)
+                continue
+            obj = d[uuid] = klass(UUID=uuid)
+            changes[uuid] = "add"
+        elif uuid not in changes:
+            changes[uuid] = "modify"
+        _add(d, obj, property_plan(obj.__class__, base), properties)
+
+    if change_set is not None:
+        _record(change_set, registry, base, d, changes)
+
+    logger.info("Applied difference to %d objects in %.2fs.",
+                len(changes), time() - t0)
+
+    return changes
+
+
+def _read_difference(source, packageMap, nsURI):
+    """Returns the (tag, uuid, properties) statements of the forward and
+    reverse differences of the given difference model, and the package
+    map and namespace of the CIM version used.
+    """
+    if bool(nsURI) != bool(packageMap):
+        raise ValueError(
+                'Either pass "packageMap" AND "nsURI" or none of them.')
+
+    context = iter(iterparse(source, ("start", "end", "start-ns")))
+
+    namespaces = {}
+    for event, elem in context:
+        if event == "start-ns":
+            prefix, ns = elem
+            namespaces[prefix] = ns
+        elif event == "start":
+            break
+
+    get_rdf_ns(namespaces) # warns if undeclared
+    if (nsURI is None) and (packageMap is None):
+        nsURI, packageMap = get_cim_ns(namespaces)
+
+    ns_rdf = namespaces.get("rdf", _RDF_NS)
+    ID = "{%s}ID" % ns_rdf
+    ABOUT = "{%s}about" % ns_rdf
+    RESOURCE = "{%s}resource" % ns_rdf
+
+    differences = {FORWARD: [], REVERSE: []}
+    # Statements of the difference set being read.
+    statements = None
+    section = None
+    depth = 0
+    for event, elem in context:
+        if event == "start-ns":
+            continue # declared by the elements of the difference
+        elif event == "start":
+            depth += 1
+            if statements is None and \
+                    elem.tag.rsplit("}", 1)[-1] in differences:
+                statements = differences[elem.tag.rsplit("}", 1)[-1]]
+                section = elem
+                level = depth
+            continue
+
+        if statements is not None:
+            if depth == level + 1:
+                uuid = elem.get(ID)
+                if uuid is None:
+                    uuid = elem.get(ABOUT, "#")[1:]
+                if uuid:
+                    statements.append((elem.tag, uuid,
+                        [(e.tag, e.text, e.get(RESOURCE)) for e in elem]))
+                section.clear()
+            elif depth == level:
+                statements = None
+        depth -= 1
+
+    return differences[FORWARD], differences[REVERSE], packageMap, nsURI
+
+
+def _value(d, obj, entry, text, resource):
+    """Returns the value of the given property element for obj or None, if
+    the property is unknown or the referenced object is missing.
+    """
+    kind, attr, func = entry
+    if kind == UNKNOWN:
+        logger.error(func)
+        return None
+
+    if resource is None:
+        if kind != ATTRIBUTE:
+            return None
+        try:
+            return func(text)
+        except TypeError:
+            return None
+        except ValueError:
+            logger.error("'%s' has invalid value for attribute '%s'",
+                         obj.__class__.__name__, attr)
+            return None
+
+    if resource[:1] != "#":
+        return resource.rsplit(".", 1)[1] if kind == ENUM else None
+
+    if kind != REFERENCE and kind != MANY_REFERENCE:
+        return None
+    try:
+        return d[resource[1:]]
+    except KeyError:
+        logger.error("Referenced '%s' [%s] object missing.",
+                     obj.__class__.__name__, resource[1:])
+        return None
+
+
+def _remove(d, obj, plan, properties):
+    """Removes the given property statements from obj. Attributes are reset
+    to their defaults.
+    """
+    for tag, text, resource in properties:
+        entry = plan[tag]
+        kind, attr, _ = entry
+        value = _value(d, obj, entry, text, resource)
+        if value is None:
+            continue
+
+        if kind == REFERENCE:
+            if getattr(obj, attr) is value:
+                setattr(obj, attr, None)
+        elif kind == MANY_REFERENCE:
+            if value in getattr(obj, attr):
+                getattr(obj, "remove" + attr)(value)
+        else:
+            setattr(obj, attr, _default(obj.__class__, attr))
+
+
+def _add(d, obj, plan, properties):
+    """Adds the given property statements to obj. References replace those
+    of single valued references.
+    """
+    for tag, text, resource in properties:
+        entry = plan[tag]
+        kind, attr, func = entry
+        value = _value(d, obj, entry, text, resource)
+        if value is None:
+            continue
+
+        if kind == MANY_REFERENCE:
+            if value not in getattr(obj, attr):
+                func(obj, value)
+        elif kind != REFERENCE or getattr(obj, attr) is not value:
+            setattr(obj, attr, value)
+
+
+def _unlink(obj):
+    """Removes all references of the given object, and those to it.
+    """
+    for k in obj.__class__.__mro__:
+        many_refs = k.__dict__.get("_many_refs", ())
+        for ref in k.__dict__.get("_refs", ()):
+            if ref in many_refs:
+                values = getattr(obj, ref)
+                if not values:
+                    continue
+                remove = getattr(obj, "remove" + ref, None)
+                if remove is None:
+                    setattr(obj, ref, [])
+                else:
+                    remove(*list(values))
+            elif getattr(obj, ref) is not None:
+                setattr(obj, ref, None)
+
+
+def _default(klass, attr):
+    """Returns the default value of the given attribute of klass.
+    """
+    for k in klass.__mro__:
+        defaults = k.__dict__.get("_defaults")
+        if defaults is not None and attr in defaults:
+            return defaults[attr]
+    return None
+
+
+def _record(change_set, registry, base, d, changes):
+    """Adds a ChangeItem for each of the given changes to change_set.
+    """
+    try:
+        klass = registry[base + "ChangeItem"]
+    except KeyError:
+        raise ValueError("No ChangeItem class in the package map.")
+
+    n = len(change_set.ChangeItems)
+    for i, (uuid, kind) in enumerate(changes.items()):
+        item = klass(sequenceNumber=n + i, kind=kind,
+                     UUID="_" + uuid4().hex)
+        item.ChangeSet = change_set
+
+        obj = d.get(uuid)
+        if obj is None:
+            continue
+        names = set(k.__name__ for k in obj.__class__.__mro__)
+        for ref in _CHANGED:
+            if ref in names:
+                setattr(item, ref, obj)
+                break
@@ -0,0 +1,386 @@
+# Copyright (C) 2010-2011 Richard Lincoln
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+"""Disk cache of parsed CIM models.
+"""
+
+import gc
+import hashlib
+import importlib
+import logging
+import marshal
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Version of the snapshot format.
+_FORMAT = 1
+
+# File name suffix of the snapshots.
+_SUFFIX = ".cim"
+
+# Kinds of snapshot columns.
+_VALUE, _REFERENCE, _MANY_REFERENCE = range(3)
+
+# Class tables that define the attributes and references of instances.
+_TABLES = ("_attrs", "_attr_types", "_defaults", "_enums", "_refs",
+           "_many_refs")
+
+
+class ModelCache(object):
+    """Size bounded cache of parsed models on disk.
+
+    Models are stored as snapshots keyed by the content of the file they
+    were read from and the arguments that affect the result. A snapshot
+    holds the index of the classes, the uuids, a column per instance
+    attribute of each class and the references as lists of object
+    indices, so a model is rebuilt without parsing or calling the setters.
+
+    Snapshots are invalidated when the tables or the instance attributes
+    of their classes change. Once the total size of the snapshots exceeds
+    the maximum, the least recently used are removed.
+    """
+
+    def __init__(self, directory, max_size=4 << 30):
+        """Initialises a new 'ModelCache' instance.
+
+        @type directory: string
+        @param directory: Directory of the snapshots. It is created if it
+        does not exist.
+        @type max_size: int
+        @param max_size: Maximum total size of the snapshots in bytes.
+        """
+        self.directory = directory
+        self.max_size = max_size
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def key(self, path, packageMap=None, nsURI=None, options=None):
+        """Returns the key of the model read from the file at the given
+        path with the given package map, namespace and other options.
+        """
+        h = hashlib.sha1()
+        f = open(path, "rb")
+        try:
+            while True:
+                data = f.read(1 << 20)
+                if not data:
+                    break
+                h.update(data)
+        finally:
+            f.close()
+
+        if packageMap is not None:
+            packageMap = sorted(packageMap.items())
+        h.update(repr((packageMap, nsURI, options)).encode("utf-8"))
+        return h.hexdigest()
+
+    def load(self, key):
+        """Returns the map of UUID to CIM object stored under the given key
+        or None, if there is no valid snapshot.
+        """
+        path = self.path(key)
+        try:
+            f = open(path, "rb")
+        except (IOError, OSError):
+            return None
+        # All objects created are kept, so collecting is wasted effort.
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            try:
+                snapshot = marshal.load(f)
+            except (EOFError, ValueError, TypeError):
+                snapshot = None
+            finally:
+                f.close()
+
+            d = None
+            if isinstance(snapshot, tuple) and snapshot[:1] == (_FORMAT,):
+                try:
+                    d = _restore(snapshot)
+                except (ValueError, TypeError, IndexError, KeyError,
+                        AttributeError):
+                    # Malformed snapshot.
+                    d = None
+        finally:
+            if enabled:
+                gc.enable()
+
+        if d is None:
+            logger.info("Discarding invalid snapshot: %s", path)
+            self.remove(key)
+            return None
+
+        # Mark the snapshot as recently used.
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return d
+
+    def store(self, key, d):
+        """Stores the given map of UUID to CIM object under the given key
+        and evicts the least recently used snapshots. Models that can not
+        be stored, e.g. with references to objects that are not in the
+        map, or written, e.g. to a full disk, are skipped. Other errors are
+        raised.
+
+        Returns True if the model has been stored.
+        """
+        # The snapshot is freed by reference counting.
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            snapshot = _snapshot(d)
+        except ValueError as e:
+            logger.info("Unable to cache model: %s", e)
+            return False
+        finally:
+            if enabled:
+                gc.enable()
+
+        fd, tmp = tempfile.mkstemp(_SUFFIX + ".tmp", dir=self.directory)
+        try:
+            f = os.fdopen(fd, "wb")
+            try:
+                marshal.dump(snapshot, f)
+            finally:
+                f.close()
+            _replace(tmp, self.path(key))
+        except ValueError as e:
+            # Values of types marshal does not support.
+            logger.info("Unable to cache model: %s", e)
+            return False
+        except (IOError, OSError) as e:
+            logger.warning("Unable to cache model: %s", e)
+            return False
+        finally:
+            # Left unless moved to the snapshot path.
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+        self.evict()
+        return True
+
+    def remove(self, key):
+        """Removes the snapshot stored under the given key, if any.
+        """
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        """Removes all snapshots.
+        """
+        for path, _, _ in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def evict(self):
+        """Removes the least recently used snapshots until their total
+        size does not exceed the maximum.
+        """
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            logger.debug("Evicted snapshot: %s", path)
+
+    def entries(self):
+        """Returns the (path, size, time of last use) of each snapshot.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, st.st_size, st.st_mtime))
+        return entries
+
+    def path(self, key):
+        """Returns the path of the snapshot stored under the given key.
+        """
+        return os.path.join(self.directory, key + _SUFFIX)
+
+
+_replace = getattr(os, "replace", os.rename)
+
+
+# Map of class to (instance attribute names, column kinds).
+_schemas = {}
+
+
+def _schema(klass):
+    """Returns the names of the instance attributes of the given class and
+    whether each holds a value, a reference or a list of references.
+    """
+    try:
+        return _schemas[klass]
+    except KeyError:
+        pass
+
+    refs = set()
+    many_refs = set()
+    for k in klass.__mro__:
+        refs.update(k.__dict__.get("_refs", ()))
+        many_refs.update(k.__dict__.get("_many_refs", ()))
+
+    names = tuple(klass().__dict__)
+    kinds = []
+    for name in names:
+        if name[:1] == "_" and name[1:] in many_refs:
+            kinds.append(_MANY_REFERENCE)
+        elif name[:1] == "_" and name[1:] in refs:
+            kinds.append(_REFERENCE)
+        else:
+            kinds.append(_VALUE)
+
+    schema = _schemas[klass] = (names, tuple(kinds))
+    return schema
+
+
+def _metadata_hash(klasses):
+    """Returns the hash of the tables and instance attributes of the given
+    classes.
+    """
+    h = hashlib.sha1(str(_FORMAT).encode("ascii"))
+    for klass in klasses:
+        tables = [(k.__module__, k.__name__,
+                   [k.__dict__.get(table) for table in _TABLES])
+                  for k in klass.__mro__]
+        h.update(repr((_schema(klass), tables)).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _snapshot(d):
+    """Returns the snapshot of the given map of UUID to CIM object. Raises
+    ValueError if the model can not be stored.
+    """
+    # Map of object id to position.
+    index = {}
+    for i, obj in enumerate(d.values()):
+        index[id(obj)] = i
+    if len(index) != len(d):
+        raise ValueError("objects mapped to more than one uuid")
+
+    # Map of class to position.
+    positions = {}
+    klasses = []
+    # Class position of each object.
+    classes = []
+    # Columns of the instance attributes of each class. Lists of references
+    # are mapped by row, if not empty.
+    columns = []
+    # Number of objects of each class.
+    rows = []
+
+    for obj in d.values():
+        klass = obj.__class__
+        try:
+            c = positions[klass]
+        except KeyError:
+            c = positions[klass] = len(klasses)
+            klasses.append(klass)
+            columns.append([{} if kind == _MANY_REFERENCE else []
+                            for kind in _schema(klass)[1]])
+            rows.append(0)
+        classes.append(c)
+        row = rows[c]
+        rows[c] += 1
+
+        values = obj.__dict__
+
+        names, kinds = _schema(klass)
+        if len(values) != len(names):
+            raise ValueError("'%s' has other attributes than its class" %
+                             klass.__name__)
+        try:
+            for name, kind, column in zip(names, kinds, columns[c]):
+                value = values[name]
+                if kind == _VALUE:
+                    column.append(value)
+                elif kind == _REFERENCE:
+                    column.append(-1 if value is None else index[id(value)])
+                elif value:
+                    column[row] = [index[id(val)] for val in value]
+        except KeyError:
+            raise ValueError("'%s' [%s] references an object that is not "
+                             "in the model" % (klass.__name__, obj.UUID))
+
+    return (_FORMAT, _metadata_hash(klasses),
+            [(k.__module__, k.__name__) for k in klasses],
+            list(d.keys()), classes, columns)
+
+
+def _restore(snapshot):
+    """Returns the map of UUID to CIM object of the given snapshot or None,
+    if the classes have changed.
+    """
+    _, digest, names, uuids, classes, columns = snapshot
+
+    try:
+        klasses = [getattr(importlib.import_module(module), name)
+                   for module, name in names]
+    except (ImportError, AttributeError):
+        return None
+    if _metadata_hash(klasses) != digest:
+        return None
+
+    # Create the objects without initialising them.
+    objects = []
+    instances = [[] for _ in klasses]
+    for c in classes:
+        klass = klasses[c]
+        obj = klass.__new__(klass)
+        objects.append(obj)
+        instances[c].append(obj)
+
+    for klass, objs, cols in zip(klasses, instances, columns):
+        names, kinds = _schema(klass)
+        for j, kind in enumerate(kinds):
+            if kind == _REFERENCE:
+                cols[j] = [None if i < 0 else objects[i] for i in cols[j]]
+            elif kind == _MANY_REFERENCE:
+                col = [[] for _ in objs]
+                for row, refs in cols[j].items():
+                    col[row] = [objects[i] for i in refs]
+                cols[j] = col
+        for obj, row in zip(objs, zip(*cols)):
+            obj.__dict__ = dict(zip(names, row))
+
+    return dict(zip(uuids, objects))
@@ -18,7 +18,12 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 # IN THE SOFTWARE.
 
-from xml.etree.cElementTree import parse, tostring
+import sys
+
+if sys.version_info[0] < 3:
+    from xml.etree.cElementTree import parse, tostring
+else:
+    from xml.etree.ElementTree import parse, tostring
 
 def xmlpp(source):
     root = parse(source).getroot()
@@ -21,18 +21,59 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 # IN THE SOFTWARE.
 
-from xml.etree.cElementTree import iterparse
+from collections import namedtuple
+from io import BytesIO
+from multiprocessing import Pool, cpu_count
 from time import time
+from xml.parsers import expat
+
+import bz2
+import gzip
+import importlib
+import mmap
+import os
+import pkgutil
+import re
+import sys
+import zipfile
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+if sys.version_info[0] < 3:
+    from xml.etree.cElementTree import iterparse
+    XMLPullParser = None
+else:
+    from xml.etree.ElementTree import iterparse, XMLPullParser
+    from sys import intern
+
+from PyCIM.ClassRegistry import class_registry, association_of, \
+    ONE_TO_ONE, ONE_TO_MANY, MANY_TO_ONE, MANY_TO_MANY
+from PyCIM.ModelCache import ModelCache
 
 import logging
 logger = logging.getLogger(__name__)
 
 
-def cimread(source, packageMap=None, nsURI=None, start_dict=None):
+def cimread(source, packageMap=None, nsURI=None, start_dict=None,
+            single_pass=False, processes=None, parser="etree",
+            bulk_link=False, include_classes=None, exclude_classes=None,
+            include_attributes=None, cache=None, placeholders=False,
+            stats=None, progress=None, progress_interval=1.0,
+            memory_map=False, issues=None):
     """ CIM RDF/XML parser.
 
     @type source: File-like object or a path to a file.
-    @param source: CIM RDF/XML file.
+    @param source: CIM RDF/XML file. Paths to gzip, bzip2 and xz
+    compressed files are decompressed while parsing. All XML members of
+    a zip archive are read as one model.
     @type profile: dict
     @param packageMap: Map of class name to PyCIM package name. All CIM
     classes are under the one namespace, but are arranged into sub-packages
@@ -42,6 +83,77 @@ def cimread(source, packageMap=None, nsURI=None, start_dict=None):
     @type profile: string
     @param nsURI: CIM namespace URI used in the RDF/XML file. For example:
     http://iec.ch/TC57/2010/CIM-schema-cim15
+    @type start_dict: dict
+    @param start_dict: Map of UUID to CIM object to which the parsed objects
+    are added.
+    @type single_pass: bool
+    @param single_pass: Parse the file only once. Objects are created on
+    first sight and references to objects that have not been seen yet are
+    queued and resolved once the whole file has been read. The default
+    two pass mode requires a seekable source or a path. Compressed files
+    are always parsed in a single pass.
+    @type processes: int
+    @param processes: If set, the file is split at the boundaries between
+    the top-level elements and the chunks are parsed by the given number
+    of worker processes. The objects are then instantiated and linked in
+    this process. The source must be a path. The result is identical to
+    that of the default two pass mode.
+    @type parser: string
+    @param parser: XML parser backend: "etree" (xml.etree.ElementTree,
+    the default), "expat" (a pyexpat handler that does not build any
+    elements) or "lxml" (requires lxml to be installed).
+    @type bulk_link: bool
+    @param bulk_link: Link the objects by writing the private attributes
+    of both ends of each reference directly, using the inverse
+    association of the generated setters. This avoids the duplicate
+    checks of the setters, which scan the list of the inverse end and
+    make loading quadratic in the number of objects referencing the same
+    object. Many-to-many links are only checked against those made by
+    the reader.
+    @type include_classes: list
+    @param include_classes: Classes, or class names, of the objects to
+    read. Subclasses are included, e.g. "Switch" includes breakers. The
+    elements of other classes are skipped without instantiating them and
+    references to them are dropped. Defaults to all classes.
+    @type exclude_classes: list
+    @param exclude_classes: Classes, or class names, of the objects not to
+    read, including their subclasses.
+    @type include_attributes: dict
+    @param include_attributes: Map of class, or class name, to the names of
+    the attributes and references to set on its instances. Those of all
+    other classes are set in full.
+    @type cache: ModelCache or string
+    @param cache: Cache, or path of the cache directory, of the models read
+    from files. If the source is a path and no objects are given in
+    start_dict, the model is rebuilt from the snapshot stored for the
+    content of the file, the package map, the namespace and the
+    projection, if any. Otherwise it is read and stored. The cache is not
+    used with placeholders.
+    @type placeholders: bool
+    @param placeholders: Map the uuids of referenced objects that are
+    neither in the file nor in start_dict to placeholders, instances of
+    the class at the other end of the association, and link those. Objects
+    that are only described (rdf:about) become placeholders of the class
+    of the description. Placeholders in start_dict are filled in place
+    when a later read meets their objects, so profiles may be read one at
+    a time in any order. See L{unresolved}.
+    @type stats: ReaderStats
+    @param stats: Filled in with the phase durations, throughput, object
+    counts and missing references of the read.
+    @param progress: Function called with the statistics about every
+    progress_interval seconds while the file is read, and once at the end.
+    Statistics are collected if it is given, even without stats.
+    @type progress_interval: float
+    @param progress_interval: Seconds between calls of progress.
+    @type memory_map: bool
+    @param memory_map: Map the file into memory and feed slices of the
+    map to the parser, instead of reading it through a buffered file.
+    Worker processes map the same file and share its pages. Ignored for
+    file-like objects and compressed files.
+    @type issues: ReaderIssues
+    @param issues: Filled in with the missing references, unknown classes
+    and attributes and invalid values met by the read. A single summary
+    of them is logged at the end. Reads from the cache have no issues.
     @rtype: dict
     @return: Map of UUID to CIM object.
 
@@ -50,177 +162,2265 @@ def cimread(source, packageMap=None, nsURI=None, start_dict=None):
     # Start the clock.
     t0 = time()
 
+    if progress is not None and stats is None:
+        stats = ReaderStats()
+    if stats is not None:
+        stats._start(source, progress, progress_interval)
+    # Map of class to number of objects read, if counted.
+    counts = {} if stats is not None else None
+    if issues is None:
+        issues = ReaderIssues()
+    issues._clear()
+
     #logger.info('##########################################################################')
     logger.info('START of parsing file \"%s\"', source)
-    logger_errors_grouped = {}
 
     # A map of uuids to CIM objects to be returned.
     d = start_dict if start_dict is not None else {}
 
-    # Obtain the namespaces from the input file
-    namespaces = xmlns(source)
-    ns_rdf = get_rdf_ns(namespaces)
+    projection = _projection(include_classes, exclude_classes,
+                             include_attributes)
+
+    key = None
+    if cache is not None and placeholders:
+        # Snapshots only hold the generated attributes, so the placeholders
+        # would come back as ordinary objects.
+        logger.warning("The cache is not used when reading with "
+                       "placeholders.")
+        cache = None
+    if cache is not None and not d and not hasattr(source, "read"):
+        if stats is not None:
+            stats._phase("cache")
+        if not isinstance(cache, ModelCache):
+            cache = ModelCache(cache)
+        options = projection.key if projection is not None else None
+        key = cache.key(source, packageMap, nsURI, options)
+
+        cached = cache.load(key)
+        if cached is not None:
+            d.update(cached)
+            logger.info('Loaded %d CIM objects from the cache in %.2fs.',
+                        len(d), time() - t0)
+            logger.info('END of parsing file \"%s\"\n' % source)
+            if stats is not None:
+                stats._finish(cached, None, issues)
+            return d
+
+    if processes is not None:
+        _read_chunked(source, packageMap, nsURI, d, processes, parser,
+                      bulk_link, projection, placeholders, stats, counts,
+                      memory_map, issues)
+    else:
+        if stats is not None:
+            stats._phase("namespaces")
+
+        stream = source
+        if memory_map and not hasattr(source, "read") and \
+                _compression(source) is None:
+            # Unmapped once the parsers have released it.
+            stream = _map_file(source)
+            if stats is not None:
+                stats.expected = _count_elements(stream)
+
+        elements, packageMap, nsURI, compressed = \
+            _open(stream, packageMap, nsURI, parser)
+
+        # Avoid decompressing the file twice.
+        single_pass = single_pass or compressed
+
+        builder = _ModelBuilder(d, packageMap, nsURI, defer=single_pass,
+                                bulk_link=bulk_link, projection=projection,
+                                placeholders=placeholders)
+        builder.counts = counts
+        builder.issues = issues
+
+        if single_pass:
+            if stats is not None:
+                stats._phase("read")
+                elements = stats._track(elements, timed=True)
+            for tag, uuid, about, properties in elements:
+                if not about:
+                    obj = builder.instantiate(tag, uuid)
+                    if obj is None and uuid in builder.mismatched:
+                        continue
+                    if builder.queued:
+                        builder.resolve(uuid, obj)
+                builder.populate(tag, uuid, about, properties)
+        else:
+            if stats is not None:
+                stats._phase("instantiate")
+                elements = stats._track(elements)
+            # First pass instantiates the classes.
+            for tag, uuid, about, properties in elements:
+                if not about:
+                    builder.instantiate(tag, uuid)
+
+            if stats is not None:
+                stats._phase("link")
+
+            # Reset stream
+            if hasattr(stream, "seek"):
+                stream.seek(0)
+
+            ## Second pass sets attributes and references.
+            elements = _elements(stream, parser)
+            next(elements) # namespaces
+
+            if stats is not None:
+                elements = stats._track(elements, timed=True)
+            mismatched = builder.mismatched
+            for tag, uuid, about, properties in elements:
+                if mismatched and not about and uuid in mismatched:
+                    continue
+                builder.populate(tag, uuid, about, properties)
+
+        if stats is not None:
+            stats._phase("finish")
+        builder.finish()
+
+    issues._log()
+
+    # logging_message = 'Created totally %d CIM objects in %.2fs.' %(len(d), time() - t0)
+    logger.info('Created totally %d CIM objects in %.2fs.' %(len(d), time() - t0))
+
+    if key is not None:
+        if stats is not None:
+            stats._phase("store")
+        cache.store(key, d)
+
+    if stats is not None:
+        stats._finish(d, counts, issues)
+
+    # logging_message = 'END of parsing file \"%s\"\n' % source
+    logger.info('END of parsing file \"%s\"\n' % source)
+
+    return d
+
+
+#: Record of a CIM RDF/XML element. The attributes are converted to the
+#: attribute types of the class and references map to the uuid, or list of
+#: uuids, of the referenced objects. About is True for rdf:about elements
+#: that describe an object defined elsewhere.
+CIMRecord = namedtuple("CIMRecord", "uuid klass attributes references about")
+
+
+def cimiter(source, packageMap=None, nsURI=None, start_dict=None, raw=False,
+            parser="etree", bulk_link=False, include_classes=None,
+            exclude_classes=None, include_attributes=None, issues=None):
+    """Iterates over the CIM objects in a CIM RDF/XML file.
+
+    The file is parsed once and the elements are discarded as soon as they
+    have been processed.
+
+    With raw set, a L{CIMRecord} is yielded as each element closes and no
+    objects are constructed, so memory use does not grow with the size of
+    the model.
+
+    Otherwise objects are yielded once their attributes are set and all of
+    their references have been resolved. Objects with references to
+    objects further on in the file are held back until those objects have
+    been read, so they remain in memory for the window of unresolved
+    references. The map of uuid to object needed to resolve references is
+    kept for the whole file though. Objects that are still referencing
+    missing objects are yielded at the end. Descriptions (rdf:about) of an
+    object may update it after it has been yielded.
+
+    @type source: File-like object or a path to a file.
+    @param source: CIM RDF/XML file, which may be compressed (see
+    L{cimread}).
+    @param packageMap: Map of class name to PyCIM package name.
+    @param nsURI: CIM namespace URI used in the RDF/XML file.
+    @type start_dict: dict
+    @param start_dict: Map of UUID to CIM object against which references
+    are resolved and to which the objects are added.
+    @type raw: bool
+    @param raw: Yield records instead of objects.
+    @type parser: string
+    @param parser: XML parser backend (see L{cimread}).
+    @type bulk_link: bool
+    @param bulk_link: Link the objects directly (see L{cimread}).
+    @param include_classes: Classes to read (see L{cimread}).
+    @param exclude_classes: Classes not to read (see L{cimread}).
+    @param include_attributes: Map of class to the names of the attributes
+    and references to set (see L{cimread}).
+    @type issues: ReaderIssues
+    @param issues: Filled in with the issues met (see L{cimread}), once
+    the iteration is complete.
+    @rtype: generator
+    @return: CIM objects or records.
+    """
+    d = start_dict if start_dict is not None else {}
+
+    elements, packageMap, nsURI, _ = _open(source, packageMap, nsURI, parser)
+
+    builder = _ModelBuilder(d, packageMap, nsURI, defer=True,
+                            bulk_link=bulk_link,
+                            projection=_projection(include_classes,
+                                                   exclude_classes,
+                                                   include_attributes))
+    if issues is not None:
+        issues._clear()
+        builder.issues = issues
+
+    if raw:
+        # Bound the values shared, so memory use does not grow either.
+        builder.values = _ValueCache(1 << 16)
+        for tag, uuid, about, properties in elements:
+            record = builder.record(tag, uuid, about, properties)
+            if record is not None:
+                yield record
+        builder.finish()
+        builder.issues._log()
+        return
+
+    # Map of object to the number of its references that are unresolved.
+    held = {}
+    ready = []
+    for element in elements:
+        builder.emit(element, held, ready)
+        if ready:
+            for obj in ready:
+                yield obj
+            del ready[:]
+
+    builder.finish()
+    builder.issues._log()
+
+    for obj in held:
+        yield obj
+
+
+class CIMFeedParser(object):
+    """Incremental CIM RDF/XML parser, fed with chunks of the document as
+    they are received, e.g. by an asyncio coroutine::
+
+        parser = CIMFeedParser()
+        while True:
+            data = await reader.read(1 << 16)
+            if not data:
+                break
+            parser.feed(data)
+            for obj in parser.read_objects():
+                ...
+        d = parser.close()
+
+    Objects are built as by L{cimiter}: each is returned by L{read_objects}
+    once its attributes are set and all of its references have been
+    resolved, and those still referencing missing objects once the parser
+    has been closed. A call of L{feed} only parses the given chunk, so
+    receiving the document overlaps with reading it.
+    """
+
+    def __init__(self, packageMap=None, nsURI=None, start_dict=None,
+                 parser="expat", bulk_link=False, include_classes=None,
+                 exclude_classes=None, include_attributes=None,
+                 placeholders=False):
+        """Initialises a new 'CIMFeedParser' instance.
+
+        @param packageMap: Map of class name to PyCIM package name.
+        Defaults to that of the CIM namespace declared in the document.
+        @param nsURI: CIM namespace URI used in the document.
+        @type start_dict: dict
+        @param start_dict: Map of UUID to CIM object against which
+        references are resolved and to which the objects are added.
+        @type parser: string
+        @param parser: XML parser backend: "expat" (the default), "etree"
+        (xml.etree.ElementTree.XMLPullParser) or "lxml".
+        @param bulk_link: Link the objects directly (see L{cimread}).
+        @param include_classes: Classes to read (see L{cimread}).
+        @param exclude_classes: Classes not to read (see L{cimread}).
+        @param include_attributes: Map of class to the names of the
+        attributes and references to set (see L{cimread}).
+        @param placeholders: Create placeholders for missing objects (see
+        L{cimread}).
+        """
+        if bool(nsURI) != bool(packageMap):
+            raise ValueError(
+                    'Either pass "packageMap" AND "nsURI" or none of them.')
+
+        #: Map of UUID to CIM object.
+        self.d = start_dict if start_dict is not None else {}
+        self.packageMap = packageMap
+        self.nsURI = nsURI
+
+        self._handler = _feed_handler(parser)
+        self._options = {"bulk_link": bulk_link,
+                         "projection": _projection(include_classes,
+                                                   exclude_classes,
+                                                   include_attributes),
+                         "placeholders": placeholders}
+        # Created once the root element has been read.
+        self._builder = None
+        # Map of object to the number of its references that are
+        # unresolved.
+        self._held = {}
+        # Objects completed since last read.
+        self._ready = []
+        self._closed = False
+        #: Issues met so far (see L{cimread}).
+        self.issues = ReaderIssues()
+
+    def feed(self, data):
+        """Parses the given chunk of the document.
+        """
+        if self._closed:
+            raise ValueError("feed() called after close()")
+        self._handler.feed(data)
+        self._build()
+
+    def read_objects(self):
+        """Returns the objects completed since the last call.
+        """
+        ready = self._ready
+        self._ready = []
+        return ready
+
+    def close(self):
+        """Ends the document, reports the references to objects that have
+        not been read as missing and returns the map of UUID to CIM object.
+        The objects held back for them are then returned by
+        L{read_objects}.
+        """
+        if not self._closed:
+            self._closed = True
+            self._handler.feed(b"", True)
+            self._build()
+            if self._builder is None:
+                raise ValueError("No rdf:RDF root element")
+            self._builder.finish()
+            self.issues._log()
+            self._ready.extend(self._held)
+            self._held = {}
+        return self.d
+
+    def _build(self):
+        handler = self._handler
+        builder = self._builder
+        if builder is None:
+            if not handler.root:
+                return
+            self.packageMap, self.nsURI = _cim_version(
+                handler.namespaces, self.packageMap, self.nsURI)
+            builder = self._builder = _ModelBuilder(
+                self.d, self.packageMap, self.nsURI, defer=True,
+                **self._options)
+            builder.issues = self.issues
+
+        elements = handler.elements
+        if elements:
+            emit = builder.emit
+            held = self._held
+            ready = self._ready
+            for element in elements:
+                emit(element, held, ready)
+            del elements[:]
+
+
+def cimread_many(sources, packageMap=None, nsURI=None, start_dict=None,
+                 processes=None, parser="etree", bulk_link=False,
+                 include_classes=None, exclude_classes=None,
+                 include_attributes=None, placeholders=False, issues=None):
+    """Reads several CIM RDF/XML files, typically the profiles of one
+    model, into a single map of UUID to CIM object.
+
+    The files are parsed into L{CIMRecord}s in parallel by a pool of worker
+    processes. The parent process then instantiates the objects of all
+    files and, in a single link phase, sets their attributes and
+    references. References between files (e.g. from the terminals in an
+    equipment profile to the connectivity nodes in a connectivity profile)
+    are therefore resolved.
+
+    Objects described in several files must be instances of classes that
+    have the properties of all those files, so use the package map of the
+    full CIM (the default) rather than those of the individual profiles.
+
+    @type sources: list
+    @param sources: Paths to CIM RDF/XML files or (path, packageMap, nsURI)
+    tuples, for files of different profiles. The files may be compressed
+    (see L{cimread}).
+    @param packageMap: Map of class name to PyCIM package name for files
+    given by path only.
+    @param nsURI: CIM namespace URI for files given by path only.
+    @type start_dict: dict
+    @param start_dict: Map of UUID to CIM object to which the parsed objects
+    are added.
+    @type processes: int
+    @param processes: Number of worker processes. Defaults to the number of
+    CPUs. The files are read in this process if set to 1.
+    @type parser: string
+    @param parser: XML parser backend (see L{cimread}).
+    @type bulk_link: bool
+    @param bulk_link: Link the objects directly (see L{cimread}).
+    @param include_classes: Classes to read (see L{cimread}).
+    @param exclude_classes: Classes not to read (see L{cimread}).
+    @param include_attributes: Map of class to the names of the attributes
+    and references to set (see L{cimread}).
+    @type placeholders: bool
+    @param placeholders: Create placeholders for the objects referenced
+    but not read (see L{cimread}).
+    @type issues: ReaderIssues
+    @param issues: Filled in with the issues met in all files (see
+    L{cimread}).
+    @rtype: dict
+    @return: Map of UUID to CIM object.
+    """
+    t0 = time()
+
+    if issues is None:
+        issues = ReaderIssues()
+    issues._clear()
+
+    projection = _projection(include_classes, exclude_classes,
+                             include_attributes)
+
+    tasks = []
+    for source in sources:
+        if isinstance(source, tuple):
+            tasks.append(source + (parser, projection))
+        else:
+            tasks.append((source, packageMap, nsURI, parser, projection))
+
+    results = _map(_read_records, tasks, processes)
+
+    t1 = time()
+
+    d = start_dict if start_dict is not None else {}
+
+    batches = []
+    skipped = set()
+    for task, (nsURI, records, uuids, found) in zip(tasks, results):
+        packageMap = task[1]
+        if packageMap is None:
+            nsURI, packageMap = get_cim_ns({"cim": nsURI})
+        batches.append((packageMap, nsURI, records))
+        skipped.update(uuids)
+        issues._update(found)
+
+    _build(d, batches, bulk_link, projection, skipped, placeholders,
+           issues=issues)
+    issues._log()
+
+    logger.info("Created totally %d CIM objects from %d files in %.2fs "
+                "(%.2fs parsing).", len(d), len(tasks), time() - t0, t1 - t0)
+
+    return d
+
+
+class ReaderStats(object):
+    """Statistics of a read of a CIM RDF/XML file, filled in by L{cimread}.
+
+    The phases of a read are "namespaces" (opening the file up to the root
+    element), "instantiate" and "link" (the two passes over the file) or
+    "read" (single pass), "finish" (reporting queued references) and, with
+    processes, "parse" and "build". Reads from the cache have a "cache"
+    phase and stores a "store" phase.
+    """
+
+    def __init__(self):
+        #: Name of the current phase or None, once the read is complete.
+        self.phase = None
+        #: Map of phase name to duration in seconds.
+        self.phases = {}
+        #: Size of the file read in bytes or None, for file-like objects.
+        self.bytes = None
+        #: Number of top-level elements of the file.
+        self.elements = None
+        #: Number of top-level elements processed in the current phase.
+        self.done = 0
+        #: Number of top-level elements counted by a scan of the bytes of
+        #: memory mapped files before parsing, or None.
+        self.expected = None
+        #: Number of objects read.
+        self.objects = 0
+        #: Map of class name to number of objects read.
+        self.classes = {}
+        #: Map of element name to seconds spent processing the elements of
+        #: that name in the link, or read, phase.
+        self.class_times = {}
+        #: Map of (class name, reference) to number of missing objects.
+        self.missing = {}
+        #: Issues met by the read.
+        self.issues = None
+        #: Peak resident set size of the process in bytes or None, if not
+        #: available.
+        self.peak_rss = None
+        #: Duration of the read in seconds.
+        self.time = 0.0
+
+        self._t0 = None
+        self._t = None
+        self._progress = None
+        self._interval = 1.0
+
+    @property
+    def bytes_per_second(self):
+        """Bytes of the file read per second.
+        """
+        if self.bytes is None or not self.time:
+            return None
+        return self.bytes / self.time
+
+    @property
+    def elements_per_second(self):
+        """Top-level elements read per second.
+        """
+        if self.elements is None or not self.time:
+            return None
+        return self.elements / self.time
+
+    def _start(self, source, progress, interval):
+        self.__init__()
+        if not hasattr(source, "read"):
+            try:
+                self.bytes = os.path.getsize(source)
+            except (OSError, TypeError):
+                pass
+        self._progress = progress
+        self._interval = interval
+        self._t0 = self._t = time()
+
+    def _phase(self, name):
+        """Ends the current phase and starts the given one.
+        """
+        t = time()
+        if self.phase is not None:
+            self.phases[self.phase] = \
+                self.phases.get(self.phase, 0.0) + t - self._t
+        self.phase = name
+        self.done = 0
+        self._t = t
+
+    def _track(self, elements, timed=False):
+        """Yields the given elements, counting them, calling the progress
+        function and, if timed, timing their processing by tag.
+        """
+        progress = self._progress
+        times = self.class_times
+        due = time() + self._interval
+        n = 0
+        for element in elements:
+            if timed:
+                t = time()
+                yield element
+                tag = element[0]
+                times[tag] = times.get(tag, 0.0) + time() - t
+            else:
+                yield element
+            n += 1
+            if not n & 0xfff:
+                self.done = n
+                if progress is not None and time() >= due:
+                    self.time = time() - self._t0
+                    progress(self)
+                    due = time() + self._interval
+        self.done = n
+        if self.elements is None:
+            self.elements = n
+
+    def _finish(self, d, counts, issues):
+        """Ends the read of the given objects, counted by class in counts
+        or, if None, all of d, with the given issues.
+        """
+        self._phase(None)
+        self.time = time() - self._t0
+
+        if counts is None:
+            counts = {}
+            for obj in d.values():
+                klass = obj.__class__
+                counts[klass] = counts.get(klass, 0) + 1
+        for klass, n in counts.items():
+            name = klass.__name__
+            self.classes[name] = self.classes.get(name, 0) + n
+        self.objects = sum(counts.values())
+        self.missing = issues.missing()
+        self.issues = issues
+        self.class_times = dict((tag.rsplit("}", 1)[-1], t)
+                                for tag, t in self.class_times.items())
+        self.peak_rss = _peak_rss()
+
+        if self._progress is not None:
+            self._progress(self)
+
+
+# Kinds of issues.
+MISSING_REFERENCE = "missing reference"
+MISSING_OBJECT = "missing object"
+UNKNOWN_CLASS = "unknown class"
+UNKNOWN_ATTRIBUTE = "unknown attribute"
+INVALID_VALUE = "invalid value"
+CLASS_MISMATCH = "class mismatch"
+
+#: Issue met by a read: the kind of issue, the names of the class and of the
+#: attribute or reference concerned (None for issues of whole objects), the
+#: number of occurrences and the uuids of the first occurrences.
+ReaderIssue = namedtuple("ReaderIssue", "kind klass name count samples")
+
+
+class ReaderIssues(object):
+    """Index of the issues met by a read of CIM RDF/XML files, filled in by
+    L{cimread}, grouped by kind, class name and attribute name.
+
+    The kinds of issues are L{MISSING_REFERENCE} (references to objects
+    that have not been read, with the uuids of the referenced objects as
+    samples), L{MISSING_OBJECT} (descriptions, rdf:about, of objects that
+    have not been read), L{UNKNOWN_CLASS} (elements of classes that are
+    not in the package map), L{UNKNOWN_ATTRIBUTE} (properties that the
+    class does not have), L{INVALID_VALUE} (attribute text that does
+    not convert to the attribute type) and L{CLASS_MISMATCH} (objects
+    whose class is not that of their placeholder, nor a subclass of it,
+    which are not read). The samples of the other kinds are
+    the uuids of the objects concerned.
+
+    Issues are only counted while reading and formatted once the read is
+    complete, so that reading dirty files does not slow down.
+    """
+
+    def __init__(self, samples=5):
+        """Initialises a new 'ReaderIssues' instance.
+
+        @type samples: int
+        @param samples: Maximum number of uuids kept for each issue.
+        """
+        self.samples = samples
+        # Map of (kind, class name, name) to [count, samples].
+        self._index = {}
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        """Yields the L{ReaderIssue}s, the most frequent first.
+        """
+        items = sorted(self._index.items(),
+                       key=lambda item: (-item[1][0], item[0]))
+        for (kind, klass, name), (count, samples) in items:
+            yield ReaderIssue(kind, klass, name, count, list(samples))
+
+    def count(self, kind=None):
+        """Returns the number of occurrences of the issues of the given
+        kind or, if None, of all issues.
+        """
+        return sum(issue[0] for key, issue in self._index.items()
+                   if kind is None or key[0] == kind)
+
+    def missing(self):
+        """Returns the map of (class name, reference) to number of missing
+        objects.
+        """
+        return dict(((klass, name), issue[0])
+                    for (kind, klass, name), issue in self._index.items()
+                    if kind == MISSING_REFERENCE)
+
+    def summary(self, limit=3):
+        """Returns a one line summary of the issues, with the given number
+        of the most frequent.
+        """
+        kinds = {}
+        for (kind, _, _), issue in self._index.items():
+            kinds[kind] = kinds.get(kind, 0) + issue[0]
+        counts = ", ".join("%d %s" % (n, kind)
+                           for kind, n in sorted(kinds.items()))
+
+        frequent = []
+        for issue in self:
+            if len(frequent) == limit:
+                break
+            name = issue.klass if issue.name is None else \
+                "%s.%s" % (issue.klass, issue.name)
+            frequent.append("%s %s: %d (e.g. %s)" % (issue.kind, name,
+                            issue.count, issue.samples[0]))
+
+        return "%d issues (%s); most frequent: %s" % (
+            self.count(), counts, "; ".join(frequent))
+
+    def _add(self, kind, klass, name, uuid):
+        key = (kind, klass, name)
+        try:
+            issue = self._index[key]
+        except KeyError:
+            issue = self._index[key] = [0, []]
+        issue[0] += 1
+        if issue[0] <= self.samples:
+            issue[1].append(uuid)
+
+    def _update(self, other):
+        """Adds the issues of the given index.
+        """
+        for key, (count, samples) in other._index.items():
+            try:
+                issue = self._index[key]
+            except KeyError:
+                issue = self._index[key] = [0, []]
+            issue[0] += count
+            issue[1].extend(samples[:self.samples - len(issue[1])])
+
+    def _clear(self):
+        self._index.clear()
+
+    def _log(self):
+        """Logs the summary of the issues, if any.
+        """
+        if self._index:
+            logger.warning(self.summary())
+
+
+def _peak_rss():
+    """Returns the peak resident set size of the process in bytes or None,
+    if not available.
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes, except on macOS.
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _map(func, tasks, processes=None):
+    """Returns the results of func for each task, computed by a pool of
+    the given number of worker processes.
+    """
+    if processes is None:
+        processes = cpu_count()
+    processes = min(processes, len(tasks))
+
+    if processes <= 1:
+        return [func(task) for task in tasks]
+
+    pool = Pool(processes)
+    try:
+        return pool.map(func, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _build(d, batches, bulk_link=False, projection=None, skipped=(),
+           placeholders=False, counts=None, issues=None):
+    """Instantiates and links the objects of the given (packageMap, nsURI,
+    records) batches. References to the objects with the given skipped
+    uuids are dropped. The objects created are counted by class in counts
+    and the issues met added to issues, if given.
+    """
+    # Instantiate the objects of all batches before linking, so that
+    # references between them can be resolved.
+    if issues is None:
+        issues = ReaderIssues()
+    fill = bool(d)
+    # Set of uuids of the objects that do not match their placeholders.
+    mismatched = set()
+    for packageMap, nsURI, records in batches:
+        for record in records:
+            if record.about:
+                continue
+            if counts is not None:
+                counts[record.klass] = counts.get(record.klass, 0) + 1
+            if fill:
+                obj = d.get(record.uuid)
+                if getattr(obj, "_placeholder", False):
+                    if not _fill(obj, record.klass):
+                        issues._add(CLASS_MISMATCH, record.klass.__name__,
+                                    None, record.uuid)
+                        mismatched.add(record.uuid)
+                    continue
+            d[record.uuid] = record.klass(UUID=record.uuid)
+
+    linked = set()
+    for packageMap, nsURI, records in batches:
+        builder = _ModelBuilder(d, packageMap, nsURI, bulk_link=bulk_link,
+                                projection=projection,
+                                placeholders=placeholders)
+        builder.linked = linked
+        builder.skipped = skipped
+        builder.issues = issues
+        for record in records:
+            if mismatched and not record.about and \
+                    record.uuid in mismatched:
+                continue
+            builder.apply(record)
+        builder.finish()
+
+
+def _read_chunked(path, packageMap, nsURI, d, processes, parser, bulk_link,
+                  projection, placeholders=False, stats=None, counts=None,
+                  memory_map=False, issues=None):
+    """Reads the file at the given path by splitting it into chunks that
+    are parsed into records by worker processes, which read or, if
+    memory_map is set, map their chunk of the file. The issues met are
+    added to issues (see L{_build}).
+    """
+    if _compression(path) is not None:
+        raise ValueError("Compressed files can not be read in chunks.")
+
+    if stats is not None:
+        stats._phase("parse")
+
+    data = _map_file(path)
+    head, tail, spans = _split(data, 4 * processes if processes > 1 else 1)
+    if stats is not None:
+        stats.expected = _count_elements(data)
+    del data
+
+    _, packageMap, nsURI = \
+        _start(BytesIO(head + tail), packageMap, nsURI, parser)
+
+    tasks = [(path, head, start, end, tail, packageMap, nsURI, parser,
+              projection, memory_map) for start, end in spans]
+    results = _map(_read_chunk, tasks, processes)
+
+    if issues is None:
+        issues = ReaderIssues()
+    skipped = set()
+    for _, _, uuids, found in results:
+        skipped.update(uuids)
+        issues._update(found)
+
+    if stats is not None:
+        stats.elements = sum(len(records) + len(uuids)
+                             for _, records, uuids, _ in results)
+        stats._phase("build")
+
+    _build(d, [(packageMap, nsURI, records) for _, records, _, _ in results],
+           bulk_link, projection, skipped, placeholders, counts, issues)
+
+
+def _read_chunk(task):
+    """Returns the CIM namespace URI, records, skipped uuids and issues of
+    the given (path, head, start, end, tail, packageMap, nsURI, parser,
+    projection, memory_map) chunk task.
+    """
+    path, head, start, end, tail, packageMap, nsURI, parser, projection, \
+        memory_map = task
+
+    if memory_map:
+        # The chunk is parsed from a view of the map, without copying it.
+        source = [head, memoryview(_map_file(path))[start:end], tail]
+    else:
+        f = open(path, "rb")
+        try:
+            f.seek(start)
+            data = f.read(end - start)
+        finally:
+            f.close()
+        source = BytesIO(head + data + tail)
+
+    return _read_records((source, packageMap, nsURI, parser, projection))
+
+
+# Start tag of the root element.
+_ROOT = re.compile(br"<([\w.-]+:)?RDF[\s/>]")
+
+# Declaration of the RDF namespace prefix.
+_RDF_PREFIX = re.compile(
+    br"xmlns:([\w.-]+)\s*=\s*[\"']http://www.w3.org/1999/02/22-rdf-syntax-ns#")
+
+# Attributes of a start tag before the one looked for, each followed by
+# white space.
+_ATTRIBUTES = br"(?:[^\s<>=/]+\s*=\s*(?:\"[^\"]*\"|'[^']*')\s+)*"
+
+
+def _map_file(path):
+    """Returns a read-only memory map of the file at the given path.
+    """
+    f = open(path, "rb")
+    try:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError("No rdf:RDF root element in %s" % path)
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        f.close()
+
+
+def _scan(data):
+    """Scans the bytes of the given RDF/XML document, e.g. a memory map,
+    for its root element.
+
+    Returns the XML declaration and root start tag, the root end tag, the
+    offsets of the content of the root element and the pattern of the
+    start tags of top-level elements, which, unlike property elements,
+    have an rdf:ID or rdf:about attribute, in any position. The pattern is
+    None if the root element is empty.
+    """
+    match = _ROOT.search(data, 0, 1 << 16)
+    if match is None:
+        raise ValueError("No rdf:RDF root element")
+    start = data.find(b">", match.start()) + 1
+    head = data[:start]
+    if head.endswith(b"/>"):
+        return head, b"", start, start, None
+
+    match = _RDF_PREFIX.search(head)
+    prefix = match.group(1) if match is not None else b"rdf"
+    element = re.compile(br"<[^\s<>/!?]+\s+" + _ATTRIBUTES +
+                         re.escape(prefix) + br":(?:ID|about)\s*=")
+
+    end = data.rfind(b"</", max(start, len(data) - (1 << 16)))
+    if end < 0:
+        raise ValueError("No rdf:RDF end tag")
+    return head, data[end:], start, end, element
+
+
+def _split(source, n):
+    """Splits the RDF/XML file at the given path, or memory map, into at
+    most n chunks of about equal size. Chunk boundaries are found by
+    scanning the bytes for the start tag of a top-level element.
+
+    Returns the XML declaration and root start tag, the root end tag and
+    the list of (start, end) offsets of the chunks.
+    """
+    data = source if isinstance(source, mmap.mmap) else _map_file(source)
+
+    head, tail, start, end, element = _scan(data)
+    if element is None:
+        return head, tail, []
+
+    spans = []
+    pos = start
+    for k in range(1, n):
+        target = start + (end - start) * k // n
+        if target <= pos:
+            continue
+        match = element.search(data, target, end)
+        if match is None:
+            break
+        spans.append((pos, match.start()))
+        pos = match.start()
+    spans.append((pos, end))
+
+    return head, tail, spans
+
+
+def _count_elements(data):
+    """Returns the number of top-level elements of the RDF/XML document in
+    the given memory map, counted by scanning its bytes.
+    """
+    _, _, start, end, element = _scan(data)
+    if element is None:
+        return 0
+
+    n = 0
+    for _ in element.finditer(data, start, end):
+        n += 1
+    return n
+
+
+def _read_records(task):
+    """Returns the CIM namespace URI used, the list of L{CIMRecord}s, the
+    set of skipped uuids and the L{ReaderIssues} of the given (source,
+    packageMap, nsURI, parser, projection) task.
+    """
+    source, packageMap, nsURI, parser, projection = task
+
+    elements, packageMap, nsURI, _ = _open(source, packageMap, nsURI, parser)
+
+    builder = _ModelBuilder(None, packageMap, nsURI, projection=projection)
+    record = builder.record
+
+    records = []
+    for tag, uuid, about, properties in elements:
+        r = record(tag, uuid, about, properties)
+        if r is not None:
+            records.append(r)
+    builder.finish()
+
+    return nsURI, records, builder.skipped, builder.issues
+
+
+def _open(source, packageMap, nsURI, parser="etree"):
+    """Starts parsing the given source, which may be a compressed file or
+    zip archive, and returns the iterator over the elements of all its
+    documents, the package map and namespace of the CIM version used and
+    whether the source is compressed.
+    """
+    compression = _compression(source)
+    if compression is None:
+        elements, packageMap, nsURI = _start(source, packageMap, nsURI, parser)
+        return elements, packageMap, nsURI, False
+
+    streams = _decompress(source, compression)
+    for stream in streams:
+        elements, packageMap, nsURI = _start(stream, packageMap, nsURI, parser)
+        break
+    else:
+        raise ValueError("No XML documents in %s" % source)
+
+    return _chain(elements, streams, packageMap, nsURI, parser), \
+        packageMap, nsURI, True
+
+
+def _chain(elements, streams, packageMap, nsURI, parser):
+    """Yields the given elements, followed by those of the remaining
+    streams.
+    """
+    for element in elements:
+        yield element
+
+    for stream in streams:
+        elements, _, _ = _start(stream, packageMap, nsURI, parser)
+        for element in elements:
+            yield element
+
+
+# Leading bytes of compressed files.
+_MAGIC = [
+    ("gzip", b"\x1f\x8b"),
+    ("bz2", b"BZh"),
+    ("xz", b"\xfd7zXZ\x00"),
+    ("zip", b"PK\x03\x04"),
+]
+
+
+def _compression(source):
+    """Returns the compression ("gzip", "bz2", "xz" or "zip") of the file
+    at the given path or None, if not compressed or not a path.
+    """
+    if hasattr(source, "read") or isinstance(source, list):
+        return None
+
+    f = open(source, "rb")
+    try:
+        magic = f.read(6)
+    finally:
+        f.close()
+
+    for compression, prefix in _MAGIC:
+        if magic.startswith(prefix):
+            return compression
+    return None
+
+
+def _decompress(path, compression):
+    """Yields a decompressing file object for each XML document in the
+    compressed file or zip archive at the given path. Each is closed when
+    the next is requested.
+    """
+    if compression == "zip":
+        archive = zipfile.ZipFile(path)
+        try:
+            for info in archive.infolist():
+                if info.filename.lower().endswith(".xml"):
+                    f = archive.open(info)
+                    try:
+                        yield f
+                    finally:
+                        f.close()
+        finally:
+            archive.close()
+        return
+
+    if compression == "gzip":
+        f = gzip.open(path, "rb")
+    elif compression == "bz2":
+        f = bz2.BZ2File(path, "rb")
+    elif lzma is not None:
+        f = lzma.open(path, "rb")
+    else:
+        raise ImportError("Reading xz files requires the lzma module.")
+
+    try:
+        yield f
+    finally:
+        f.close()
+
+
+def _start(source, packageMap, nsURI, parser="etree"):
+    """Starts parsing the given source with the named parser backend and
+    returns the element iterator and the package map and namespace of the
+    CIM version used.
+    """
     if bool(nsURI) != bool(packageMap):
         raise ValueError(
                 'Either pass "packageMap" AND "nsURI" or none of them.')
-    elif (nsURI is None) and (packageMap is None):
+
+    # Obtain the namespaces while reading up to the root element
+    # ({http://www.w3.org/1999/02/22-rdf-syntax-ns#}RDF).
+    elements = _elements(source, parser)
+    namespaces = next(elements)
+
+    packageMap, nsURI = _cim_version(namespaces, packageMap, nsURI)
+    return elements, packageMap, nsURI
+
+
+def _cim_version(namespaces, packageMap, nsURI):
+    """Returns the given package map and namespace or, if None, those of
+    the CIM version of the given namespace declarations.
+    """
+    get_rdf_ns(namespaces) # warns if undeclared
+    if (nsURI is None) and (packageMap is None):
         nsURI, packageMap = get_cim_ns(namespaces)
+    return packageMap, nsURI
+
+
+# The RDF namespace, if not declared.
+_RDF_NS = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+
+
+def _parser(name):
+    """Returns the element iterator function of the named parser backend.
+
+    Backends take a path or file-like object and return an iterator that
+    yields the map of prefix to namespace declared on the root element,
+    followed by a (tag, uuid, about, properties) tuple for every child of
+    the root element, where properties is a list of (tag, text, resource)
+    tuples. Tags are in ElementTree notation ({namespace}name).
+    """
+    try:
+        return _PARSERS[name]
+    except KeyError:
+        raise ValueError("Unknown parser '%s'. Use one of: %s." %
+                         (name, ", ".join(sorted(_PARSERS))))
+
+
+def _elements(source, parser):
+    """Returns the element iterator of the named parser backend for the
+    given source (see L{_parser}). Memory maps and lists of buffers, e.g.
+    views of memory maps, are fed to the parser without copying them.
+    """
+    if isinstance(source, mmap.mmap):
+        return _buffer_elements([memoryview(source)], parser)
+    if isinstance(source, list):
+        return _buffer_elements(source, parser)
+    return _parser(parser)(source)
+
+
+def _buffer_elements(buffers, parser, size=1 << 14):
+    """Feeds the document made of the given buffers to the named parser
+    backend in slices of the given size. Larger slices leave more elements
+    alive between the events read, which makes the garbage collector run
+    more often.
+    """
+    handler = _feed_handler(parser)
+    elements = handler.elements
+
+    started = False
+    for data in _slices(buffers, size):
+        handler.feed(data, not data)
+
+        if not started and (handler.root or not data):
+            started = True
+            yield handler.namespaces
+
+        if elements:
+            for element in elements:
+                yield element
+            del elements[:]
+
+
+def _slices(buffers, size):
+    """Yields the given buffers in slices of the given size, followed by an
+    empty slice. Buffers are removed from the list once sliced, so that
+    they can be released as the document is read.
+    """
+    buffers.reverse()
+    while buffers:
+        buf = buffers.pop()
+        for pos in range(0, len(buf), size):
+            yield buf[pos:pos + size]
+        del buf
+    yield b""
+
+
+def _etree_elements(source):
+    """Parses the source using xml.etree.ElementTree.iterparse.
+    """
+    return _iterelements(iterparse(source, ("start", "end", "start-ns")))
+
+
+def _lxml_elements(source):
+    """Parses the source using lxml.etree.iterparse.
+    """
+    try:
+        from lxml.etree import iterparse as lxml_iterparse
+    except ImportError:
+        raise ImportError("The lxml parser requires lxml to be installed.")
+
+    # lxml reads bytes only.
+    if hasattr(source, "read") and not isinstance(source.read(0), bytes):
+        source = BytesIO(source.read().encode("utf-8"))
+
+    return _iterelements(lxml_iterparse(source, ("start", "end", "start-ns"),
+                                        remove_comments=True, remove_pis=True,
+                                        huge_tree=True))
 
-    # CIM element tag base (e.g. {http://iec.ch/TC57/2009/CIM-schema-cim14#}).
-    base = "{%s#}" % nsURI
-    # Length of element tag base.
-    m = len(base)
 
-    # First pass instantiates the classes.
-    context = iterparse(source, ("start", "end"))
+def _iterelements(context):
+    """Yields the namespaces and element tuples from the given iterparse
+    event iterator. The children of the root element are cleared as they
+    are consumed to minimise memory usage.
+    """
+    namespaces = {}
+    root = None
 
     # Turn it into an iterator (required for cElementTree).
     context = iter(context)
 
-    # Get the root element ({http://www.w3.org/1999/02/22-rdf-syntax-ns#}RDF).
-    _, root = next(context)
+    for event, elem in context:
+        if event == "start-ns":
+            prefix, ns = elem
+            namespaces[prefix] = ns
+        elif event == "start":
+            root = elem
+            break
+
+    yield namespaces
 
+    if root is None:
+        return
+
+    ns_rdf = namespaces.get("rdf", _RDF_NS)
+    ID = "{%s}ID" % ns_rdf
+    ABOUT = "{%s}about" % ns_rdf
+    RESOURCE = "{%s}resource" % ns_rdf
+
+    depth = 1
     for event, elem in context:
-        # Process 'end' elements in the CIM namespace.
-        if event == "end" and elem.tag[:m] == base:
-
-            # Unique resource identifier for the CIM object.
-            uuid = elem.get("{%s}ID" % ns_rdf)
-            if uuid is not None: # class
-                # Element tag without namespace (e.g. VoltageLevel).
-                tag = elem.tag[m:]
-                try:
-                    mname = packageMap[tag]
-                except KeyError:
-                    logger.error("Unable to locate module for: %s (%s)",
-                                 tag, uuid)
-                    root.clear()
-                    continue
-                # Import the module for the CIM object.
-                module = __import__(mname, globals(), locals(), [tag], 0)
-                # Get the CIM class from the module.
-                klass = getattr(module, tag)
+        if event == "start":
+            depth += 1
+            continue
+        elif event != "end": # namespaces declared by the children
+            continue
+
+        depth -= 1
+        if depth != 1:
+            continue
+
+        about = False
+        uuid = elem.get(ID)
+        if uuid is None:
+            uuid = elem.get(ABOUT)
+            if uuid is not None:
+                uuid = uuid[1:]
+                about = True
 
-                # Instantiate the class and map it to the uuid.
-                d[uuid] = klass(UUID=uuid)
+        if uuid is not None:
+            yield elem.tag, uuid, about, \
+                [(e.tag, e.text, e.get(RESOURCE)) for e in elem]
 
         # Clear children of the root element to minimise memory usage.
         root.clear()
 
-    # Reset stream
-    if hasattr(source, "seek"):
-        source.seek(0)
 
-    ## Second pass sets attributes and references.
-    context = iter( iterparse(source, ("start", "end")) )
+def _expat_elements(source, size=1 << 16):
+    """Parses the source using a pyexpat handler, which collects the
+    element tuples without building any elements.
+    """
+    if not hasattr(source, "read"):
+        f = open(source, "rb")
+        try:
+            for item in _expat_elements(f, size):
+                yield item
+        finally:
+            f.close()
+        return
+
+    parser = expat.ParserCreate(namespace_separator="}")
+    parser.buffer_text = True
+    handler = _ExpatHandler(parser)
+    elements = handler.elements
 
-    # Get the root element ({http://www.w3.org/1999/02/22-rdf-syntax-ns#}RDF).
-    _, root = next(context)
+    read = source.read
+    parse = parser.Parse
+    started = False
+    while True:
+        data = read(size)
+        parse(data, not data)
 
-    for event, elem in context:
-        # Process 'start' elements in the CIM namespace.
-        if event == "start" and elem.tag[:m] == base:
-            uuid = elem.get("{%s}ID" % ns_rdf)
+        if not started and (handler.root or not data):
+            started = True
+            yield handler.namespaces
+
+        if elements:
+            for element in elements:
+                yield element
+            del elements[:]
+
+        if not data:
+            break
+
+
+class _ExpatHandler(object):
+    """Collects the element tuples of the children of the root element
+    from the events of a namespace processing pyexpat parser.
+    """
+
+    def __init__(self, parser):
+        self.parser = parser
+        # Map of prefix to namespace declared before the root element.
+        self.namespaces = {}
+        # Element tuples collected since last consumed.
+        self.elements = []
+        # Whether the root element has been started.
+        self.root = False
+        self.depth = 0
+        # Map of expanded name (namespace}name) to tag ({namespace}name).
+        self.tags = {}
+        # Top-level element being read.
+        self.element = None
+        # Tag and resource of the property element being read.
+        self.property = None
+        # Text of the property element being read.
+        self.text = []
+        # Whether a child of the property element has been started, as
+        # ElementTree keeps the text before the first child only.
+        self.nested = False
+
+        parser.StartNamespaceDeclHandler = self.start_ns
+        parser.StartElementHandler = self.start
+        parser.EndElementHandler = self.end
+        parser.CharacterDataHandler = self.data
+
+    def feed(self, data, final=False):
+        self.parser.Parse(data, final)
+
+    def tag(self, name):
+        try:
+            return self.tags[name]
+        except KeyError:
+            tag = self.tags[name] = "{" + name if "}" in name else name
+            return tag
+
+    def start_ns(self, prefix, uri):
+        if not self.root:
+            self.namespaces[prefix or ""] = uri
+
+    def start(self, name, attrs):
+        depth = self.depth = self.depth + 1
+
+        if depth == 3:
+            self.property = self.tag(name), attrs.get(self.RESOURCE)
+            self.text = []
+            self.nested = False
+
+        elif depth == 2:
+            uuid = attrs.get(self.ID)
+            if uuid is not None:
+                self.element = (self.tag(name), uuid, False, [])
+            else:
+                uuid = attrs.get(self.ABOUT)
+                if uuid is not None:
+                    self.element = (self.tag(name), uuid[1:], True, [])
+
+        elif depth == 1:
+            self.root = True
+            ns_rdf = self.namespaces.get("rdf", _RDF_NS)
+            self.ID = ns_rdf + "}ID"
+            self.ABOUT = ns_rdf + "}about"
+            self.RESOURCE = ns_rdf + "}resource"
+
+        else:
+            self.nested = True
+
+    def end(self, name):
+        depth = self.depth
+        self.depth = depth - 1
+
+        if depth == 3:
+            if self.element is not None:
+                tag, resource = self.property
+                self.element[3].append(
+                    (tag, "".join(self.text) or None, resource))
+
+        elif depth == 2:
+            if self.element is not None:
+                self.elements.append(self.element)
+                self.element = None
+
+    def data(self, text):
+        if self.depth == 3 and not self.nested:
+            self.text.append(text)
+
+
+class _PullHandler(object):
+    """Collects the element tuples of the children of the root element
+    from the events of an ElementTree, or lxml, XMLPullParser.
+    """
+
+    def __init__(self, parser_class):
+        self.parser = parser_class(events=("start", "end", "start-ns"))
+        # Map of prefix to namespace declared before the root element.
+        self.namespaces = {}
+        # Element tuples collected since last consumed.
+        self.elements = []
+        # Whether the root element has been started.
+        self.root = False
+        self.depth = 0
+        # Root element, cleared as its children are consumed.
+        self.rdf = None
+
+    def feed(self, data, final=False):
+        parser = self.parser
+        parser.feed(data)
+        if final:
+            parser.close()
+
+        for event, elem in parser.read_events():
+            if event == "start":
+                self.depth += 1
+                if not self.root:
+                    self.root = True
+                    self.rdf = elem
+                    ns_rdf = self.namespaces.get("rdf", _RDF_NS)
+                    self.ID = "{%s}ID" % ns_rdf
+                    self.ABOUT = "{%s}about" % ns_rdf
+                    self.RESOURCE = "{%s}resource" % ns_rdf
+                continue
+
+            if event == "start-ns":
+                if not self.root:
+                    prefix, ns = elem
+                    self.namespaces[prefix or ""] = ns
+                continue
+
+            self.depth -= 1
+            if self.depth != 1:
+                continue
+
+            about = False
+            uuid = elem.get(self.ID)
             if uuid is None:
-                uuid = elem.get("{%s}about" % ns_rdf)
+                uuid = elem.get(self.ABOUT)
                 if uuid is not None:
                     uuid = uuid[1:]
+                    about = True
+
             if uuid is not None:
-                # Locate the CIM object using the uuid.
+                RESOURCE = self.RESOURCE
+                self.elements.append((elem.tag, uuid, about,
+                    [(e.tag, e.text, e.get(RESOURCE)) for e in elem]))
+
+            # Clear children of the root element to minimise memory usage.
+            self.rdf.clear()
+
+
+def _feed_handler(name):
+    """Returns a handler of the named parser backend that is fed with
+    chunks of a document and collects the namespaces and element tuples
+    (see L{_parser}).
+    """
+    if name == "expat":
+        parser = expat.ParserCreate(namespace_separator="}")
+        parser.buffer_text = True
+        return _ExpatHandler(parser)
+
+    if name == "etree":
+        if XMLPullParser is None:
+            raise ImportError("The etree feed parser requires Python 3.")
+        return _PullHandler(XMLPullParser)
+
+    if name == "lxml":
+        try:
+            from lxml.etree import XMLPullParser as LXMLPullParser
+        except ImportError:
+            raise ImportError("The lxml parser requires lxml to be "
+                              "installed.")
+        return _PullHandler(LXMLPullParser)
+
+    raise ValueError("Unknown parser '%s'. Use one of: %s." %
+                     (name, ", ".join(sorted(_PARSERS))))
+
+
+# Map of name to parser backend.
+_PARSERS = {
+    "etree": _etree_elements,
+    "expat": _expat_elements,
+    "lxml": _lxml_elements,
+}
+
+
+class _ModelBuilder(object):
+    """Instantiates CIM objects and sets their attributes and references
+    from the (tag, uuid, about, properties) tuples of the RDF/XML elements.
+
+    If references are deferred, references to objects that have not been
+    instantiated yet and descriptions (rdf:about) of such objects are
+    queued by uuid until L{resolve} is called for the object. Those still
+    queued are reported as missing by L{finish}.
+
+    With bulk linking, references are set by L{link} instead of the
+    generated setters.
+
+    Elements of classes rejected by the projection are skipped and their
+    uuids recorded, so that references to them are dropped silently.
+
+    With placeholders, references to, and descriptions of, objects that are
+    missing once all references have been resolved create placeholders
+    of the class at the other end of the association, or of the
+    description. Placeholders already in the map are filled in place by
+    L{instantiate}.
+    """
+
+    def __init__(self, d, packageMap, nsURI, defer=False, bulk_link=False,
+                 projection=None, placeholders=False):
+        self.d = d
+        # Map of element tag to CIM class.
+        self.registry = class_registry(packageMap, nsURI)
+        # CIM element tag base (e.g. {http://iec.ch/TC57/2009/CIM-schema-cim14#}).
+        self.base = "{%s#}" % nsURI
+        # Length of element tag base.
+        self.m = len(self.base)
+        self.defer = defer
+        # Map of target uuid to the object and plan entry of each queued
+        # reference.
+        self.references = {}
+        # Map of uuid to the tag and properties of each description of
+        # objects that have not been instantiated yet.
+        self.descriptions = {}
+        # Number of queued references and descriptions.
+        self.queued = 0
+        # Map of class to property plan.
+        self.plans = {}
+        self.bulk_link = bulk_link
+        # Set of (id, slot, id) of the many-to-many links made.
+        self.linked = set()
+        self.projection = projection
+        # Set of uuids of the elements skipped by the projection.
+        self.skipped = set()
+        self.placeholders = placeholders
+        # Number of placeholders created.
+        self.created = 0
+        # Placeholders can only be in a map given with objects.
+        self.fill = bool(d)
+        # Set of uuids of the objects that do not match their placeholders.
+        self.mismatched = set()
+        # Map of class to number of objects read, if counted.
+        self.counts = None
+        # Attribute values and enumeration literals read, so that equal
+        # values are one object.
+        self.values = _ValueCache()
+        self.literals = _Literals()
+        self.issues = ReaderIssues()
+
+    def instantiate(self, tag, uuid):
+        """Instantiates the class for the given element tag and maps it to
+        the given uuid.
+        """
+        try:
+            klass = self.registry[tag]
+        except KeyError:
+            # Ignore elements that are not in the CIM namespace.
+            if tag[:self.m] == self.base:
+                self.issues._add(UNKNOWN_CLASS, tag[self.m:], None, uuid)
+            return None
+
+        if self.projection is not None and \
+                not self.projection.accepts(klass):
+            self.skipped.add(uuid)
+            return None
+
+        if self.counts is not None:
+            self.counts[klass] = self.counts.get(klass, 0) + 1
+
+        if self.fill:
+            obj = self.d.get(uuid)
+            if getattr(obj, "_placeholder", False):
+                if _fill(obj, klass):
+                    return obj
+                self.issues._add(CLASS_MISMATCH, klass.__name__, None, uuid)
+                self.mismatched.add(uuid)
+                return None
+
+        # Instantiate the class and map it to the uuid.
+        obj = self.d[uuid] = klass(UUID=uuid)
+        return obj
+
+    def emit(self, element, held, ready):
+        """Reads the given element tuple and appends the objects that have
+        been completed, with all their references resolved, to ready.
+        Objects with unresolved references are held in the given map of
+        object to the number of those references.
+        """
+        tag, uuid, about, properties = element
+        if about:
+            self.populate(tag, uuid, about, properties)
+            return
+
+        obj = self.instantiate(tag, uuid)
+        if obj is None and uuid in self.mismatched:
+            return
+
+        n = 0
+        if self.queued:
+            sources, n = self.resolve(uuid, obj)
+            for src in sources:
+                count = held.get(src)
+                if count == 1:
+                    del held[src]
+                    ready.append(src)
+                elif count is not None:
+                    held[src] = count - 1
+
+        if obj is None:
+            self.populate(tag, uuid, about, properties)
+            return
+
+        n += self.populate(tag, uuid, about, properties)
+        if n:
+            held[obj] = n
+        else:
+            ready.append(obj)
+
+    def placeholder(self, klass, uuid):
+        """Maps the given uuid to a new placeholder instance of the given
+        class and returns it.
+        """
+        obj = self.d[uuid] = klass(UUID=uuid)
+        obj._placeholder = True
+        self.created += 1
+        return obj
+
+    def target(self, klass, attr):
+        """Returns the class at the other end of the given reference of
+        klass or None, if it has no inverse or the inverse is declared by
+        several classes.
+        """
+        try:
+            plan = self.plans[klass]
+        except KeyError:
+            plan = self.compile(klass)
+        association = plan.links.get(attr)
+        if association is None:
+            return None
+        return _targets(self.registry).get((association[2][1:], "_" + attr))
+
+    def lookup(self, tag):
+        """Returns the class for the given element tag or None.
+        """
+        try:
+            return self.registry[tag]
+        except KeyError:
+            return None
+
+    def resolve(self, uuid, obj):
+        """Sets the queued references to, and applies the queued
+        descriptions of, the given newly instantiated object. If the object
+        is None and the uuid has been skipped, they are dropped.
+
+        Returns the objects of the references set, and the number of
+        references queued by the descriptions.
+        """
+        sources = []
+        n = 0
+
+        if obj is None:
+            if uuid in self.skipped:
+                references = self.references.pop(uuid, ())
+                descriptions = self.descriptions.pop(uuid, ())
+                self.queued -= len(references) + len(descriptions)
+                sources = [src for src, _, _, _ in references]
+            return sources, n
+
+        references = self.references.pop(uuid, None)
+        if references is not None:
+            self.queued -= len(references)
+            for src, kind, attr, func in references:
+                if self.bulk_link:
+                    self.link(src, kind, attr, func, obj)
+                elif kind == MANY_REFERENCE:
+                    func(src, obj)
+                elif getattr(src, attr) is None:
+                    setattr(src, attr, obj)
+                sources.append(src)
+
+        descriptions = self.descriptions.pop(uuid, None)
+        if descriptions is not None:
+            self.queued -= len(descriptions)
+            for tag, properties in descriptions:
+                n += self.populate(tag, uuid, True, properties)
+
+        return sources, n
+
+    def populate(self, tag, uuid, about, properties):
+        """Sets the attributes and references of the object with the given
+        uuid.
+
+        Returns the number of references queued.
+        """
+        m = self.m
+        # Process elements in the CIM namespace.
+        if tag[:m] != self.base:
+            return 0
+
+        # Locate the CIM object using the uuid.
+        d = self.d
+        try:
+            obj = d[uuid]
+        except KeyError:
+            if uuid in self.skipped:
+                return 0
+            elif about and self.defer:
+                self.descriptions.setdefault(uuid, []).append(
+                    (tag, properties))
+                self.queued += 1
+                return 0
+            elif about and self.placeholders and self.lookup(tag):
+                obj = self.placeholder(self.lookup(tag), uuid)
+            else:
+                # Elements of unknown classes have been reported already.
+                if about or self.lookup(tag) is not None:
+                    self.issues._add(MISSING_OBJECT, tag[m:], None, uuid)
+                return 0
+        n = 0
+        bulk_link = self.bulk_link
+        values = self.values
+        issues = self.issues
+
+        # Map of property element tag to (kind, attribute, function).
+        klass = obj.__class__
+        try:
+            plan = self.plans[klass]
+        except KeyError:
+            plan = self.compile(klass)
+
+        # Iterate over attributes/references.
+        for tag, text, uuid2 in properties:
+            kind, attr, func = plan[tag]
+
+            # Use the rdf:resource attribute to distinguish
+            # between attributes and references/enums.
+            if uuid2 is None: # attribute
+                if kind > ENUM:
+                    if kind == UNKNOWN:
+                        issues._add(UNKNOWN_ATTRIBUTE, klass.__name__, attr,
+                                    uuid)
+                    continue
                 try:
-                    obj = d[uuid]
-                except KeyError:
-                    logger.error("Missing '%s' object with uuid: %s",
-                                 elem.tag[m:], uuid)
-                    root.clear()
+                    setattr(obj, attr, values[func][text])
+                except TypeError:
+                    pass
+                except ValueError:
+                    issues._add(INVALID_VALUE, klass.__name__, attr, uuid)
+
+            # Use the '#' prefix to distinguish between
+            # references and enumerations.
+            elif uuid2[0] == "#": # reference
+                if kind < REFERENCE:
+                    if kind == UNKNOWN:
+                        issues._add(UNKNOWN_ATTRIBUTE, klass.__name__, attr,
+                                    uuid)
                     continue
+                try:
+                    val = d[uuid2[1:]] # remove '#' prefix
+                except KeyError:
+                    if uuid2[1:] in self.skipped:
+                        continue
+                    elif self.defer:
+                        self.references.setdefault(uuid2[1:], []).append(
+                            (obj, kind, attr, func))
+                        n += 1
+                        continue
+                    target = self.placeholders and self.target(klass, attr)
+                    if not target:
+                        self.missing_reference(klass, attr, uuid2[1:])
+                        continue
+                    val = self.placeholder(target, uuid2[1:])
 
-                # Iterate over attributes/references.
-                for event, elem in context:
-                    # Process end events with elements in the CIM namespace.
-                    if event == "end" and elem.tag[:m] == base:
-                        # Break if class closing element (e.g. </cim:Terminal>).
-                        if elem.get("{%s}ID" % ns_rdf) is None and \
-                                elem.get("{%s}about" % ns_rdf) is None:
-                            # Get the attribute/reference name.
-                            attr = elem.tag[m:].rsplit(".")[-1]
-
-                            if not hasattr(obj, attr):
-                                error_msg = "'%s' has not attribute '%s'" %(obj.__class__.__name__, attr)
-                                try:
-                                    logger_errors_grouped[error_msg] += 1
-                                except KeyError:
-                                    logger_errors_grouped[error_msg] = 1
-                                # logger.error("'%s' has not attribute '%s'",
-                                #              obj.__class__.__name__, attr)
-                                continue
-
-                            # Use the rdf:resource attribute to distinguish
-                            # between attributes and references/enums.
-                            uuid2 = elem.get("{%s}resource" % ns_rdf)
-
-                            if uuid2 is None: # attribute
-                                # Convert value type using the default value.
-                                try:
-                                    typ = type( getattr(obj, attr) )
-                                    if typ == type(True): # KKG: Test if it is boolean value
-                                        # KKG: NB: The function bool("false") returns True, because it is called upon non-empty string!
-                                        # This means that it wrongly reads "false" value as boolean True and this is why this special case testing is necessary
-                                        if str.title(elem.text) == 'True':
-                                            setattr(obj, attr, True)
-                                        else:
-                                            setattr(obj, attr, False)
-                                    else:
-                                        setattr(obj, attr, typ(elem.text))
-                                except TypeError:
-                                    pass
-                            else:  # reference or enum
-                                # Use the '#' prefix to distinguish between
-                                # references and enumerations.
-                                if uuid2[0] == "#": # reference
-                                    try:
-                                        val = d[uuid2[1:]] # remove '#' prefix
-                                    except KeyError:
-                                        logger.error("Referenced '%s' [%s] "
-                                                     "object missing.",
-                                                     obj.__class__.__name__,
-                                                     uuid2[1:])
-                                        continue
-
-                                    default = getattr(obj, attr)
-                                    if default == None: # 1..1 or 1..n
-                                        # Rely on properties to set any
-                                        # bi-directional references.
-                                        setattr(obj, attr, val)
-                                    elif isinstance(default, list): # many
-                                        # Use 'add*' method to set reference.
-                                        getattr(obj, ("add%s" % attr))(val)
-#                                    else:
-#                                        logger.error("Reference error [%s].",
-#                                                     default)
-
-                                else: # enum
-                                    val = uuid2.rsplit(".", 1)[1]
-                                    setattr(obj, attr, val)
-
-                        else:
-                            # Finished setting object attributes.
-                            break
+                if bulk_link:
+                    self.link(obj, kind, attr, func, val)
+                elif kind == MANY_REFERENCE:
+                    # Use 'add*' method to set reference.
+                    func(obj, val)
+                elif getattr(obj, attr) is None: # 1..1 or 1..n
+                    # Rely on properties to set any bi-directional references.
+                    setattr(obj, attr, val)
 
-        # Clear children of the root element to minimise memory usage.
-        root.clear()
+            elif kind == UNKNOWN:
+                issues._add(UNKNOWN_ATTRIBUTE, klass.__name__, attr, uuid)
 
-    if logger_errors_grouped:
-        for error, count in logger_errors_grouped.items():
-            logging_message = '%s : %d times' %(error, count)
-            logger.warn(logging_message)
+            elif kind != IGNORED: # enum
+                setattr(obj, attr, self.literals[uuid2])
 
-    # logging_message = 'Created totally %d CIM objects in %.2fs.' %(len(d), time() - t0)
-    logger.info('Created totally %d CIM objects in %.2fs.' %(len(d), time() - t0))
-    # logging_message = 'END of parsing file \"%s\"\n' % source
-    logger.info('END of parsing file \"%s\"\n' % source)
+        self.queued += n
+        return n
 
-    return d
+    def compile(self, klass):
+        """Returns the property plan of the given class, restricted to the
+        properties included by the projection.
+        """
+        properties = None
+        if self.projection is not None:
+            properties = self.projection.properties(klass)
+        plan = self.plans[klass] = property_plan(klass, self.base, properties)
+        return plan
+
+    def record(self, tag, uuid, about, properties):
+        """Returns the L{CIMRecord} of the given element without
+        instantiating the class.
+        """
+        try:
+            klass = self.registry[tag]
+        except KeyError:
+            # Ignore elements that are not in the CIM namespace.
+            if tag[:self.m] == self.base:
+                self.issues._add(UNKNOWN_CLASS, tag[self.m:], None, uuid)
+            return None
+
+        if self.projection is not None and \
+                not self.projection.accepts(klass):
+            self.skipped.add(uuid)
+            return None
+
+        try:
+            plan = self.plans[klass]
+        except KeyError:
+            plan = self.compile(klass)
+
+        values = self.values
+        # Records of a chunk are pickled together, which keeps the uuids
+        # of the objects shared with the references to them.
+        uuids = values[str]
+        uuid = uuids[uuid]
+
+        attributes = {}
+        references = {}
+        for tag, text, uuid2 in properties:
+            kind, attr, func = plan[tag]
+
+            if kind == UNKNOWN:
+                self.issues._add(UNKNOWN_ATTRIBUTE, klass.__name__, attr,
+                                 uuid)
+            elif uuid2 is None: # attribute
+                if kind <= ENUM:
+                    try:
+                        attributes[attr] = values[func][text]
+                    except TypeError:
+                        pass
+                    except ValueError:
+                        self.issues._add(INVALID_VALUE, klass.__name__, attr,
+                                         uuid)
+            elif uuid2[0] == "#": # reference
+                if kind == MANY_REFERENCE:
+                    try:
+                        references[attr].append(uuids[uuid2[1:]])
+                    except KeyError:
+                        references[attr] = [uuids[uuid2[1:]]]
+                elif kind == REFERENCE:
+                    references[attr] = uuids[uuid2[1:]]
+            elif kind != IGNORED: # enum
+                attributes[attr] = self.literals[uuid2]
+
+        return CIMRecord(uuid, klass, attributes, references, about)
+
+    def apply(self, record):
+        """Sets the attributes and references of the object with the uuid
+        of the given L{CIMRecord}. The object must have been instantiated
+        from the record already, unless it is an rdf:about record.
+
+        Records are applied using the property plan of the object, which
+        may be of another profile than the record.
+        """
+        d = self.d
+        try:
+            obj = d[record.uuid]
+        except KeyError:
+            if record.uuid in self.skipped:
+                return
+            elif record.about and self.placeholders:
+                obj = self.placeholder(record.klass, record.uuid)
+            else:
+                self.issues._add(MISSING_OBJECT, record.klass.__name__, None,
+                                 record.uuid)
+                return
+
+        klass = obj.__class__
+        try:
+            names = self.plans[klass].names
+        except KeyError:
+            names = self.compile(klass).names
+
+        for attr, value in record.attributes.items():
+            kind = names.get(attr, _UNKNOWN)[0]
+            if kind <= ENUM:
+                setattr(obj, attr, value)
+            elif kind != IGNORED:
+                self.issues._add(UNKNOWN_ATTRIBUTE, klass.__name__, attr,
+                                 record.uuid)
+
+        for attr, uuids in record.references.items():
+            kind, _, func = names.get(attr, _UNKNOWN)
+            if kind == IGNORED:
+                continue
+            if kind != REFERENCE and kind != MANY_REFERENCE:
+                self.issues._add(UNKNOWN_ATTRIBUTE, klass.__name__, attr,
+                                 record.uuid)
+                continue
+
+            if kind == REFERENCE:
+                uuids = (uuids,)
+
+            for uuid2 in uuids:
+                try:
+                    val = d[uuid2]
+                except KeyError:
+                    if uuid2 in self.skipped:
+                        continue
+                    target = self.placeholders and self.target(klass, attr)
+                    if not target:
+                        self.missing_reference(klass, attr, uuid2)
+                        continue
+                    val = self.placeholder(target, uuid2)
+
+                if self.bulk_link:
+                    self.link(obj, kind, attr, func, val)
+                elif kind == MANY_REFERENCE:
+                    func(obj, val)
+                elif getattr(obj, attr) is None:
+                    setattr(obj, attr, val)
+
+    def link(self, obj, kind, attr, func, val):
+        """Sets the given reference of obj to val by writing the private
+        attributes of both ends directly, which avoids the duplicate checks
+        of the generated setters. Falls back on the setters if the inverse
+        association is unknown or val is linked to another object.
+        """
+        association = self.plans[obj.__class__].links.get(attr)
+        if association is None:
+            if kind == MANY_REFERENCE:
+                func(obj, val)
+            elif getattr(obj, attr) is None:
+                setattr(obj, attr, val)
+            return
+
+        multiplicity, slot, inverse = association
+        if multiplicity == ONE_TO_MANY:
+            # The object is in the list of val if, and only if, val is
+            # set on the object.
+            if getattr(obj, slot) is None:
+                setattr(obj, slot, val)
+                getattr(val, inverse).append(obj)
+
+        elif multiplicity == MANY_TO_ONE:
+            other = getattr(val, inverse)
+            if other is None:
+                setattr(val, inverse, obj)
+                getattr(obj, slot).append(val)
+            elif other is not obj:
+                func(obj, val) # moves val to obj
+
+        elif multiplicity == ONE_TO_ONE:
+            if getattr(obj, slot) is None:
+                other = getattr(val, inverse)
+                if other is not None:
+                    setattr(other, slot, None)
+                setattr(obj, slot, val)
+                setattr(val, inverse, obj)
+
+        else: # MANY_TO_MANY
+            key = (id(obj), slot, id(val))
+            if key not in self.linked:
+                self.linked.add(key)
+                self.linked.add((id(val), inverse, id(obj)))
+                getattr(val, inverse).append(obj)
+                getattr(obj, slot).append(val)
+
+    def missing_reference(self, klass, attr, uuid):
+        """Reports the object with the given uuid, referenced by attribute
+        attr of an instance of klass, as missing.
+        """
+        self.issues._add(MISSING_REFERENCE, klass.__name__, attr, uuid)
+
+    def finish(self):
+        """Reports the queued references and descriptions as missing, or
+        creates placeholders for them.
+        """
+        if self.placeholders:
+            # Descriptions may queue references to other missing objects.
+            for uuid in list(self.descriptions):
+                klass = self.lookup(self.descriptions[uuid][0][0])
+                if klass is not None:
+                    self.resolve(uuid, self.placeholder(klass, uuid))
+
+            for uuid in list(self.references):
+                for obj, kind, attr, func in self.references.get(uuid, ()):
+                    target = self.target(obj.__class__, attr)
+                    if target is not None:
+                        self.resolve(uuid, self.placeholder(target, uuid))
+                        break
+
+        if self.created:
+            logger.info("Created %d placeholders for missing objects.",
+                        self.created)
+
+        for uuid, descriptions in self.descriptions.items():
+            for tag, properties in descriptions:
+                self.issues._add(MISSING_OBJECT, tag[self.m:], None, uuid)
+
+        for uuid, references in self.references.items():
+            for obj, kind, attr, func in references:
+                self.missing_reference(obj.__class__, attr, uuid)
+
+        self.references = {}
+        self.descriptions = {}
+        self.queued = 0
+
+
+# Kinds of property elements.
+ATTRIBUTE, ENUM, REFERENCE, MANY_REFERENCE, UNKNOWN, IGNORED = range(6)
+
+_UNKNOWN = (UNKNOWN, None, None)
+
+# Map of (class, tag base, properties) to property plan.
+_plans = {}
+
+
+def property_plan(klass, base, properties=None):
+    """Returns the map of property element tag to (kind, attribute,
+    function) tuples for the given CIM class.
+
+    The function converts the element text for attributes and enumerations
+    and is the unbound 'add*' method for many valued references. For
+    unknown properties the function is replaced by the error message.
+
+    If a set of property names is given, all other properties of the class
+    are ignored.
+    """
+    key = (klass, base, properties)
+    try:
+        return _plans[key]
+    except KeyError:
+        plan = _plans[key] = _PropertyPlan(klass, base, properties)
+        return plan
+
+
+class _Values(dict):
+    """Map of the text of attribute values to the values converted by a
+    function, e.g. float, so that equal values are one object. The map is
+    cleared once it holds the given maximum number of values, if any.
+    """
+
+    def __init__(self, func, limit=None):
+        super(_Values, self).__init__()
+        self.func = func
+        self.limit = limit
+
+    def __missing__(self, text):
+        value = self.func(text)
+        if self.limit is not None and len(self) >= self.limit:
+            self.clear()
+        self[text] = value
+        return value
+
+
+class _ValueCache(dict):
+    """Map of conversion function to the L{_Values} it converted.
+    """
+
+    def __init__(self, limit=None):
+        super(_ValueCache, self).__init__()
+        self.limit = limit
+
+    def __missing__(self, func):
+        values = self[func] = _Values(func, self.limit)
+        return values
+
+
+class _Literals(dict):
+    """Map of the rdf:resource of an enumeration literal (e.g.
+    http://iec.ch/TC57/2010/CIM-schema-cim15#PhaseCode.ABC) to the
+    interned literal (ABC), which is also the object of equal defaults.
+    """
+
+    def __missing__(self, resource):
+        literal = self[resource] = intern(str(resource.rsplit(".", 1)[1]))
+        return literal
+
+
+def _bool(text):
+    # KKG: NB: The function bool("false") returns True, because it is called upon non-empty string!
+    # This means that it wrongly reads "false" value as boolean True and this is why this special case testing is necessary
+    return str.title(text) == 'True'
+
+
+class _PropertyPlan(dict):
+    """Map of property element tag (e.g. {...#}Terminal.connected) to a
+    (kind, attribute, function) tuple, compiled from the _attrs,
+    _attr_types, _enums, _refs and _many_refs tables of the class and its
+    bases.
+    """
+
+    def __init__(self, klass, base, properties=None):
+        super(_PropertyPlan, self).__init__()
+        self.klass = klass
+        self.base = base
+        # Names of the properties to set, if not all.
+        self.properties = properties
+        # Map of attribute name to plan entry.
+        self.names = {}
+        # Map of reference name to (multiplicity, slot, inverse slot).
+        self.links = {}
+
+        for k in reversed(klass.__mro__):
+            attrs = k.__dict__.get("_attrs")
+            if attrs is None:
+                continue # object
+            for attr in attrs:
+                if attr in k._enums:
+                    entry = (ENUM, attr, str)
+                else:
+                    typ = k._attr_types.get(attr, str)
+                    entry = (ATTRIBUTE, attr, _bool if typ is bool else typ)
+                self._add(k, attr, entry)
+
+            for ref in k.__dict__.get("_refs", ()):
+                if ref in k._many_refs:
+                    add = getattr(klass, "add%s" % ref, None)
+                    if add is None:
+                        # E.g. CIM14 ProtectionEquipment.ProtectedSwitches.
+                        add = getattr(klass, "add_%s" % ref, None)
+                    if add is None:
+                        entry = (IGNORED, ref, None)
+                    else:
+                        entry = (MANY_REFERENCE, ref, add)
+                else:
+                    entry = (REFERENCE, ref, None)
+                self._add(k, ref, entry)
+
+                association = association_of(k, ref)
+                if association is not None:
+                    self.links[ref] = association
+
+    def _add(self, k, name, entry):
+        if self.properties is not None and name not in self.properties:
+            entry = (IGNORED, name, None)
+        self.names[name] = entry
+        self["%s%s.%s" % (self.base, k.__name__, name)] = entry
+
+    def __missing__(self, tag):
+        base = self.base
+        if tag[:len(base)] != base:
+            # Ignore elements that are not in the CIM namespace.
+            entry = (IGNORED, None, None)
+        else:
+            # Properties may be qualified by any class name, so fall back
+            # on the attribute name.
+            attr = tag[len(base):].rsplit(".")[-1]
+            try:
+                entry = self.names[attr]
+            except KeyError:
+                entry = (UNKNOWN, attr, "'%s' has not attribute '%s'" %
+                         (self.klass.__name__, attr))
+        self[tag] = entry
+        return entry
+
+
+def _projection(include_classes=None, exclude_classes=None,
+                include_attributes=None):
+    """Returns the L{_Projection} for the given reader arguments or None,
+    if all are None.
+    """
+    if include_classes is None and exclude_classes is None and \
+            include_attributes is None:
+        return None
+    return _Projection(include_classes, exclude_classes, include_attributes)
+
+
+def _class_name(klass):
+    return klass if isinstance(klass, str) else klass.__name__
+
+
+class _Projection(object):
+    """Selects the classes to instantiate and the properties to set.
+
+    Classes may be given as classes or names and match their subclasses.
+    They are compared by name, so that a projection applies to the classes
+    of all CIM versions and profiles.
+    """
+
+    def __init__(self, include_classes=None, exclude_classes=None,
+                 include_attributes=None):
+        self.include = None
+        if include_classes is not None:
+            self.include = frozenset(map(_class_name, include_classes))
+        self.exclude = frozenset(map(_class_name, exclude_classes or ()))
+        self.attributes = {}
+        for klass, names in (include_attributes or {}).items():
+            self.attributes[_class_name(klass)] = frozenset(names)
+        #: Comparable form of the projection, e.g. for cache keys.
+        self.key = (None if self.include is None else sorted(self.include),
+                    sorted(self.exclude),
+                    sorted((name, sorted(names))
+                           for name, names in self.attributes.items()))
+        # Map of class to whether it is accepted.
+        self.accepted = {}
+
+    def accepts(self, klass):
+        """Returns True if instances of the given class are to be read.
+        """
+        try:
+            return self.accepted[klass]
+        except KeyError:
+            names = set(k.__name__ for k in klass.__mro__)
+            accepted = self.accepted[klass] = \
+                (self.include is None or not self.include.isdisjoint(names)) \
+                and self.exclude.isdisjoint(names)
+            return accepted
+
+    def properties(self, klass):
+        """Returns the set of names of the properties to set on instances
+        of the given class or None, if all.
+        """
+        properties = None
+        for k in klass.__mro__:
+            names = self.attributes.get(k.__name__)
+            if names is not None:
+                properties = names if properties is None else properties | names
+        return properties
+
+
+# Map of registry id to (registry, map of (reference, inverse slot) to class).
+_target_maps = {}
+
+
+def _targets(registry):
+    """Returns the map of (reference, inverse slot) to the class that
+    declares the reference, for the classes of the given registry.
+    References declared by several classes with the same inverse (e.g.
+    ConformLoad.LoadGroup and NonConformLoad.LoadGroup) are left out, as
+    the class at the other end is ambiguous.
+    """
+    try:
+        other, targets = _target_maps[id(registry)]
+        if other is registry:
+            return targets
+    except KeyError:
+        pass
+
+    classes = {}
+    for k in set(registry.resolve_all().values()):
+        for ref in k.__dict__.get("_refs", ()):
+            association = association_of(k, ref)
+            if association is not None:
+                classes.setdefault((ref, association[2]), []).append(k)
+
+    targets = dict((key, ks[0]) for key, ks in classes.items()
+                   if len(ks) == 1)
+    _target_maps[id(registry)] = (registry, targets)
+    return targets
+
+
+def _fill(obj, klass):
+    """Turns the given placeholder into an instance of the given class, in
+    place so that the references to it are kept.
+
+    Returns False, leaving the placeholder as it is, if the class is not
+    that of the placeholder or a subclass of it.
+    """
+    if not issubclass(klass, obj.__class__):
+        return False
+    values = klass(UUID=obj.UUID).__dict__
+    values.update(obj.__dict__)
+    del values["_placeholder"]
+    obj.__class__ = klass
+    obj.__dict__ = values
+    return True
+
+
+def unresolved(d):
+    """Returns the map of UUID to the placeholders in the given map of
+    UUID to CIM object that have not been filled by a read (see
+    L{cimread}).
+    """
+    return dict((uuid, obj) for uuid, obj in d.items()
+                if getattr(obj, "_placeholder", False))
 
 
 def xmlns(source):
@@ -268,26 +2468,198 @@ def get_cim_ns(namespaces):
         ns = ''
         logger.error('No CIM namespace defined in input file.')
 
-    CIM16nsURI = 'http://iec.ch/TC57/2013/CIM-schema-cim16'
-
     nsuri = ns
 
-    import CIM14, CIM15
-    if ns == CIM14.nsURI:
-        ns = 'CIM14'
-    elif ns == CIM15.nsURI:
-        ns = 'CIM15'
-    elif ns == CIM16nsURI:
-        ns  = 'CIM15'
-    else:
+    # Only the package of the version is imported.
+    _, ns = _version(ns)
+    if ns is None:
         ns = 'CIM15'
         logger.warn('Could not detect CIM version. Using %s.' % ns)
 
-    cim = __import__(ns, globals(), locals(), ['nsURI', 'packageMap'])
+    cim = importlib.import_module(ns)
 
     return nsuri, cim.packageMap
 
 
+# CIM version of a namespace URI, e.g.
+# http://iec.ch/TC57/2010/CIM-schema-cim15.
+_VERSION = re.compile(r"CIM-schema-cim(\d+)")
+
+# Map of CIM version to the package of its classes. CIM16 models are read
+# with the CIM15 classes.
+_VERSION_PACKAGES = {"CIM14": "CIM14", "CIM15": "CIM15", "CIM16": "CIM15"}
+
+
+def _version(nsURI):
+    """Returns the CIM version (e.g. "CIM15") of the given namespace URI and
+    the name of the package of its classes, or None.
+    """
+    match = _VERSION.search(nsURI)
+    if match is None:
+        return None, None
+    version = "CIM" + match.group(1)
+    return version, _VERSION_PACKAGES.get(version)
+
+
+class CIMHeader(namedtuple("CIMHeader", "version nsURI profiles package")):
+    """CIM version (e.g. "CIM15"), CIM namespace URI, profile URIs and the
+    name of the package with the classes to read a document with, as
+    found by L{sniff}.
+    """
+    __slots__ = ()
+
+    @property
+    def packageMap(self):
+        """Map of class name to package name of the package, which is
+        imported on first use.
+        """
+        return importlib.import_module(self.package).packageMap
+
+
+# Namespace declarations.
+_XMLNS = re.compile(br"xmlns(?::([\w.-]+))?\s*=\s*([\"'])(.*?)\2")
+
+# Profiles of a model header (e.g. md:FullModel).
+_MODEL_PROFILE = re.compile(br"<(?:[\w.-]+:)?Model\.profile>\s*([^<\s]+)")
+
+# Map of profile URI to the name of the package of its classes.
+_profiles = None
+
+
+def sniff(source, size=4096):
+    """Returns the L{CIMHeader} of the given CIM RDF/XML document, from the
+    namespaces declared on its root element and the profiles of its
+    model header, if any, in its first bytes. The document is not parsed
+    and no CIM package is imported.
+
+    Profiles are only found where declared, by the query of the CIM
+    namespace (e.g. ...CIM-schema-cim15?profile=http://...) or
+    md:Model.profile elements. They are not guessed from the classes of
+    the document: documents of a profile that declare the plain CIM
+    namespace, like the CDPSM files of the test data, have no profiles.
+    The package is that of the first profile PyCIM has classes for or else
+    of the CIM version, whose classes read the documents of its profiles,
+    if known, or None.
+
+    @type source: File-like object or a path to a file.
+    @param source: CIM RDF/XML file, which may be compressed. File-like
+    objects are read from, and returned to, their current position.
+    @type size: int
+    @param size: Number of bytes read.
+    @rtype: CIMHeader
+    """
+    if hasattr(source, "read"):
+        pos = source.tell() if hasattr(source, "seek") else None
+        head = source.read(size)
+        if pos is not None:
+            source.seek(pos)
+        if not isinstance(head, bytes):
+            head = head.encode("utf-8")
+    else:
+        compression = _compression(source)
+        if compression is None:
+            f = open(source, "rb")
+            try:
+                head = f.read(size)
+            finally:
+                f.close()
+        else:
+            head = b""
+            streams = _decompress(source, compression)
+            for f in streams:
+                head = f.read(size)
+                break
+            streams.close()
+
+    # Namespaces declared before the end of the root start tag.
+    match = _ROOT.search(head)
+    end = len(head)
+    if match is not None:
+        end = head.find(b">", match.start())
+        if end < 0:
+            end = len(head)
+    namespaces = {}
+    for prefix, _, uri in _XMLNS.findall(head, 0, end):
+        namespaces[(prefix or b"").decode("utf-8")] = uri.decode("utf-8")
+
+    nsURI = namespaces.get("cim")
+    if nsURI is None:
+        for uri in namespaces.values():
+            if _VERSION.search(uri):
+                nsURI = uri
+                break
+
+    profiles = []
+    version = package = None
+    if nsURI is not None:
+        nsURI = nsURI.rstrip("#")
+        version, package = _version(nsURI)
+        if "?profile=" in nsURI:
+            profiles.append(nsURI.split("?profile=", 1)[1])
+    profiles.extend(uri.decode("utf-8")
+                    for uri in _MODEL_PROFILE.findall(head, end))
+
+    for profile in profiles:
+        if profile in _profile_packages():
+            package = _profile_packages()[profile]
+            break
+
+    return CIMHeader(version, nsURI, tuple(profiles), package)
+
+
+def _profile_packages():
+    """Returns the map of profile URI to the name of the package of its
+    classes. The packages are found through the import system, so that
+    zipped installs are searched as well, and their sources read without
+    importing them.
+    """
+    global _profiles
+    if _profiles is not None:
+        return _profiles
+
+    try:
+        from importlib.util import find_spec
+    except ImportError:
+        find_spec = None # Python 2
+
+    profiles = {}
+    for name in ("CIM14", "CIM15"):
+        if find_spec is None:
+            break
+        try:
+            spec = find_spec(name)
+        except (ImportError, ValueError):
+            continue
+        if spec is not None and spec.submodule_search_locations:
+            _find_profiles(name, spec.submodule_search_locations, profiles)
+    _profiles = profiles
+    return profiles
+
+
+# Profile of the namespace URI of a package source.
+_PACKAGE_PROFILE = re.compile(r'^nsURI = "[^"?]*\?profile=([^"]*)"', re.M)
+
+
+def _find_profiles(name, locations, profiles):
+    """Adds the profile URI and name of the subpackages of the given
+    package, found in the given locations, that are profiles to the given
+    map.
+    """
+    for finder, module, ispkg in pkgutil.iter_modules(locations, name + "."):
+        if not ispkg:
+            continue
+        try:
+            spec = finder.find_spec(module)
+            text = spec.loader.get_source(module)
+        except (AttributeError, ImportError, OSError):
+            continue
+        match = _PACKAGE_PROFILE.search(text or "")
+        if match is not None and "\npackageMap = " in text:
+            profiles[match.group(1)] = module
+        elif spec.submodule_search_locations:
+            _find_profiles(module, spec.submodule_search_locations, profiles)
+
+
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
     cimread("Test/Data/EDF_AIGUE_v9_COMBINED.xml")
@@ -18,95 +18,496 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 # IN THE SOFTWARE.
 
+from contextlib import contextmanager
+from itertools import chain
+from time import time
+
+import bz2
+import gzip
+import io
 import logging
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import zipfile
 
-from time import time
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+try:
+    from os import fspath as _fspath
+except ImportError:
+    # Python < 3.6, where path objects (e.g. pathlib.Path) convert with str.
+    def _fspath(path):
+        return path if isinstance(path, (str, type(u""))) else str(path)
 
 from CIM15 import nsURI, nsPrefix
 
-from PyCIM.SimpleXMLWriter import XMLWriter
+from PyCIM.SimpleXMLWriter import escape_cdata, escape_attrib
+from PyCIM.ClassRegistry import association_of, MANY_TO_MANY
 
 nsPrefixRDF = "rdf"
 nsRDF = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
 
 logger = logging.getLogger(__name__)
 
-def cimwrite(d, source, encoding="utf-8"):
+def cimwrite(d, source, encoding="utf-8", processes=None,
+             compresslevel=None):
     """CIM RDF/XML serializer.
 
-    @type d: dict
-    @param d: Map of URIs to CIM objects.
-    @type source: File or file-like object.
-    @param source: This object must implement a C{write} method
-    that takes an 8-bit string.
+    The document is accumulated in a buffer, which is written in blocks of
+    many objects.
+
+    @type d: dict or iterable
+    @param d: Map of URIs to CIM objects or an iterable of CIM objects,
+    e.g. a generator, which is consumed as the document is written, so
+    the objects need not all be in memory.
+    @type source: File, file-like object or a path to a file.
+    @param source: Objects opened in text mode (e.g. io.StringIO) are
+    written strings, others (e.g. files opened in binary mode) the bytes
+    of the document in the given encoding. Paths, strings or path objects
+    (e.g. pathlib.Path) are opened in binary mode. Paths ending in ".gz",
+    ".bz2" or ".xz" are compressed and those ending in ".zip" are written
+    a zip archive with the document as its only member, named after the
+    archive (e.g. "model.xml" in "model.zip").
     @type encoding: string
     @param encoding: Character encoding defaults to "utf-8", but can also
-    be set to "us-ascii".
+    be set to "us-ascii". Characters that can not be encoded are written
+    as character references.
+    @type processes: int
+    @param processes: If set, the objects are split into chunks, in the
+    order of d, whose elements are serialised by the given number of
+    worker processes forked from this one and written in order, so the
+    output is identical to that of a serial write. The objects of an
+    iterable are collected in a list first. The objects are serialised in
+    one process if forking is not available.
+    @type compresslevel: int
+    @param compresslevel: Compression level of compressed files, from 1
+    (fastest) to 9 (smallest). Defaults to that of the compression
+    module. Zip archives are written at the default level before Python
+    3.7.
     @rtype: bool
     @return: Write success.
     """
     # Start the clock
     t0 = time()
 
-    w = XMLWriter(source, encoding)
+    objects = d.values() if hasattr(d, "values") else d
+
+    if hasattr(source, "write"):
+        n = _emit(objects, source, encoding, processes)
+    else:
+        with _compress(source, compresslevel) as f:
+            n = _emit(objects, f, encoding, processes)
+
+    logger.info("%d CIM objects serialised in %.2fs.", n, time() - t0)
+
+
+@contextmanager
+def _compress(path, compresslevel=None):
+    """Opens the file at the given path for writing in binary mode,
+    compressing it according to its extension.
+    """
+    path = _fspath(path)
+    name = os.path.basename(path)
+    if isinstance(name, bytes) and bytes is not str:
+        name = os.fsdecode(name)
+    if name.lower().endswith(".zip"):
+        member = name[:-4]
+        if not member.lower().endswith(".xml"):
+            member += ".xml"
+        kw_args = {}
+        if compresslevel is not None and sys.version_info >= (3, 7):
+            kw_args["compresslevel"] = compresslevel
+        archive = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED,
+                                  allowZip64=True, **kw_args)
+        try:
+            if sys.version_info >= (3, 6):
+                # The size of the document is not known in advance.
+                with archive.open(member, "w", force_zip64=True) as f:
+                    yield f
+            else:
+                # Members can only be written from files before Python 3.6.
+                fd, tmp = tempfile.mkstemp(".xml")
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        yield f
+                    archive.write(tmp, member)
+                finally:
+                    os.remove(tmp)
+        finally:
+            archive.close()
+        return
+
+    name = name.lower()
+    if name.endswith(".gz"):
+        f = gzip.open(path, "wb", 9 if compresslevel is None else
+                      compresslevel)
+    elif name.endswith(".bz2"):
+        f = bz2.BZ2File(path, "wb", compresslevel=9 if compresslevel is None
+                        else compresslevel)
+    elif name.endswith(".xz"):
+        if lzma is None:
+            raise ImportError("Writing xz files requires the lzma module.")
+        f = lzma.open(path, "wb", preset=compresslevel)
+    else:
+        f = open(path, "wb")
+
+    try:
+        yield f
+    finally:
+        f.close()
+
+
+# Characters replaced by entities in character data and attribute values.
+_CDATA = re.compile(u"[&<>]")
+_ATTRIB = re.compile(u"[&<>'\"]")
 
-    # Write the XML declaration.
-    w.declaration()
+
+def _is_text(f):
+    """Returns True if the given file-like object is written strings.
+    """
+    if isinstance(f, io.TextIOBase):
+        return True
+    if isinstance(f, (io.RawIOBase, io.BufferedIOBase)):
+        return False
+    mode = getattr(f, "mode", None)
+    if isinstance(mode, str):
+        return "b" not in mode
+    # Objects written strings by the XMLWriter before.
+    return True
+
+
+def _emit(objects, f, encoding, processes=None, size=1 << 14):
+    """Writes the RDF/XML document of the given CIM objects to the given
+    file-like object, serialising the objects in the given number of
+    processes, if any. Returns the number of objects written.
+    """
+    text = _is_text(f)
+    if text:
+        write = f.write
+    else:
+        def write(text):
+            f.write(text.encode(encoding, "xmlcharrefreplace"))
+
+    if encoding == "us-ascii" or encoding == "utf-8":
+        parts = [u"<?xml version='1.0'?>\n"]
+    else:
+        parts = [u"<?xml version='1.0' encoding='%s'?>\n" % encoding]
 
     # Add a '#' suffix to the CIM namespace URI if not present.
     nsCIM = nsURI if nsURI[-1] == "#" else nsURI + "#"
 
     # Start the root RDF element and declare namespaces.
+    root = escape_cdata(u"%s:RDF" % nsPrefixRDF)
     xmlns = {u"xmlns:%s" % nsPrefixRDF: nsRDF, u"xmlns:%s" % nsPrefix: nsCIM}
-    rdf = w.start(u"%s:RDF" % nsPrefixRDF, xmlns)
+    parts.append(u"<" + root)
+    for k, v in sorted(xmlns.items()):
+        parts.append(u" %s=\"%s\"" % (escape_cdata(k), escape_attrib(v)))
 
-    # Iterate over all UUID, CIM object pairs in the given dictionary.
-    for uuid, obj in d.items():
-        w.start(u"%s:%s" % (nsPrefix, obj.__class__.__name__),
-                {u"%s:ID" % nsPrefixRDF: obj.UUID})
+    if processes is not None:
+        objects = list(objects)
+    else:
+        # Look ahead for the first object, to tell if there are any.
+        objects = iter(objects)
+        try:
+            objects = chain([next(objects)], objects)
+        except StopIteration:
+            objects = []
 
-        mro = obj.__class__.mro()
-        mro.reverse()
+    n = 0
+    if not objects:
+        parts.append(u" />")
+        write(u"".join(parts))
+    else:
+        parts.append(u">")
+        write(u"".join(parts))
 
-        # Serialise attributes.
-        for klass in mro[2:]: # skip 'object' and 'Element'
-            attrs = [a for a in klass._attrs if a not in klass._enums]
-            for attr in attrs:
-                val = getattr(obj, attr)
-                if val != klass._defaults[attr]:
-                    w.element(u"%s:%s.%s" % (nsPrefix, klass.__name__, attr),
-                              str(val))
-
-        # Serialise enumeration data-types.
-        for klass in mro[2:]: # skip 'object' and 'Element'
-            enums = [a for a in klass._attrs if a in klass._enums]
-            for enum in enums:
-                val = getattr(obj, enum)
-                dt = klass._enums[enum]
-                w.element(u"%s:%s.%s" % (nsPrefix, klass.__name__, enum),
-                          attrib={u"%s:resource" % nsPrefixRDF:
-                                  u"%s%s.%s" % (nsCIM, dt, val)})
-
-        # Serialise references.
-        for klass in mro[2:]: # skip 'object' and 'Element'
-            # FIXME: serialise 'many' references.
-            refs = [r for r in klass._refs if r not in klass._many_refs]
-            for ref in refs:
-                val = getattr(obj, ref)
-                if val is not None:
-                    w.element(u"%s:%s.%s" % (nsPrefix, klass.__name__, ref),
-                          attrib={u"%s:resource" % nsPrefixRDF:
-                                  u"#%s" % val.UUID})
-
-        w.end()
-
-    # Close the root RDF element.
-    w.close(rdf)
+        if processes is None:
+            n = _serialise(objects, write, size)
+        else:
+            # Blocks are encoded by the workers.
+            blocks = _serialise_chunks(objects, None if text else encoding,
+                                       processes, size)
+            for block in blocks:
+                f.write(block)
+            n = len(objects)
+
+        # Close the root RDF element.
+        write(u"</%s>" % root)
 
     # Flush the output stream.
-    w.flush()
+    if hasattr(f, "flush"):
+        f.flush()
+
+    return n
+
+
+def _serialise(objects, write, size=1 << 14):
+    """Calls write with the elements of the given CIM objects. Strings are
+    accumulated in a list and joined and written once it holds the given
+    number of strings. Returns the number of objects.
+    """
+    parts = []
+    append = parts.append
+    cdata = _CDATA.search
+    attrib = _ATTRIB.search
+    # Map of class to serialisation plan.
+    plans = _plans
+    n = 0
+
+    for obj in objects:
+        n += 1
+        klass = obj.__class__
+        try:
+            plan = plans[klass]
+        except KeyError:
+            plan = serialisation_plan(klass)
+
+        text = obj.UUID
+        if attrib(text) is not None:
+            text = escape_attrib(text)
+        append(plan.start)
+        append(text)
+        append(u"\">")
+        # Objects without properties are closed as empty elements.
+        mark = len(parts)
+
+        for attr, kind, value, start, end in plan.fragments:
+            val = getattr(obj, attr)
+            if kind == ATTRIBUTE:
+                if val != value:
+                    text = str(val)
+                    if not text:
+                        append(start[:-1] + u" />")
+                        continue
+                    if cdata(text) is not None:
+                        text = escape_cdata(text)
+                    append(start)
+                    append(text)
+                    append(end)
+            elif kind == ENUM:
+                text = u"%s" % val
+                if attrib(text) is not None:
+                    text = escape_attrib(text)
+                append(start)
+                append(text)
+                append(end)
+            elif val is not None:
+                text = val.UUID
+                if attrib(text) is not None:
+                    text = escape_attrib(text)
+                append(start)
+                append(text)
+                append(end)
+
+        # Lists are read without calling the getters, as most are empty.
+        for slot, start, end in plan.links:
+            for val in getattr(obj, slot):
+                text = val.UUID
+                if attrib(text) is not None:
+                    text = escape_attrib(text)
+                append(start)
+                append(text)
+                append(end)
+
+        if len(parts) == mark:
+            parts[-1] = u"\" />"
+        else:
+            append(plan.end)
+
+        if len(parts) >= size:
+            write(u"".join(parts))
+            del parts[:]
+
+    if parts:
+        write(u"".join(parts))
+    return n
+
+
+# Objects serialised by the worker processes, which inherit them when
+# forked.
+_objects = None
+
+
+def _serialise_chunks(objects, encoding, processes, size=1 << 14):
+    """Yields the elements of the given list of CIM objects in chunks,
+    serialised by the given number of forked worker processes, in order.
+    The chunks are strings or, if an encoding is given, bytes.
+    """
+    global _objects
+
+    context = _fork_context()
+    if context is None and processes > 1:
+        logger.info("Forking is not available, serialising in one process.")
+        processes = 1
+
+    # Several chunks per process even out their serialisation times.
+    n = 4 * processes if processes > 1 else 1
+    step = -(-len(objects) // n)
+    tasks = [(i, i + step, encoding, size)
+             for i in range(0, len(objects), step)]
+
+    _objects = objects
+    try:
+        if processes <= 1:
+            for task in tasks:
+                yield _serialise_chunk(task)
+            return
+
+        pool = context.Pool(processes)
+        try:
+            for chunk in pool.imap(_serialise_chunk, tasks):
+                yield chunk
+        finally:
+            # All chunks have been received, unless the write failed.
+            pool.terminate()
+            pool.join()
+    finally:
+        _objects = None
+
+
+def _serialise_chunk(task):
+    """Returns the elements of the objects of the given (start, end,
+    encoding, size) chunk task.
+    """
+    start, end, encoding, size = task
+    blocks = []
+    _serialise(_objects[start:end], blocks.append, size)
+    text = u"".join(blocks)
+    if encoding is not None:
+        return text.encode(encoding, "xmlcharrefreplace")
+    return text
+
+
+def _fork_context():
+    """Returns the multiprocessing context of forked processes or None, if
+    not available.
+    """
+    try:
+        return multiprocessing.get_context("fork")
+    except (AttributeError, ValueError):
+        return None
+
+
+# Kinds of serialised properties.
+ATTRIBUTE, ENUM, REFERENCE = range(3)
+
+# Map of class to serialisation plan.
+_plans = {}
+
+
+def serialisation_plan(klass):
+    """Returns the serialisation plan of the given CIM class. Its
+    'attributes' are the (tag, attribute, value, kind) tuples of the
+    single valued properties serialised for instances of the class, in
+    order. The value is the default of attributes, which are only written
+    if they differ from it, and the URI prefix of the literals of
+    enumerations. The start tag of the instances is its 'tag'.
+
+    The (tag, attribute) of the many valued references serialised are its
+    'many'. The lists are read from the private attributes of the
+    properties, if any. Each association is written from
+    one end only. The many end of a one-to-many association is left to the
+    single valued reference of the other end. Of the two ends of a
+    many-to-many association, the one with the name that sorts first is
+    written. Many valued references without an inverse are written in
+    full.
+    """
+    try:
+        return _plans[klass]
+    except KeyError:
+        plan = _plans[klass] = _SerialisationPlan(klass)
+        return plan
+
+
+class _SerialisationPlan(object):
+    """Serialisation plan compiled from the _attrs, _defaults, _enums, _refs
+    and _many_refs tables of a class and its bases: all attributes, then
+    all enumerations, then all single valued references, each from the
+    base classes down, and the many valued references.
+
+    The escaped fragments of the document written before and after each
+    value are rendered once: those of the element of the object are the
+    'start' and 'end' attributes, those of the properties the 'fragments'
+    (attribute, kind, value, start, end) and 'links' (attribute,
+    start, end) lists.
+    """
+
+    def __init__(self, klass):
+        self.tag = u"%s:%s" % (nsPrefix, klass.__name__)
+        #: List of (tag, attribute, value, kind) of the single valued
+        #: properties.
+        self.attributes = []
+        #: List of (tag, attribute) of the many valued references.
+        self.many = []
+
+        nsCIM = nsURI if nsURI[-1] == "#" else nsURI + "#"
+
+        mro = klass.mro()
+        mro.reverse()
+        mro = mro[2:] # skip 'object' and 'Element'
+
+        attributes = self.attributes
+        for k in mro:
+            for attr in k._attrs:
+                if attr not in k._enums:
+                    attributes.append((self._tag(k, attr), attr,
+                                       k._defaults[attr], ATTRIBUTE))
+
+        for k in mro:
+            for enum in k._attrs:
+                if enum in k._enums:
+                    attributes.append((self._tag(k, enum), enum,
+                                       u"%s%s." % (nsCIM, k._enums[enum]),
+                                       ENUM))
+
+        for k in mro:
+            for ref in k._refs:
+                if ref not in k._many_refs:
+                    attributes.append((self._tag(k, ref), ref, None,
+                                       REFERENCE))
+                    continue
+
+                association = association_of(k, ref)
+                if association is not None:
+                    multiplicity, slot, inverse = association
+                    if multiplicity != MANY_TO_MANY or inverse < slot:
+                        continue
+                # Some lists are plain attributes instead of properties
+                # (e.g. CIM14 ProtectionEquipment.ProtectedSwitches).
+                if isinstance(getattr(k, ref, None), property):
+                    self.many.append((self._tag(k, ref), "_" + ref))
+                else:
+                    self.many.append((self._tag(k, ref), ref))
+
+        rdf = nsPrefixRDF
+        self.start = u"<%s %s:ID=\"" % (escape_cdata(self.tag), rdf)
+        self.end = u"</%s>" % escape_cdata(self.tag)
+
+        self.fragments = []
+        for tag, attr, value, kind in attributes:
+            tag = escape_cdata(tag)
+            if kind == ATTRIBUTE:
+                start, end = u"<%s>" % tag, u"</%s>" % tag
+            elif kind == ENUM:
+                start = u"<%s %s:resource=\"%s" % (tag, rdf,
+                                                   escape_attrib(value))
+                end = u"\" />"
+            else:
+                start, end = u"<%s %s:resource=\"#" % (tag, rdf), u"\" />"
+            self.fragments.append((attr, kind, value, start, end))
+
+        self.links = [(slot, u"<%s %s:resource=\"#" %
+                       (escape_cdata(tag), rdf), u"\" />")
+                      for tag, slot in self.many]
 
-    logger.info("%d CIM objects serialised in %.2fs.", len(d), time() - t0)
+    def _tag(self, k, name):
+        return u"%s:%s.%s" % (nsPrefix, k.__name__, name)
 
 
 if __name__ == "__main__":
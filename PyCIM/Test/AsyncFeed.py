@@ -0,0 +1,66 @@
+# Copyright (C) 2010-2011 Richard Lincoln
+# Copyright (C) 2011 Stefan Scherfke
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+"""Reads a document fed to a CIMFeedParser by an asyncio coroutine.
+
+Coroutines are only valid syntax from Python 3.5 and asyncio.run is new in
+3.7, so this module is only imported by the tests on those versions.
+"""
+
+import asyncio
+
+from PyCIM import CIMFeedParser
+
+
+async def receive(reader):
+    """Parses the data read from the given stream reader and returns the
+    map of objects read and the number of objects seen as they were read.
+    """
+    p = CIMFeedParser()
+    n = 0
+    while True:
+        chunk = await reader.read(1 << 12)
+        if not chunk:
+            break
+        p.feed(chunk)
+        n += len(p.read_objects())
+    d = p.close()
+    return d, n + len(p.read_objects())
+
+
+def read_async(data, size=5000):
+    """Feeds the given data to a stream reader in chunks of the given size,
+    one per iteration of the event loop, and returns the result of
+    L{receive}.
+    """
+    async def main():
+        reader = asyncio.StreamReader()
+        loop = asyncio.get_running_loop()
+        def send(i=0):
+            reader.feed_data(data[i:i + size])
+            if i + size < len(data):
+                loop.call_soon(send, i + size)
+            else:
+                reader.feed_eof()
+        loop.call_soon(send)
+        return await receive(reader)
+
+    return asyncio.run(main())
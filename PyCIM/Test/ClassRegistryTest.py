@@ -0,0 +1,85 @@
+# Copyright (C) 2010-2011 Richard Lincoln
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+import unittest
+
+import CIM14
+import CIM15
+import CIM14.ENTSOE.Equipment
+import CIM15.CDPSM.Balanced
+
+from PyCIM import class_registry
+from PyCIM.ClassRegistry import ClassRegistry
+
+
+class ClassRegistryTestCase(unittest.TestCase):
+    """Test the resolution of element tags to CIM classes.
+    """
+
+    def testQualifiedTags(self):
+        from CIM15.IEC61970.Core import Terminal
+
+        registry = class_registry(CIM15.packageMap, CIM15.nsURI)
+        tag = "{%s#}Terminal" % CIM15.nsURI
+
+        self.assertTrue(registry[tag] is Terminal)
+        self.assertTrue(tag in registry)
+        self.assertRaises(KeyError, registry.__getitem__,
+                          "{%s#}NoSuchClass" % CIM15.nsURI)
+        self.assertRaises(KeyError, registry.__getitem__,
+                          "{http://example.com#}Terminal")
+
+    def testClassNames(self):
+        from CIM14.IEC61970.Core import Terminal
+
+        registry = class_registry(CIM14.packageMap)
+        self.assertTrue(registry["Terminal"] is Terminal)
+
+    def testProfiles(self):
+        from CIM15.CDPSM.Balanced.IEC61970.Wires import ACLineSegment
+        from CIM14.ENTSOE.Equipment.Core import Terminal
+
+        registry = class_registry(CIM15.CDPSM.Balanced.packageMap,
+                                  CIM15.nsURI)
+        self.assertTrue(
+            registry["{%s#}ACLineSegment" % CIM15.nsURI] is ACLineSegment)
+
+        registry = class_registry(CIM14.ENTSOE.Equipment.packageMap,
+                                  CIM14.nsURI)
+        self.assertTrue(registry["{%s#}Terminal" % CIM14.nsURI] is Terminal)
+
+    def testCached(self):
+        registry = class_registry(CIM15.packageMap, CIM15.nsURI)
+
+        self.assertTrue(isinstance(registry, ClassRegistry))
+        self.assertTrue(
+            class_registry(CIM15.packageMap, CIM15.nsURI) is registry)
+        self.assertFalse(class_registry(CIM15.packageMap) is registry)
+
+    def testResolveAll(self):
+        registry = class_registry(CIM14.ENTSOE.Equipment.packageMap)
+        registry.resolve_all()
+
+        self.assertEqual(set(registry),
+                         set(CIM14.ENTSOE.Equipment.packageMap))
+
+
+if __name__ == "__main__":
+    unittest.main()
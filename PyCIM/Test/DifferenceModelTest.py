@@ -0,0 +1,203 @@
+# Copyright (C) 2010-2011 Richard Lincoln
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+import io
+import unittest
+
+from os.path import dirname, join
+
+from PyCIM import cimread, apply_difference
+from PyCIM.Test.ModelGraph import graph
+
+RDFXML_FILE = join(dirname(__file__), "Data", "EDF_AIGUE_v9_COMBINED.xml")
+
+# Opens breaker AIGUE0137, renames it, deletes breaker AIGUE0145 and
+# moves a terminal of transformer AIGUEY0001 to a new connectivity node.
+DIFFERENCE_CIM = u'''<?xml version=\'1.0\'?>
+<rdf:RDF xmlns:cim="http://iec.ch/TC57/2010/CIM-schema-cim15#"
+xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+xmlns:dm="http://iec.ch/2002/schema/CIM_difference_model#">
+ <dm:DifferenceModel rdf:about="#_DM1">
+  <dm:forwardDifferences rdf:parseType="Statements">
+   <cim:Breaker rdf:about="#_c7ae231d873f4f46a77e8370382c2e53">
+    <cim:Switch.normalOpen>true</cim:Switch.normalOpen>
+   </cim:Breaker>
+   <rdf:Description rdf:about="#_c7ae231d873f4f46a77e8370382c2e53">
+    <cim:IdentifiedObject.name>AIGUE0137B</cim:IdentifiedObject.name>
+   </rdf:Description>
+   <cim:ConnectivityNode rdf:ID="_CN1">
+    <cim:IdentifiedObject.name>CN1</cim:IdentifiedObject.name>
+   </cim:ConnectivityNode>
+   <rdf:Description rdf:about="#_e8057c5c26d644cb9d9d49a7594f1c63">
+    <cim:Terminal.ConnectivityNode rdf:resource="#_CN1"/>
+   </rdf:Description>
+  </dm:forwardDifferences>
+  <dm:reverseDifferences rdf:parseType="Statements">
+   <cim:Breaker rdf:about="#_c7ae231d873f4f46a77e8370382c2e53">
+    <cim:Switch.normalOpen>false</cim:Switch.normalOpen>
+   </cim:Breaker>
+   <rdf:Description rdf:about="#_c7ae231d873f4f46a77e8370382c2e53">
+    <cim:IdentifiedObject.name>AIGUE0137</cim:IdentifiedObject.name>
+   </rdf:Description>
+   <cim:Breaker rdf:about="#_7ddb47279b9340329bdd87c135db6331">
+    <cim:IdentifiedObject.name>AIGUE0145</cim:IdentifiedObject.name>
+    <cim:PowerSystemResource.PSRType rdf:resource="#_91ec40bdb59f47a6a4a78cdb4529d7"/>
+    <cim:PowerSystemResource.Location rdf:resource="#_a2644d8cfd7b4254bdfcbc98b8809752"/>
+    <cim:Equipment.EquipmentContainer rdf:resource="#_9d0c80ea1d7249f59a5eb3f145c02fc3"/>
+    <cim:Switch.normalOpen>false</cim:Switch.normalOpen>
+   </cim:Breaker>
+   <rdf:Description rdf:about="#_90ec99b29e6f499aa64cd840c485115a">
+    <cim:Terminal.ConductingEquipment rdf:resource="#_7ddb47279b9340329bdd87c135db6331"/>
+   </rdf:Description>
+   <rdf:Description rdf:about="#_54923781800a4456899a7be4bd67349f">
+    <cim:Terminal.ConductingEquipment rdf:resource="#_7ddb47279b9340329bdd87c135db6331"/>
+   </rdf:Description>
+   <rdf:Description rdf:about="#_e8057c5c26d644cb9d9d49a7594f1c63">
+    <cim:Terminal.ConnectivityNode rdf:resource="#_efa4afffec5846028aa4553b3090b94"/>
+   </rdf:Description>
+  </dm:reverseDifferences>
+ </dm:DifferenceModel>
+</rdf:RDF>'''
+
+# Renames breaker AIGUE0137, in statements that declare namespaces.
+NAMESPACE_CIM = u'''<?xml version=\'1.0\'?>
+<rdf:RDF xmlns:cim="http://iec.ch/TC57/2010/CIM-schema-cim15#"
+xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+xmlns:dm="http://iec.ch/2002/schema/CIM_difference_model#">
+ <dm:DifferenceModel rdf:about="#_DM1">
+  <dm:forwardDifferences rdf:parseType="Statements">
+   <rdf:Description rdf:about="#_c7ae231d873f4f46a77e8370382c2e53"
+    xmlns:foo="http://example.com/foo#">
+    <cim:IdentifiedObject.name>AIGUE0137B</cim:IdentifiedObject.name>
+   </rdf:Description>
+  </dm:forwardDifferences>
+  <dm:reverseDifferences rdf:parseType="Statements">
+   <rdf:Description rdf:about="#_c7ae231d873f4f46a77e8370382c2e53">
+    <cim:IdentifiedObject.name xmlns:bar="http://example.com/bar#"
+     >AIGUE0137</cim:IdentifiedObject.name>
+   </rdf:Description>
+  </dm:reverseDifferences>
+ </dm:DifferenceModel>
+</rdf:RDF>'''
+
+
+# Deletes breaker AIGUE0145, with a statement about it before its type.
+DELETE_CIM = u'''<?xml version=\'1.0\'?>
+<rdf:RDF xmlns:cim="http://iec.ch/TC57/2010/CIM-schema-cim15#"
+xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+xmlns:dm="http://iec.ch/2002/schema/CIM_difference_model#">
+ <dm:DifferenceModel rdf:about="#_DM1">
+  <dm:forwardDifferences rdf:parseType="Statements"/>
+  <dm:reverseDifferences rdf:parseType="Statements">
+   <rdf:Description rdf:about="#_7ddb47279b9340329bdd87c135db6331">
+    <cim:IdentifiedObject.name>AIGUE0145</cim:IdentifiedObject.name>
+   </rdf:Description>
+   <cim:Breaker rdf:about="#_7ddb47279b9340329bdd87c135db6331">
+    <cim:Switch.normalOpen>false</cim:Switch.normalOpen>
+   </cim:Breaker>
+  </dm:reverseDifferences>
+ </dm:DifferenceModel>
+</rdf:RDF>'''
+
+
+class DifferenceModelTestCase(unittest.TestCase):
+    """Test applying difference models.
+    """
+
+    def testApply(self):
+        d = cimread(RDFXML_FILE)
+        expected = graph(d, ordered=False)
+        n = len(d)
+
+        breaker = d["_c7ae231d873f4f46a77e8370382c2e53"]
+        deleted = d["_7ddb47279b9340329bdd87c135db6331"]
+        terminal = d["_e8057c5c26d644cb9d9d49a7594f1c63"]
+        node = terminal.ConnectivityNode
+
+        changes = apply_difference(d, io.StringIO(DIFFERENCE_CIM))
+        self.assertEqual(changes, {
+            "_c7ae231d873f4f46a77e8370382c2e53": "modify",
+            "_7ddb47279b9340329bdd87c135db6331": "delete",
+            "_90ec99b29e6f499aa64cd840c485115a": "modify",
+            "_54923781800a4456899a7be4bd67349f": "modify",
+            "_e8057c5c26d644cb9d9d49a7594f1c63": "modify",
+            "_CN1": "add"})
+        self.assertEqual(len(d), n)
+
+        self.assertEqual(breaker.normalOpen, True)
+        self.assertEqual(breaker.name, "AIGUE0137B")
+
+        # Both ends of the associations are updated.
+        self.assertFalse("_7ddb47279b9340329bdd87c135db6331" in d)
+        self.assertEqual(deleted.Terminals, [])
+        self.assertTrue(deleted.Location is None)
+        self.assertFalse(deleted in
+                         d["_a2644d8cfd7b4254bdfcbc98b8809752"].PowerSystemResources)
+        self.assertTrue(terminal.ConnectivityNode is d["_CN1"])
+        self.assertEqual(d["_CN1"].Terminals, [terminal])
+        self.assertFalse(terminal in node.Terminals)
+
+        # Rolled back.
+        changes = apply_difference(d, io.StringIO(DIFFERENCE_CIM),
+                                   reverse=True)
+        self.assertEqual(changes["_7ddb47279b9340329bdd87c135db6331"], "add")
+        self.assertEqual(changes["_CN1"], "delete")
+        self.assertEqual(graph(d, ordered=False), expected)
+
+    def testNamespaces(self):
+        d = cimread(RDFXML_FILE)
+        breaker = d["_c7ae231d873f4f46a77e8370382c2e53"]
+
+        changes = apply_difference(d, io.StringIO(NAMESPACE_CIM))
+        self.assertEqual(changes,
+                         {"_c7ae231d873f4f46a77e8370382c2e53": "modify"})
+        self.assertEqual(breaker.name, "AIGUE0137B")
+
+    def testDeleteOrder(self):
+        d = cimread(RDFXML_FILE)
+        breaker = d["_7ddb47279b9340329bdd87c135db6331"]
+        terminals = breaker.Terminals
+
+        changes = apply_difference(d, io.StringIO(DELETE_CIM))
+        self.assertEqual(changes,
+                         {"_7ddb47279b9340329bdd87c135db6331": "delete"})
+        self.assertFalse(breaker.UUID in d)
+        for terminal in terminals:
+            self.assertEqual(terminal.ConductingEquipment, None)
+
+    def testChangeSet(self):
+        from CIM15.IEC61970.Informative.InfOperations import ChangeSet
+
+        d = cimread(RDFXML_FILE)
+        change_set = ChangeSet(UUID="_CS1")
+        changes = apply_difference(d, io.StringIO(DIFFERENCE_CIM),
+                                   change_set=change_set)
+
+        items = change_set.ChangeItems
+        self.assertEqual([item.kind for item in items], list(changes.values()))
+        self.assertEqual([item.sequenceNumber for item in items],
+                         list(range(len(changes))))
+        self.assertTrue(items[0].PowerSystemResource is
+                        d["_c7ae231d873f4f46a77e8370382c2e53"])
+        self.assertTrue(items[1].PowerSystemResource is None) # deleted
+
+
+if __name__ == "__main__":
+    unittest.main()
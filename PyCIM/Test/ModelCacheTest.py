@@ -0,0 +1,199 @@
+# Copyright (C) 2010-2011 Richard Lincoln
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+import io
+import os
+import logging
+import shutil
+import tempfile
+import unittest
+
+from os.path import dirname, join
+
+from PyCIM import cimread, cimwrite, ModelCache
+
+from CIM15 import nsURI as nsURICIM15
+from CIM15.CDPSM.Geographical import packageMap as geoMap
+
+RDFXML_FILE = join(dirname(__file__), "Data", "EDF_AIGUE_v9_COMBINED.xml")
+GEO_FILE = join(dirname(__file__), "Data", "EDF_AIGUE_v9_GEO.xml")
+
+
+def written(d):
+    output = io.StringIO()
+    cimwrite(d, output)
+    return output.getvalue()
+
+
+class ModelCacheTestCase(unittest.TestCase):
+    """Test storing and loading parsed models.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = ModelCache(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testRoundTrip(self):
+        expected = cimread(RDFXML_FILE)
+
+        d = cimread(RDFXML_FILE, cache=self.cache)
+        self.assertEqual(len(self.cache.entries()), 1)
+        self.assertEqual(written(d), written(expected))
+
+        d = cimread(RDFXML_FILE, cache=self.directory)
+        self.assertEqual(list(d.keys()), list(expected.keys()))
+        self.assertEqual(written(d), written(expected))
+
+        # Both ends of the references are restored.
+        terminal = d["_e8057c5c26d644cb9d9d49a7594f1c63"]
+        self.assertTrue(terminal in terminal.ConnectivityNode.Terminals)
+        self.assertTrue(terminal.ConductingEquipment is
+                        d[terminal.ConductingEquipment.UUID])
+
+    def testKeys(self):
+        key = self.cache.key(GEO_FILE, geoMap, nsURICIM15)
+        self.assertEqual(key, self.cache.key(GEO_FILE, geoMap, nsURICIM15))
+        self.assertNotEqual(key, self.cache.key(GEO_FILE))
+        self.assertNotEqual(key, self.cache.key(RDFXML_FILE, geoMap,
+                                                nsURICIM15))
+
+        # Projections are stored separately.
+        cimread(RDFXML_FILE, cache=self.cache)
+        d = cimread(RDFXML_FILE, cache=self.cache,
+                    include_classes=["Terminal"])
+        self.assertEqual(len(self.cache.entries()), 2)
+        self.assertEqual(set(obj.__class__.__name__ for obj in d.values()),
+                         set(["Terminal"]))
+
+        # Not used with a start_dict.
+        from CIM15.IEC61970.Core.ConnectivityNode import ConnectivityNode
+        start = {"_CN1": ConnectivityNode(UUID="_CN1")}
+        cimread(GEO_FILE, geoMap, nsURICIM15, start, cache=self.cache)
+        self.assertEqual(len(self.cache.entries()), 2)
+
+    def testInvalidation(self):
+        from CIM15.IEC61970.Core.Terminal import Terminal
+
+        key = self.cache.key(RDFXML_FILE)
+        cimread(RDFXML_FILE, cache=self.cache)
+        self.assertTrue(self.cache.load(key) is not None)
+
+        defaults = Terminal._defaults
+        Terminal._defaults = dict(defaults, sequenceNumber=1)
+        try:
+            self.assertTrue(self.cache.load(key) is None)
+            self.assertFalse(os.path.exists(self.cache.path(key)))
+        finally:
+            Terminal._defaults = defaults
+
+        f = open(self.cache.path(key), "wb")
+        f.write(b"corrupt")
+        f.close()
+        self.assertTrue(self.cache.load(key) is None)
+        self.assertEqual(self.cache.entries(), [])
+
+    def testMalformedSnapshot(self):
+        import marshal
+
+        key = self.cache.key(GEO_FILE)
+        cimread(GEO_FILE, cache=self.cache)
+        f = open(self.cache.path(key), "rb")
+        snapshot = list(marshal.load(f))
+        f.close()
+
+        # Classes of objects out of range.
+        snapshot[4] = [len(snapshot[2])] * len(snapshot[4])
+        f = open(self.cache.path(key), "wb")
+        marshal.dump(tuple(snapshot), f)
+        f.close()
+        self.assertTrue(self.cache.load(key) is None)
+        self.assertEqual(self.cache.entries(), [])
+
+    def testStoreErrors(self):
+        import importlib
+        module = importlib.import_module("PyCIM.ModelCache")
+
+        def fail(src, dst):
+            raise error
+
+        d = cimread(GEO_FILE, geoMap, nsURICIM15)
+        replace = module._replace
+        module._replace = fail
+        try:
+            error = OSError("No space left on device")
+            self.assertFalse(self.cache.store("a", d))
+            error = RuntimeError()
+            self.assertRaises(RuntimeError, self.cache.store, "a", d)
+        finally:
+            module._replace = replace
+        # No temporary files are left.
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def testEviction(self):
+        d = cimread(GEO_FILE, geoMap, nsURICIM15)
+        self.cache.store("a", d)
+        self.cache.store("b", d)
+        size = self.cache.entries()[0][1]
+
+        # Loading marks a snapshot as recently used.
+        os.utime(self.cache.path("b"), (0, 0))
+        self.cache.load("b")
+        os.utime(self.cache.path("a"), (1, 1))
+
+        self.cache.max_size = 2 * size
+        self.cache.store("c", d)
+        self.assertEqual(sorted(os.path.basename(path)
+                                for path, _, _ in self.cache.entries()),
+                         ["b.cim", "c.cim"])
+
+    def testPlaceholders(self):
+        # Placeholders are not snapshotted, so the cache is bypassed.
+        from PyCIM import RDFXMLReader
+        from PyCIM.RDFXMLReader import unresolved
+
+        class Handler(logging.Handler):
+            def emit(self, record):
+                messages.append(record.getMessage())
+
+        messages = []
+        handler = Handler(logging.WARNING)
+        logger = logging.getLogger(RDFXMLReader.__name__)
+        logger.addHandler(handler)
+        try:
+            for _ in range(2):
+                d = cimread(GEO_FILE, cache=self.cache, placeholders=True)
+                self.assertNotEqual(unresolved(d), {})
+        finally:
+            logger.removeHandler(handler)
+        self.assertEqual(self.cache.entries(), [])
+        self.assertTrue(any("cache" in m for m in messages))
+
+    def testReferencesOutsideModel(self):
+        d = cimread(RDFXML_FILE)
+        d.pop("_e8057c5c26d644cb9d9d49a7594f1c63")
+        self.assertFalse(self.cache.store("a", d))
+        self.assertEqual(self.cache.entries(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+# Copyright (C) 2010-2011 Richard Lincoln
+# Copyright (C) 2011 Stefan Scherfke
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+"""Comparable forms of the models read and written by the tests.
+"""
+
+
+def graph(d, ordered=True):
+    """Returns a map of uuid to the class name, attribute values and
+    referenced uuids of each object of the model. The uuids of many valued
+    references are sorted unless ordered is set.
+    """
+    graph = {}
+    for uuid, obj in d.items():
+        values = [obj.__class__.__name__]
+        for klass in obj.__class__.mro()[:-1]:
+            for attr in klass.__dict__.get("_attrs", []):
+                values.append(getattr(obj, attr))
+            for ref in klass.__dict__.get("_refs", []):
+                val = getattr(obj, ref)
+                if isinstance(val, list):
+                    uuids = [v.UUID for v in val]
+                    values.append(uuids if ordered else sorted(uuids))
+                else:
+                    values.append(getattr(val, "UUID", val))
+        graph[uuid] = values
+    return graph
+
+
+def references(d):
+    """Returns the set of (uuid, reference, uuid) triples of the model.
+    """
+    refs = set()
+    for uuid, obj in d.items():
+        for klass in obj.__class__.mro()[:-2]:
+            for ref in klass._refs:
+                val = getattr(obj, ref)
+                for v in (val if isinstance(val, list) else [val]):
+                    if v is not None and hasattr(v, "UUID"):
+                        refs.add((uuid, ref, v.UUID))
+    return refs
@@ -0,0 +1,894 @@
+# Copyright (C) 2010-2011 Richard Lincoln
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+"""Benchmarks for the CIM RDF/XML parser.
+
+Run all benchmarks or only the named ones with::
+
+  $ python -m PyCIM.Test.RDFXMLReaderBenchmark [name ...]
+
+The single_pass benchmark also times the reader of the git revision given
+by the PYCIM_BASELINE environment variable, if set, e.g. the revision
+before single pass reading.
+"""
+
+import os
+import re
+import sys
+import types
+import logging
+import tempfile
+import subprocess
+
+from time import time
+from os.path import dirname, join
+
+from PyCIM import cimread, cimread_many
+from PyCIM.RDFXMLReader import _parser, _ModelBuilder
+
+
+RDFXML_FILE = join(dirname(__file__), "Data", "EDF_AIGUE_v9_COMBINED.xml")
+
+PROFILE_FILES = [join(dirname(__file__), "Data", "EDF_AIGUE_v9_%s.xml" % p)
+                 for p in ("ASSET", "CONN", "EQUIP", "GEO")]
+
+_ID = re.compile(r'(rdf:(?:ID="|about="#|resource="#))([^"]+)"')
+
+
+def replicate(source, copies, target):
+    """Writes a model with the given number of copies of the objects in
+    source to the target path. The uuids of each copy are suffixed with the
+    copy number so that the copies are disjoint.
+    """
+    with open(source) as f:
+        text = f.read()
+
+    # Split after the start tag and before the end tag of the root element.
+    i = text.index(">", text.index("<rdf:RDF")) + 1
+    j = text.rindex("</rdf:RDF>")
+    head, body, tail = text[:i], text[i:j], text[j:]
+
+    with open(target, "w") as f:
+        f.write(head)
+        for i in range(copies):
+            f.write(_ID.sub(r'\1\2_%d"' % i, body))
+        f.write(tail)
+
+    return target
+
+
+def timed(func, *args, **kw_args):
+    """Returns the best wall-clock time of three calls of func and the
+    value returned by the last call.
+    """
+    best = None
+    for _ in range(3):
+        t0 = time()
+        result = func(*args, **kw_args)
+        t = time() - t0
+        best = t if best is None else min(best, t)
+    return best, result
+
+
+def report(name, t, n, t_ref=None):
+    line = "  %-28s %8.3fs %10.0f objects/s" % (name, t, n / t)
+    if t_ref is not None:
+        line += "  x%.2f" % (t_ref / t)
+    print(line)
+
+
+def baseline_reader(revision):
+    """Returns the module of the RDF/XML reader at the given git revision,
+    or None if it can not be read.
+    """
+    try:
+        source = subprocess.check_output(
+            ["git", "show", "%s:PyCIM/RDFXMLReader.py" % revision],
+            cwd=dirname(__file__))
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    source = source.decode("utf-8")
+    if sys.version_info >= (3, 9):
+        # Older readers import cElementTree, removed in Python 3.9.
+        source = source.replace("xml.etree.cElementTree",
+                                "xml.etree.ElementTree")
+    module = types.ModuleType("RDFXMLReader_%s" % revision)
+    exec(compile(source, "%s:RDFXMLReader.py" % revision, "exec"),
+         module.__dict__)
+    return module
+
+
+def bench_single_pass(copies=100, baseline=os.environ.get("PYCIM_BASELINE")):
+    """Baseline reader versus two pass and single pass reading."""
+    reader = baseline_reader(baseline) if baseline else None
+    if baseline and reader is None:
+        print("  revision %s not found" % baseline)
+
+    tmp = tempfile.mkdtemp()
+    try:
+        for path in (RDFXML_FILE, replicate(RDFXML_FILE, copies,
+                join(tmp, "replicated.xml"))):
+            print("%s (%d bytes)" % (os.path.basename(path),
+                                     os.path.getsize(path)))
+            t0 = None
+            if reader is not None:
+                t0, d = timed(reader.cimread, path)
+                report("baseline %s" % baseline, t0, len(d))
+            t2, d = timed(cimread, path)
+            report("two pass", t2, len(d), t0)
+            t1, d = timed(cimread, path, single_pass=True)
+            report("single pass", t1, len(d), t0 or t2)
+    finally:
+        for name in os.listdir(tmp):
+            os.remove(join(tmp, name))
+        os.rmdir(tmp)
+
+
+def _populate_dynamic(d, m, properties, obj):
+    """Sets attributes and references by inspecting the object, as the
+    reader did before property plans.
+    """
+    for tag, text, uuid2 in properties:
+        attr = tag[m:].rsplit(".")[-1]
+        if not hasattr(obj, attr):
+            continue
+        if uuid2 is None:
+            try:
+                typ = type(getattr(obj, attr))
+                if typ == type(True):
+                    setattr(obj, attr, str.title(text) == 'True')
+                else:
+                    setattr(obj, attr, typ(text))
+            except TypeError:
+                pass
+        elif uuid2[0] == "#":
+            val = d.get(uuid2[1:])
+            if val is None:
+                continue
+            default = getattr(obj, attr)
+            if default == None:
+                setattr(obj, attr, val)
+            elif isinstance(default, list):
+                getattr(obj, ("add%s" % attr))(val)
+        else:
+            setattr(obj, attr, uuid2.rsplit(".", 1)[1])
+
+
+def bench_property_plans(copies=10):
+    """Property throughput with and without compiled property plans."""
+    import CIM15
+
+    tmp = tempfile.mkdtemp()
+    try:
+        path = replicate(RDFXML_FILE, copies, join(tmp, "replicated.xml"))
+        elements = _parser("etree")(path)
+        next(elements) # namespaces
+        elements = [e for e in elements if not e[2]]
+    finally:
+        os.remove(path)
+        os.rmdir(tmp)
+    n = sum(len(e[3]) for e in elements)
+
+    def build():
+        builder = _ModelBuilder({}, CIM15.packageMap, CIM15.nsURI)
+        for tag, uuid, about, properties in elements:
+            builder.instantiate(tag, uuid)
+        return builder
+
+    def dynamic(builder):
+        d, m = builder.d, builder.m
+        for tag, uuid, about, properties in elements:
+            _populate_dynamic(d, m, properties, d[uuid])
+
+    def planned(builder):
+        for tag, uuid, about, properties in elements:
+            builder.populate(tag, uuid, about, properties)
+
+    times = {}
+    for name, populate in (("dynamic", dynamic), ("plans", planned)):
+        best = None
+        for _ in range(3):
+            builder = build()
+            t0 = time()
+            populate(builder)
+            t = time() - t0
+            best = t if best is None else min(best, t)
+        times[name] = best
+
+    for name in ("dynamic", "plans"):
+        t = times[name]
+        line = "  %-28s %8.3fs %10.0f properties/s" % (name, t, n / t)
+        if name != "dynamic":
+            line += "  x%.2f" % (times["dynamic"] / t)
+        print(line)
+
+
+def bench_read_many(copies=20):
+    """Sequential versus parallel reading of the profile files."""
+    from multiprocessing import cpu_count
+
+    tmp = tempfile.mkdtemp()
+    try:
+        paths = [replicate(path, copies, join(tmp, os.path.basename(path)))
+                 for path in PROFILE_FILES]
+        print("%d profile files (%d bytes), %d CPUs" % (len(paths),
+              sum(os.path.getsize(p) for p in paths), cpu_count()))
+
+        def sequential():
+            d = {}
+            for path in paths:
+                d.update(cimread(path))
+            return d
+
+        t0, d = timed(sequential)
+        report("cimread + dict.update", t0, len(d))
+        for processes in (1, 2, 4, 8):
+            t, d = timed(cimread_many, paths, processes=processes)
+            report("cimread_many (%d processes)" % processes, t, len(d), t0)
+    finally:
+        for name in os.listdir(tmp):
+            os.remove(join(tmp, name))
+        os.rmdir(tmp)
+
+
+def bench_chunked(copies=30):
+    """Serial versus chunked parallel reading of a single file."""
+    from multiprocessing import cpu_count
+
+    tmp = tempfile.mkdtemp()
+    try:
+        path = replicate(RDFXML_FILE, copies, join(tmp, "replicated.xml"))
+        print("%s (%d bytes), %d CPUs" % (os.path.basename(path),
+              os.path.getsize(path), cpu_count()))
+
+        t0, d = timed(cimread, path)
+        report("two pass", t0, len(d))
+        for processes in (1, 2, 4, 8):
+            t, d = timed(cimread, path, processes=processes)
+            report("chunked (%d processes)" % processes, t, len(d), t0)
+    finally:
+        for name in os.listdir(tmp):
+            os.remove(join(tmp, name))
+        os.rmdir(tmp)
+
+
+def bench_parsers(copies=10):
+    """Parsing and reading with each of the parser backends."""
+    tmp = tempfile.mkdtemp()
+    try:
+        for path in (RDFXML_FILE, replicate(RDFXML_FILE, copies,
+                join(tmp, "replicated.xml"))):
+            print("%s (%d bytes)" % (os.path.basename(path),
+                                     os.path.getsize(path)))
+
+            def parse(name):
+                n = 0
+                elements = _parser(name)(path)
+                next(elements) # namespaces
+                for element in elements:
+                    n += 1
+                return n
+
+            t_parse = t_read = None
+            for name in ("etree", "expat", "lxml"):
+                try:
+                    t, n = timed(parse, name)
+                except ImportError:
+                    print("  %-28s not installed" % name)
+                    continue
+                report("%s parse" % name, t, n, t_parse)
+                t_parse = t_parse or t
+
+                t, d = timed(cimread, path, parser=name)
+                report("%s cimread" % name, t, len(d), t_read)
+                t_read = t_read or t
+    finally:
+        for name in os.listdir(tmp):
+            os.remove(join(tmp, name))
+        os.rmdir(tmp)
+
+
+def shared_base_voltage(n, target):
+    """Writes a model of n breakers with the same base voltage to the
+    target path.
+    """
+    with open(target, "w") as f:
+        f.write('<?xml version="1.0"?>\n'
+                '<rdf:RDF xmlns:cim="http://iec.ch/TC57/2010/CIM-schema-cim15#" '
+                'xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">\n'
+                '<cim:BaseVoltage rdf:ID="_BV"/>\n')
+        for i in range(n):
+            f.write('<cim:Breaker rdf:ID="_B%d"><cim:ConductingEquipment.'
+                    'BaseVoltage rdf:resource="#_BV"/></cim:Breaker>\n' % i)
+        f.write('</rdf:RDF>\n')
+    return target
+
+
+def bench_bulk_link(sizes=(10000, 50000, 100000, 500000), max_setters=100000):
+    """Linking through the setters versus bulk linking, for equipment
+    sharing one base voltage."""
+    tmp = tempfile.mkdtemp()
+    try:
+        for n in sizes:
+            path = shared_base_voltage(n, join(tmp, "shared.xml"))
+            print("%d breakers, one base voltage" % n)
+            t0 = None
+            if n <= max_setters:
+                t0, d = timed(cimread, path)
+                report("setters", t0, len(d))
+            t, d = timed(cimread, path, bulk_link=True)
+            report("bulk link", t, len(d), t0)
+            os.remove(path)
+    finally:
+        os.rmdir(tmp)
+
+
+def traced(func, *args, **kw_args):
+    """Returns the peak memory allocated during a call of func.
+    """
+    import tracemalloc
+
+    tracemalloc.start()
+    try:
+        func(*args, **kw_args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_projection(copies=10):
+    """Time and peak memory of reading a full model versus projections."""
+    projections = [
+        ("full model", {}),
+        ("topology", dict(
+            include_classes=["Terminal", "ConnectivityNode", "Switch"],
+            include_attributes={"IdentifiedObject": ["name"],
+                "Terminal": ["ConnectivityNode", "ConductingEquipment"]})),
+        ("no geography", dict(
+            exclude_classes=["Location", "PositionPoint",
+                             "CoordinateSystem"])),
+        ("SvVoltage only", dict(include_classes=["SvVoltage"])),
+    ]
+
+    tmp = tempfile.mkdtemp()
+    try:
+        path = replicate(RDFXML_FILE, copies, join(tmp, "replicated.xml"))
+        print("%s (%d bytes)" % (os.path.basename(path),
+                                 os.path.getsize(path)))
+        t0 = None
+        for name, kw_args in projections:
+            t, d = timed(cimread, path, **kw_args)
+            line = "  %-28s %8.3fs %8d objects" % (name, t, len(d))
+            if t0 is not None:
+                line += "  x%.2f" % (t0 / t)
+            del d
+            peak = traced(cimread, path, **kw_args)
+            print(line + "  %6.1f MB peak" % (peak / 1e6))
+            t0 = t0 or t
+    finally:
+        os.remove(path)
+        os.rmdir(tmp)
+
+
+def bench_conversion(copies=10):
+    """Time of a read versus that of converting its attribute text."""
+    import CIM15
+    from PyCIM.RDFXMLReader import ATTRIBUTE
+
+    tmp = tempfile.mkdtemp()
+    try:
+        path = replicate(RDFXML_FILE, copies, join(tmp, "replicated.xml"))
+        print("%s (%d bytes)" % (os.path.basename(path),
+                                 os.path.getsize(path)))
+        t_read, d = timed(cimread, path)
+        report("read", t_read, len(d))
+        del d
+
+        # Text of the attributes that are not strings, with the function
+        # converting it.
+        builder = _ModelBuilder({}, CIM15.packageMap, CIM15.nsURI)
+        values = []
+        elements = _parser("etree")(path)
+        next(elements) # namespaces
+        for tag, uuid, about, properties in elements:
+            try:
+                klass = builder.registry[tag]
+            except KeyError:
+                continue
+            try:
+                plan = builder.plans[klass]
+            except KeyError:
+                plan = builder.compile(klass)
+            for tag, text, uuid2 in properties:
+                kind, attr, func = plan[tag]
+                if uuid2 is None and kind == ATTRIBUTE and func is not str:
+                    values.append((func, text))
+    finally:
+        os.remove(path)
+        os.rmdir(tmp)
+
+    def convert():
+        for func, text in values:
+            try:
+                func(text)
+            except (TypeError, ValueError):
+                pass
+
+    t, _ = timed(convert)
+    print("  %-28s %8.3fs %10d values     %4.1f%% of the read" %
+          ("conversion", t, len(values), 100 * t / t_read))
+
+
+def bench_cache(copies=(10, 30)):
+    """Parsing versus loading from the model cache."""
+    import shutil
+    from PyCIM import ModelCache
+
+    for n in copies:
+        tmp = tempfile.mkdtemp()
+        try:
+            path = replicate(RDFXML_FILE, n, join(tmp, "replicated.xml"))
+            cache = ModelCache(join(tmp, "cache"))
+
+            t_parse, d = timed(cimread, path)
+            t0 = time()
+            cache.store(cache.key(path), d)
+            t_store = time() - t0
+            del d
+            size = cache.entries()[0][1]
+
+            print("%s (%d bytes), %d byte snapshot" % (
+                os.path.basename(path), os.path.getsize(path), size))
+            t_load, d = timed(cimread, path, cache=cache)
+            report("parse", t_parse, len(d))
+            report("store snapshot", t_store, len(d))
+            report("load from cache", t_load, len(d), t_parse)
+            del d
+        finally:
+            shutil.rmtree(tmp)
+
+
+def links(d):
+    """Returns the number of references set on the objects of the model.
+    """
+    n = 0
+    for obj in d.values():
+        for value in obj.__dict__.values():
+            if isinstance(value, list):
+                n += len(value)
+            elif hasattr(value, "UUID"):
+                n += 1
+    return n
+
+
+def bench_placeholders(copies=(10, 20)):
+    """Reading the profile files one at a time into the same map, with and
+    without placeholders, versus reading them together."""
+    from PyCIM.RDFXMLReader import unresolved
+
+    for n in copies:
+        tmp = tempfile.mkdtemp()
+        try:
+            paths = [replicate(path, n, join(tmp, os.path.basename(path)))
+                     for path in PROFILE_FILES]
+            print("%d profile files (%d bytes)" % (len(paths),
+                  sum(os.path.getsize(p) for p in paths)))
+
+            def incremental(**kw_args):
+                d = {}
+                for path in paths:
+                    cimread(path, start_dict=d, **kw_args)
+                return d
+
+            t0, d = timed(cimread_many, paths, processes=1)
+            report("cimread_many (1 process)", t0, len(d))
+            expected = links(d)
+            del d
+
+            for name, kw_args in [("start_dict", {}),
+                                  ("start_dict + placeholders",
+                                   dict(placeholders=True))]:
+                t, d = timed(incremental, **kw_args)
+                report(name, t, len(d), t0)
+                print("  %-28s %d of %d references, %d unresolved" % (
+                      "", links(d), expected, len(unresolved(d))))
+                del d
+        finally:
+            for name in os.listdir(tmp):
+                os.remove(join(tmp, name))
+            os.rmdir(tmp)
+
+
+def difference(d, n):
+    """Returns a difference model that renames n objects and moves n
+    terminals to the connectivity node of the next terminal.
+    """
+    import CIM15
+
+    objects = [obj for obj in d.values() if getattr(obj, "name", None)][:n]
+    terminals = [obj for obj in d.values()
+                 if obj.__class__.__name__ == "Terminal" and
+                 obj.ConnectivityNode is not None][:n + 1]
+
+    forward, reverse = [], []
+    for obj in objects:
+        for name, section in ((obj.name + "X", forward),
+                              (obj.name, reverse)):
+            section.append('<rdf:Description rdf:about="#%s"><cim:Identified'
+                           'Object.name>%s</cim:IdentifiedObject.name>'
+                           '</rdf:Description>' % (obj.UUID, name))
+    for t, other in zip(terminals, terminals[1:]):
+        for node, section in ((other.ConnectivityNode, forward),
+                              (t.ConnectivityNode, reverse)):
+            section.append('<rdf:Description rdf:about="#%s"><cim:Terminal.'
+                           'ConnectivityNode rdf:resource="#%s"/>'
+                           '</rdf:Description>' % (t.UUID, node.UUID))
+
+    return ('<?xml version="1.0"?><rdf:RDF xmlns:cim="%s#" xmlns:rdf='
+            '"http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns:dm='
+            '"http://iec.ch/2002/schema/CIM_difference_model#">'
+            '<dm:DifferenceModel rdf:about="#_DM">'
+            '<dm:forwardDifferences>%s</dm:forwardDifferences>'
+            '<dm:reverseDifferences>%s</dm:reverseDifferences>'
+            '</dm:DifferenceModel></rdf:RDF>' % (CIM15.nsURI,
+            "".join(forward), "".join(reverse)))
+
+
+def bench_difference(copies=(10, 30), n=1000):
+    """Applying a difference model versus reading the whole model."""
+    import io
+    from PyCIM import apply_difference
+
+    for c in copies:
+        tmp = tempfile.mkdtemp()
+        try:
+            path = replicate(RDFXML_FILE, c, join(tmp, "replicated.xml"))
+            t0, d = timed(cimread, path)
+            text = difference(d, n)
+            print("%s (%d bytes), difference of %d statements (%d bytes)" % (
+                os.path.basename(path), os.path.getsize(path), 2 * n,
+                len(text)))
+            report("cimread", t0, len(d))
+
+            def forward_and_back():
+                apply_difference(d, io.StringIO(text))
+                apply_difference(d, io.StringIO(text), reverse=True)
+
+            t, _ = timed(forward_and_back)
+            print("  %-28s %8.3fs  x%.1f" % ("apply + roll back", t, t0 / t))
+            del d
+        finally:
+            os.remove(path)
+            os.rmdir(tmp)
+
+
+def bench_stats(copies=10):
+    """Reading without and with statistics and a progress callback."""
+    import gc
+    from PyCIM import ReaderStats
+
+    modes = (("without stats", {}),
+             ("with stats", {"stats": ReaderStats()}),
+             ("with stats and progress", {"stats": ReaderStats(),
+                                          "progress": lambda stats: None,
+                                          "progress_interval": 0.1}))
+
+    tmp = tempfile.mkdtemp()
+    try:
+        path = replicate(RDFXML_FILE, copies, join(tmp, "replicated.xml"))
+        print("%s (%d bytes)" % (os.path.basename(path),
+                                 os.path.getsize(path)))
+
+        # Alternate the modes, as timings drift as the heap grows.
+        times = {}
+        for _ in range(5):
+            for name, kw_args in modes:
+                gc.collect()
+                t0 = time()
+                n = len(cimread(path, **kw_args))
+                t = time() - t0
+                times[name] = min(times.get(name, t), t)
+
+        for name, _ in modes:
+            report(name, times[name], n, times[modes[0][0]])
+
+        stats = modes[1][1]["stats"]
+        print("  phases: " + ", ".join("%s %.3fs" % (phase, t)
+                                       for phase, t in stats.phases.items()))
+        print("  %.1f MB/s, %.0f elements/s, peak RSS %s" % (
+            stats.bytes_per_second / 1e6, stats.elements_per_second,
+            "%.0f MB" % (stats.peak_rss / 1e6) if stats.peak_rss else "n/a"))
+    finally:
+        os.remove(path)
+        os.rmdir(tmp)
+
+
+def bench_feed(copies=10, size=1 << 16):
+    """Reading a buffered document versus feeding it in chunks."""
+    from io import BytesIO
+    from PyCIM import CIMFeedParser
+
+    def fed(data, parser):
+        p = CIMFeedParser(parser=parser)
+        calls = []
+        for i in range(0, len(data), size):
+            t0 = time()
+            p.feed(data[i:i + size])
+            p.read_objects()
+            calls.append(time() - t0)
+        d = p.close()
+        calls.sort()
+        return d, (calls[len(calls) // 2], calls[-1])
+
+    tmp = tempfile.mkdtemp()
+    try:
+        path = replicate(RDFXML_FILE, copies, join(tmp, "replicated.xml"))
+        f = open(path, "rb")
+        try:
+            data = f.read()
+        finally:
+            f.close()
+        print("%s (%d bytes), %d byte chunks" % (os.path.basename(path),
+                                                 len(data), size))
+
+        t0, d = timed(lambda: cimread(BytesIO(data)))
+        report("cimread (buffered)", t0, len(d))
+        t, _ = timed(lambda: cimread(BytesIO(data), single_pass=True))
+        report("cimread single pass", t, len(d), t0)
+        for parser in ("expat", "etree"):
+            t, (d, (median, longest)) = timed(fed, data, parser)
+            report("feed (%s)" % parser, t, len(d), t0)
+            # The longest calls include full garbage collections.
+            print("    feed() call: median %.4fs, longest %.3fs" % (
+                median, longest))
+    finally:
+        os.remove(path)
+        os.rmdir(tmp)
+
+
+def bench_memory_map(copies=10):
+    """Reading through buffered files versus memory maps."""
+    from PyCIM.RDFXMLReader import _map_file, _split, _count_elements
+
+    tmp = tempfile.mkdtemp()
+    try:
+        path = replicate(RDFXML_FILE, copies, join(tmp, "replicated.xml"))
+        print("%s (%d bytes)" % (os.path.basename(path),
+                                 os.path.getsize(path)))
+
+        data = _map_file(path)
+        t, spans = timed(_split, data, 16)
+        print("  %-28s %8.3fs" % ("split in %d chunks" % len(spans[2]), t))
+        t, n = timed(_count_elements, data)
+        print("  %-28s %8.3fs" % ("count %d elements" % n, t))
+        del data
+
+        for name, kw_args in [("etree", {}), ("expat", {"parser": "expat"}),
+                              ("2 processes", {"processes": 2})]:
+            t0, d = timed(cimread, path, **kw_args)
+            report(name, t0, len(d))
+            t, _ = timed(cimread, path, memory_map=True, **kw_args)
+            report(name + ", memory map", t, len(d), t0)
+            del d
+    finally:
+        os.remove(path)
+        os.rmdir(tmp)
+
+
+class _Unshared(dict):
+    """Value cache that converts every value anew, as the reader did
+    before sharing them.
+    """
+
+    def __missing__(self, func):
+        return _Converter(func)
+
+
+class _Converter(object):
+
+    def __init__(self, func):
+        self.func = func
+
+    def __getitem__(self, text):
+        return self.func(text)
+
+
+class _UnsharedLiterals(dict):
+
+    def __missing__(self, resource):
+        return resource.rsplit(".", 1)[1]
+
+
+def bench_shared_values(copies=(1, 10)):
+    """Memory and time of reading with and without sharing values."""
+    import gc
+    import tracemalloc
+    from PyCIM import RDFXMLReader
+
+    def read(path, shared):
+        caches = RDFXMLReader._ValueCache, RDFXMLReader._Literals
+        if not shared:
+            RDFXMLReader._ValueCache = _Unshared
+            RDFXMLReader._Literals = _UnsharedLiterals
+        try:
+            return cimread(path)
+        finally:
+            RDFXMLReader._ValueCache, RDFXMLReader._Literals = caches
+
+    tmp = tempfile.mkdtemp()
+    try:
+        for c in copies:
+            path = replicate(RDFXML_FILE, c, join(tmp, "replicated.xml"))
+            print("%s (%d bytes)" % (os.path.basename(path),
+                                     os.path.getsize(path)))
+            cimread(path) # imports
+
+            sizes = {}
+            for name, shared in (("unshared", False), ("shared", True)):
+                gc.collect()
+                tracemalloc.start()
+                try:
+                    d = read(path, shared)
+                    size, peak = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+                n = len(d)
+                del d
+                sizes[name] = size
+                t, _ = timed(read, path, shared)
+                print("  %-28s %8.3fs %8.1f MB retained %8.1f MB peak" % (
+                    name, t, size / 1e6, peak / 1e6))
+
+            print("  %-28s %8.1f MB per million objects" % (
+                "saved", (sizes["unshared"] - sizes["shared"]) / n))
+            os.remove(path)
+    finally:
+        os.rmdir(tmp)
+
+
+def bench_sniff(files=1000):
+    """Sorting files by CIM version with the namespace map versus sniffing."""
+    import glob
+    from PyCIM import sniff
+    from PyCIM.RDFXMLReader import xmlns, get_cim_ns
+
+    def by_namespaces(paths):
+        return [get_cim_ns(xmlns(path))[0] for path in paths]
+
+    def by_sniffing(paths):
+        return [sniff(path).version for path in paths]
+
+    sources = sorted(glob.glob(join(dirname(__file__), "Data", "*.xml")))
+    tmp = tempfile.mkdtemp()
+    try:
+        paths = []
+        for i in range(files):
+            f = open(sources[i % len(sources)], "rb")
+            try:
+                head = f.read(1 << 16)
+            finally:
+                f.close()
+            path = join(tmp, "%d.xml" % i)
+            f = open(path, "wb")
+            try:
+                f.write(head)
+            finally:
+                f.close()
+            paths.append(path)
+        print("%d files" % files)
+
+        t0, _ = timed(by_namespaces, paths)
+        report("xmlns + get_cim_ns", t0, files)
+        t, _ = timed(by_sniffing, paths)
+        report("sniff", t, files, t0)
+    finally:
+        for path in paths:
+            os.remove(path)
+        os.rmdir(tmp)
+
+
+def dirty(source, target):
+    """Writes a copy of the model in source to the target path without its
+    connectivity nodes, so that the references of the terminals to them
+    are missing, and with an unknown attribute on each terminal.
+    """
+    with open(source) as f:
+        text = f.read()
+    text = re.sub(r"<cim:ConnectivityNode rdf:ID=.*?</cim:ConnectivityNode>",
+                  "", text, flags=re.S)
+    text = re.sub(r"(<cim:Terminal rdf:ID=[^>]*>)",
+                  r"\1<cim:Terminal.vendorCode>X</cim:Terminal.vendorCode>",
+                  text)
+    with open(target, "w") as f:
+        f.write(text)
+    return target
+
+
+def bench_issues(copies=10):
+    """Reading a clean and a dirty model, logging issues to a file."""
+    import gc
+    from PyCIM import ReaderIssues
+
+    tmp = tempfile.mkdtemp()
+    logger = logging.getLogger("PyCIM")
+    handler = logging.FileHandler(os.devnull)
+    level = logger.level
+    logger.addHandler(handler)
+    logger.setLevel(logging.WARNING)
+    logger.propagate = False
+    try:
+        clean = replicate(RDFXML_FILE, copies, join(tmp, "replicated.xml"))
+        path = dirty(clean, join(tmp, "dirty.xml"))
+        print("%s (%d bytes)" % (os.path.basename(path),
+                                 os.path.getsize(path)))
+
+        issues = ReaderIssues()
+        times = {}
+        for _ in range(3):
+            for name in (clean, path):
+                gc.collect()
+                t0 = time()
+                n = len(cimread(name, issues=issues))
+                t = time() - t0
+                times[name] = min(times.get(name, t), t)
+        report("clean", times[clean], n)
+        report("dirty", times[path], n, times[clean])
+        print("  %d issues in %d groups" % (issues.count(), len(issues)))
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(level)
+        logger.propagate = True
+        handler.close()
+        for name in os.listdir(tmp):
+            os.remove(join(tmp, name))
+        os.rmdir(tmp)
+
+
+BENCHMARKS = [
+    ("single_pass", bench_single_pass),
+    ("property_plans", bench_property_plans),
+    ("read_many", bench_read_many),
+    ("chunked", bench_chunked),
+    ("parsers", bench_parsers),
+    ("bulk_link", bench_bulk_link),
+    ("projection", bench_projection),
+    ("conversion", bench_conversion),
+    ("cache", bench_cache),
+    ("placeholders", bench_placeholders),
+    ("difference", bench_difference),
+    ("stats", bench_stats),
+    ("feed", bench_feed),
+    ("memory_map", bench_memory_map),
+    ("shared_values", bench_shared_values),
+    ("sniff", bench_sniff),
+    ("issues", bench_issues),
+]
+
+
+def main(names):
+    logging.basicConfig(level=logging.CRITICAL)
+    for name, bench in BENCHMARKS:
+        if not names or name in names:
+            print("%s: %s" % (name, bench.__doc__))
+            bench()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
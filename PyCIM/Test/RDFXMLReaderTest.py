@@ -20,17 +20,21 @@
 # IN THE SOFTWARE.
 
 import io
+import os
+import sys
+import logging
 import unittest
 
 from os.path import dirname, join
 
-from PyCIM import cimread, RDFXMLReader
+from PyCIM import cimread, cimiter, cimread_many, RDFXMLReader
+from PyCIM.Test.ModelGraph import graph, references
 
 from CIM15 import nsURI as nsURICIM15, packageMap as packageMapCIM15
 from CIM15.CDPSM.Asset import packageMap as assetMap
 from CIM15.CDPSM.Connectivity import packageMap as connMap
 from CIM15.CDPSM.Balanced import packageMap as equipMap
-from CIM15.CDPSM.Geographical import packageMap as geoMap
+from CIM15.CDPSM.Geographical import packageMap as geoMap, nsURI as geoNsURI
 
 
 RDFXML_FILE = join(dirname(__file__), "Data", "EDF_AIGUE_v9_COMBINED.xml")
@@ -44,6 +48,119 @@ EMPTY_CIM = u'''<?xml version=\'1.0\'?>
 <rdf:RDF xmlns:cim="http://iec.ch/TC57/2010/CIM-schema-cim15#"
 xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" />'''
 
+FORWARD_CIM = u'''<?xml version=\'1.0\'?>
+<rdf:RDF xmlns:cim="http://iec.ch/TC57/2010/CIM-schema-cim15#"
+xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+ <cim:ConnectivityNode rdf:about="#_CN1">
+  <cim:IdentifiedObject.name>CN1</cim:IdentifiedObject.name>
+ </cim:ConnectivityNode>
+ <cim:Terminal rdf:ID="_T1">
+  <cim:Terminal.ConnectivityNode rdf:resource="#_CN1"/>
+ </cim:Terminal>
+ <cim:ConnectivityNode rdf:ID="_CN1"/>
+</rdf:RDF>'''
+
+LINK_CIM = u'''<?xml version=\'1.0\'?>
+<rdf:RDF xmlns:cim="http://iec.ch/TC57/2010/CIM-schema-cim15#"
+xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+ <cim:ConnectivityNode rdf:ID="_CN1">
+  <cim:ConnectivityNode.Terminals rdf:resource="#_T1"/>
+  <cim:ConnectivityNode.Terminals rdf:resource="#_T2"/>
+ </cim:ConnectivityNode>
+ <cim:Terminal rdf:ID="_T1">
+  <cim:Terminal.ConnectivityNode rdf:resource="#_CN1"/>
+ </cim:Terminal>
+ <cim:Terminal rdf:ID="_T2"/>
+ <cim:Breaker rdf:ID="_B1">
+  <cim:ConductingEquipment.SvStatus rdf:resource="#_S1"/>
+ </cim:Breaker>
+ <cim:Breaker rdf:ID="_B2">
+  <cim:ConductingEquipment.SvStatus rdf:resource="#_S1"/>
+ </cim:Breaker>
+ <cim:SvStatus rdf:ID="_S1"/>
+ <cim:Document rdf:ID="_D1">
+  <cim:Document.NetworkDataSets rdf:resource="#_N1"/>
+ </cim:Document>
+ <cim:NetworkDataSet rdf:ID="_N1"/>
+</rdf:RDF>'''
+
+NAMESPACE_CIM = u'''<?xml version=\'1.0\'?>
+<rdf:RDF xmlns:cim="http://iec.ch/TC57/2010/CIM-schema-cim15#"
+xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+ <cim:ConnectivityNode rdf:ID="_CN1" xmlns:foo="http://example.com/foo#">
+  <cim:IdentifiedObject.name>CN1</cim:IdentifiedObject.name>
+  <foo:ConnectivityNode.extension>1</foo:ConnectivityNode.extension>
+ </cim:ConnectivityNode>
+ <cim:Terminal rdf:ID="_T1">
+  <cim:Terminal.ConnectivityNode rdf:resource="#_CN1"
+   xmlns:bar="http://example.com/bar#"/>
+ </cim:Terminal>
+</rdf:RDF>'''
+
+PARTIAL_CIM = u'''<?xml version=\'1.0\'?>
+<rdf:RDF xmlns:cim="http://iec.ch/TC57/2010/CIM-schema-cim15#"
+xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+ <cim:Terminal rdf:ID="_T1">
+  <cim:Terminal.ConnectivityNode rdf:resource="#_CN1"/>
+  <cim:Terminal.ConductingEquipment rdf:resource="#_B1"/>
+ </cim:Terminal>
+ <cim:Breaker rdf:about="#_B1">
+  <cim:IdentifiedObject.name>B1</cim:IdentifiedObject.name>
+ </cim:Breaker>
+</rdf:RDF>'''
+
+REST_CIM = u'''<?xml version=\'1.0\'?>
+<rdf:RDF xmlns:cim="http://iec.ch/TC57/2010/CIM-schema-cim15#"
+xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+ <cim:Breaker rdf:ID="_B1">
+  <cim:Switch.normalOpen>true</cim:Switch.normalOpen>
+ </cim:Breaker>
+ <cim:ConnectivityNode rdf:ID="_CN1"/>
+</rdf:RDF>'''
+
+ABOUT_CIM = u'''<?xml version=\'1.0\'?>
+<rdf:RDF xmlns:cim="http://iec.ch/TC57/2010/CIM-schema-cim15#"
+xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+ <cim:Terminal rdf:about="#_T1">
+  <cim:Terminal.sequenceNumber>7</cim:Terminal.sequenceNumber>
+  <cim:Terminal.connected>true</cim:Terminal.connected>
+ </cim:Terminal>
+</rdf:RDF>'''
+
+ID_CIM = u'''<?xml version=\'1.0\'?>
+<rdf:RDF xmlns:cim="http://iec.ch/TC57/2010/CIM-schema-cim15#"
+xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+ <cim:Terminal rdf:ID="_T1">
+  <cim:IdentifiedObject.name>T1</cim:IdentifiedObject.name>
+ </cim:Terminal>
+</rdf:RDF>'''
+
+MISMATCH_CIM = u'''<?xml version=\'1.0\'?>
+<rdf:RDF xmlns:cim="http://iec.ch/TC57/2010/CIM-schema-cim15#"
+xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+ <cim:Breaker rdf:ID="_T1">
+  <cim:IdentifiedObject.name>B1</cim:IdentifiedObject.name>
+ </cim:Breaker>
+</rdf:RDF>'''
+
+DIRTY_CIM = u'''<?xml version=\'1.0\'?>
+<rdf:RDF xmlns:cim="http://iec.ch/TC57/2010/CIM-schema-cim15#"
+xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+ <cim:Terminal rdf:ID="_T1">
+  <cim:Terminal.ConnectivityNode rdf:resource="#_CN1"/>
+  <cim:Terminal.foo>1</cim:Terminal.foo>
+  <cim:Terminal.sequenceNumber>one</cim:Terminal.sequenceNumber>
+ </cim:Terminal>
+ <cim:Terminal rdf:ID="_T2">
+  <cim:Terminal.ConnectivityNode rdf:resource="#_CN1"/>
+  <cim:Terminal.foo>2</cim:Terminal.foo>
+ </cim:Terminal>
+ <cim:Foo rdf:ID="_F1"/>
+ <cim:Breaker rdf:about="#_B1">
+  <cim:IdentifiedObject.name>B1</cim:IdentifiedObject.name>
+ </cim:Breaker>
+</rdf:RDF>'''
+
 
 class RDFXMLReaderTestCase(unittest.TestCase):
     """Test CIM RDF/XML parsing.
@@ -56,6 +173,135 @@ class RDFXMLReaderTestCase(unittest.TestCase):
 
         self.assertEqual(len(d), 5894)
 
+    def testCombinedSinglePass(self):
+        """Test single pass CIM RDF/XML parsing.
+        """
+        d = cimread(RDFXML_FILE, single_pass=True)
+
+        self.assertEqual(len(d), 5894)
+        self.assertEqual(references(d), references(cimread(RDFXML_FILE)))
+
+    def testSinglePassForwardReference(self):
+        d = cimread(io.StringIO(FORWARD_CIM), single_pass=True)
+
+        self.assertEqual(len(d), 2)
+        t, cn = d["_T1"], d["_CN1"]
+        self.assertEqual(t.ConnectivityNode, cn)
+        self.assertEqual(cn.Terminals, [t])
+        self.assertEqual(cn.name, "CN1")
+
+    def testIterObjects(self):
+        objs = list(cimiter(RDFXML_FILE))
+
+        self.assertEqual(len(objs), 5894)
+        self.assertEqual(len(set(map(id, objs))), 5894)
+
+        t, cn = list(cimiter(io.StringIO(FORWARD_CIM)))
+        # The terminal is held back until the node has been read.
+        self.assertEqual(t.UUID, "_T1")
+        self.assertEqual(t.ConnectivityNode, cn)
+        self.assertEqual(cn.name, "CN1")
+
+    def testFeed(self):
+        from PyCIM import CIMFeedParser
+
+        expected = graph(cimread(RDFXML_FILE))
+        f = open(RDFXML_FILE, "rb")
+        try:
+            data = f.read()
+        finally:
+            f.close()
+
+        for parser in ("expat", "etree"):
+            p = CIMFeedParser(parser=parser)
+            objs = []
+            for i in range(0, len(data), 1000):
+                p.feed(data[i:i + 1000])
+                objs.extend(p.read_objects())
+            self.assertTrue(len(objs) > 0)
+            d = p.close()
+            objs.extend(p.read_objects())
+
+            self.assertEqual(len(objs), 5894)
+            self.assertEqual(len(set(map(id, objs))), 5894)
+            self.assertEqual(graph(d), expected)
+            self.assertRaises(ValueError, p.feed, b"")
+
+        # The terminal is held back until the node has been read.
+        p = CIMFeedParser()
+        p.feed(FORWARD_CIM.encode("utf-8"))
+        t, cn = p.read_objects()
+        self.assertEqual(t.ConnectivityNode, cn)
+
+    def testFeedAsync(self):
+        if sys.version_info < (3, 7):
+            return
+        from PyCIM.Test.AsyncFeed import read_async
+
+        f = open(RDFXML_FILE, "rb")
+        try:
+            data = f.read()
+        finally:
+            f.close()
+
+        d, n = read_async(data)
+        self.assertEqual(len(d), 5894)
+        self.assertEqual(n, 5894)
+
+    def testIterRecords(self):
+        from CIM15.IEC61970.Core import Terminal
+
+        records = list(cimiter(io.StringIO(FORWARD_CIM), raw=True))
+
+        self.assertEqual([(r.uuid, r.klass.__name__, r.about)
+                          for r in records],
+                         [("_CN1", "ConnectivityNode", True),
+                          ("_T1", "Terminal", False),
+                          ("_CN1", "ConnectivityNode", False)])
+        self.assertEqual(records[0].attributes, {"name": "CN1"})
+        self.assertTrue(records[1].klass is Terminal)
+        self.assertEqual(records[1].references, {"ConnectivityNode": "_CN1"})
+
+        n = sum(1 for r in cimiter(RDFXML_FILE, raw=True) if not r.about)
+        self.assertEqual(n, 5894)
+
+    def testPropertyPlan(self):
+        from CIM15.IEC61970.Core import Terminal
+        from PyCIM.RDFXMLReader import property_plan, ATTRIBUTE, ENUM, \
+            REFERENCE, MANY_REFERENCE, UNKNOWN, ONE_TO_MANY, MANY_TO_ONE
+
+        base = "{%s#}" % nsURICIM15
+        plan = property_plan(Terminal, base)
+
+        self.assertTrue(property_plan(Terminal, base) is plan)
+        self.assertEqual(plan[base + "Terminal.sequenceNumber"],
+                         (ATTRIBUTE, "sequenceNumber", int))
+        self.assertEqual(plan[base + "Terminal.phases"],
+                         (ENUM, "phases", str))
+        self.assertEqual(plan[base + "Terminal.ConnectivityNode"],
+                         (REFERENCE, "ConnectivityNode", None))
+        self.assertEqual(plan[base + "Terminal.Measurements"],
+                         (MANY_REFERENCE, "Measurements",
+                          Terminal.addMeasurements))
+        self.assertEqual(plan[base + "IdentifiedObject.name"][:2],
+                         (ATTRIBUTE, "name"))
+        # Qualified by the class of the object instead of the declaring one.
+        self.assertEqual(plan[base + "Terminal.name"][:2],
+                         (ATTRIBUTE, "name"))
+        self.assertEqual(plan[base + "Terminal.foo"][:2], (UNKNOWN, "foo"))
+        self.assertEqual(plan.links["ConnectivityNode"],
+                         (ONE_TO_MANY, "_ConnectivityNode", "_Terminals"))
+        self.assertEqual(plan.links["Measurements"],
+                         (MANY_TO_ONE, "_Measurements", "_Terminal"))
+
+        t = cimread(io.StringIO(FORWARD_CIM.replace(
+                "<cim:Terminal.ConnectivityNode",
+                "<cim:Terminal.connected>true</cim:Terminal.connected>"
+                "<cim:Terminal.sequenceNumber>2</cim:Terminal.sequenceNumber>"
+                "<cim:Terminal.ConnectivityNode")))["_T1"]
+        self.assertEqual(t.connected, True)
+        self.assertEqual(t.sequenceNumber, 2)
+
     def test_cim_reads_are_independent(self):
         cimread(ASSET_FILE, assetMap, nsURICIM15)
         sio = io.StringIO(EMPTY_CIM)
@@ -72,6 +318,442 @@ class RDFXMLReaderTestCase(unittest.TestCase):
 
         self.assertEqual(len(d), 5893)
 
+    def testReadMany(self):
+        sources = [ASSET_FILE, CONN_FILE, EQUIP_FILE, GEO_FILE]
+
+        d = cimread_many(sources, processes=2)
+
+        self.assertEqual(len(d), 5893)
+        self.assertEqual(references(d),
+                         references(cimread_many(sources, processes=1)))
+
+        # References from the asset to the connectivity profile.
+        lines = [obj for obj in d.values()
+                 if obj.__class__.__name__ == "ACLineSegment"]
+        self.assertEqual(len(lines), 280)
+        for line in lines:
+            self.assertTrue(line.ConductorInfo is not None)
+            self.assertTrue(line in line.ConductorInfo.LineSegments)
+
+    def testReadManyProfiles(self):
+        d = cimread_many([(ASSET_FILE, assetMap, nsURICIM15),
+                          (CONN_FILE, connMap, nsURICIM15),
+                          (EQUIP_FILE, equipMap, nsURICIM15),
+                          (GEO_FILE, geoMap, nsURICIM15)], processes=1)
+
+        self.assertEqual(len(d), 5893)
+
+    def testChunked(self):
+        from PyCIM.RDFXMLReader import _split
+
+        head, tail, spans = _split(RDFXML_FILE, 12)
+        self.assertEqual(len(spans), 12)
+        self.assertTrue(head.endswith(b'CIM-schema-cim15#">'))
+        self.assertEqual(tail, b"</rdf:RDF>")
+        with open(RDFXML_FILE, "rb") as f:
+            data = f.read()
+        for start, end in spans[1:]:
+            self.assertTrue(data[start:end].startswith(b"<cim:"))
+
+        expected = graph(cimread(RDFXML_FILE))
+        for processes in (1, 3):
+            d = cimread(RDFXML_FILE, processes=processes)
+            self.assertEqual(list(d), list(expected))
+            self.assertEqual(graph(d), expected)
+
+        # Boundaries are found whatever the position of rdf:ID or rdf:about.
+        import re
+        import tempfile
+        fd, path = tempfile.mkstemp(".xml")
+        try:
+            os.write(fd, re.sub(b"<(cim:[\\w.]+) (rdf:(?:ID|about)=)",
+                                b'<\\1 xml:lang="en"\n  \\2', data))
+            os.close(fd)
+            head, tail, spans = _split(path, 12)
+            self.assertEqual(len(spans), 12)
+            for start, end in spans[1:]:
+                with open(path, "rb") as f:
+                    f.seek(start)
+                    self.assertEqual(f.read(5), b"<cim:")
+            for processes in (1, 3):
+                d = cimread(path, processes=processes)
+                self.assertEqual(list(d), list(expected))
+                self.assertEqual(graph(d), expected)
+        finally:
+            os.remove(path)
+
+    def testMemoryMap(self):
+        from PyCIM import ReaderStats
+
+        expected = graph(cimread(RDFXML_FILE))
+        for kwargs in ({}, {"single_pass": True}, {"parser": "expat"},
+                       {"processes": 1}, {"processes": 3}):
+            stats = ReaderStats()
+            d = cimread(RDFXML_FILE, memory_map=True, stats=stats, **kwargs)
+            self.assertEqual(list(d), list(expected))
+            self.assertEqual(graph(d), expected)
+            self.assertEqual(stats.expected, len(d))
+            self.assertEqual(stats.elements, len(d))
+
+        # Ignored for file-like objects.
+        with open(RDFXML_FILE, "rb") as f:
+            d = cimread(f, memory_map=True)
+        self.assertEqual(graph(d), expected)
+
+        # Buffers are sliced as the document is read.
+        from PyCIM.RDFXMLReader import _slices
+        buffers = [memoryview(b"abcde"), memoryview(b"fg")]
+        slices = _slices(buffers, 2)
+        self.assertEqual(bytes(next(slices)), b"ab")
+        self.assertEqual(len(buffers), 1)
+        self.assertEqual([bytes(data) for data in slices],
+                         [b"cd", b"e", b"fg", b""])
+        self.assertEqual(buffers, [])
+
+    def testParsers(self):
+        expected = graph(cimread(RDFXML_FILE))
+        for parser in ("expat", "lxml"):
+            try:
+                d = cimread(RDFXML_FILE, parser=parser)
+            except ImportError:
+                continue # lxml not installed
+            self.assertEqual(list(d), list(expected))
+            self.assertEqual(graph(d), expected)
+
+        for single_pass in (False, True):
+            d = cimread(io.StringIO(FORWARD_CIM), single_pass=single_pass,
+                        parser="expat")
+            self.assertEqual(d["_T1"].ConnectivityNode, d["_CN1"])
+            self.assertEqual(d["_CN1"].name, "CN1")
+
+        self.assertEqual(cimread(io.StringIO(EMPTY_CIM), parser="expat"), {})
+
+        # Namespaces declared by the elements of the model.
+        for parser in ("etree", "expat", "lxml"):
+            for single_pass in (False, True):
+                try:
+                    d = cimread(io.StringIO(NAMESPACE_CIM), parser=parser,
+                                single_pass=single_pass)
+                except ImportError:
+                    continue # lxml not installed
+                self.assertEqual(sorted(d), ["_CN1", "_T1"])
+                self.assertEqual(d["_T1"].ConnectivityNode, d["_CN1"])
+                self.assertEqual(d["_CN1"].name, "CN1")
+        self.assertRaises(ValueError, cimread, RDFXML_FILE, parser="sax")
+
+    def testCompressed(self):
+        import bz2, gzip, shutil, tempfile, zipfile
+
+        tmp = tempfile.mkdtemp()
+        try:
+            paths = [join(tmp, "model.xml.gz"), join(tmp, "model.xml.bz2")]
+            for path, open_ in zip(paths, (gzip.open, bz2.BZ2File)):
+                with open(RDFXML_FILE, "rb") as src:
+                    with open_(path, "wb") as dst:
+                        shutil.copyfileobj(src, dst)
+
+            expected = graph(cimread(RDFXML_FILE))
+            for path in paths:
+                self.assertEqual(graph(cimread(path)), expected)
+                self.assertEqual(len(list(cimiter(path))), 5894)
+            self.assertRaises(ValueError, cimread, paths[0], processes=2)
+
+            path = join(tmp, "model.zip")
+            with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+                for name in (ASSET_FILE, CONN_FILE, EQUIP_FILE, GEO_FILE):
+                    archive.write(name, os.path.basename(name))
+                archive.writestr("README.txt", "Not a model.")
+
+            d = cimread(path)
+            self.assertEqual(len(d), 5893)
+            self.assertEqual(references(d),
+                             references(cimread_many([ASSET_FILE, CONN_FILE,
+                                 EQUIP_FILE, GEO_FILE], processes=1)))
+            self.assertEqual(len(cimread_many([path], processes=1)), 5893)
+        finally:
+            shutil.rmtree(tmp)
+
+    def testBulkLink(self):
+        expected = graph(cimread(RDFXML_FILE))
+        for single_pass in (False, True):
+            d = cimread(RDFXML_FILE, single_pass=single_pass, bulk_link=True)
+            self.assertEqual(graph(d), expected)
+        d = cimread(RDFXML_FILE, processes=1, bulk_link=True)
+        self.assertEqual(graph(d), expected)
+
+        expected = graph(cimread(io.StringIO(LINK_CIM)))
+        for single_pass in (False, True):
+            d = cimread(io.StringIO(LINK_CIM), single_pass=single_pass,
+                        bulk_link=True)
+            self.assertEqual(graph(d), expected)
+        self.assertEqual([t.UUID for t in d["_CN1"].Terminals], ["_T1", "_T2"])
+        self.assertEqual(d["_B1"].SvStatus, None)
+        self.assertEqual(d["_S1"].ConductingEquipment, d["_B2"])
+        self.assertEqual(d["_N1"].Documents, [d["_D1"]])
+
+        # Many-to-many references given from both ends are not duplicated.
+        d = cimread(io.StringIO(LINK_CIM.replace(
+                '<cim:NetworkDataSet rdf:ID="_N1"/>',
+                '<cim:NetworkDataSet rdf:ID="_N1"><cim:NetworkDataSet.Documents '
+                'rdf:resource="#_D1"/></cim:NetworkDataSet>')), bulk_link=True)
+        self.assertEqual(d["_N1"].Documents, [d["_D1"]])
+        self.assertEqual(d["_D1"].NetworkDataSets, [d["_N1"]])
+
+    def testProjection(self):
+        from CIM15.IEC61970.Wires import Switch
+
+        messages = []
+        handler = logging.Handler(logging.WARNING)
+        handler.emit = lambda record: messages.append(record.getMessage())
+        logging.getLogger().addHandler(handler)
+        try:
+            full = cimread(RDFXML_FILE)
+            topology = dict(
+                include_classes=["Terminal", "ConnectivityNode", Switch],
+                exclude_classes=["Breaker"],
+                include_attributes={"IdentifiedObject": ["name"],
+                    "Terminal": ["ConnectivityNode", "ConductingEquipment"]})
+
+            models = [cimread(RDFXML_FILE, **topology),
+                      cimread(RDFXML_FILE, single_pass=True, **topology),
+                      cimread(RDFXML_FILE, processes=2, **topology),
+                      cimread_many([RDFXML_FILE], processes=1, **topology),
+                      dict((obj.UUID, obj)
+                           for obj in cimiter(RDFXML_FILE, **topology))]
+        finally:
+            logging.getLogger().removeHandler(handler)
+
+        self.assertEqual(messages, [])
+        expected = graph(models[0])
+        for d in models:
+            self.assertEqual(len(d), 975 + 394 + 107)
+            self.assertEqual(graph(d), expected)
+
+        for uuid, obj in d.items():
+            self.assertEqual(obj.name, full[uuid].name)
+            if obj.__class__.__name__ == "Terminal":
+                self.assertEqual(obj.ConnectivityNode.UUID,
+                                 full[uuid].ConnectivityNode.UUID)
+                equipment = full[uuid].ConductingEquipment
+                if isinstance(equipment, Switch) and \
+                        equipment.__class__.__name__ != "Breaker":
+                    self.assertEqual(obj.ConductingEquipment.UUID,
+                                     equipment.UUID)
+                else:
+                    self.assertEqual(obj.ConductingEquipment, None)
+            elif obj.__class__.__name__ == "ConnectivityNode":
+                self.assertTrue(full[uuid].ConnectivityNodeContainer)
+                self.assertEqual(obj.ConnectivityNodeContainer, None)
+            else:
+                self.assertEqual(obj.normalOpen, False)
+
+    def testPlaceholders(self):
+        from PyCIM.RDFXMLReader import unresolved
+        from CIM15.IEC61970.Core.ConnectivityNode import ConnectivityNode
+        from CIM15.IEC61970.Wires.Breaker import Breaker
+
+        for single_pass in (False, True):
+            d = cimread(io.StringIO(PARTIAL_CIM), single_pass=single_pass,
+                        placeholders=True)
+            node, breaker = d["_CN1"], d["_B1"]
+            self.assertEqual(unresolved(d), {"_CN1": node, "_B1": breaker})
+            self.assertTrue(node.__class__ is ConnectivityNode)
+            self.assertEqual(node.Terminals, [d["_T1"]])
+            self.assertEqual(breaker.name, "B1")
+
+            cimread(io.StringIO(REST_CIM), start_dict=d)
+            self.assertEqual(unresolved(d), {})
+            self.assertTrue(d["_CN1"] is node and d["_B1"] is breaker)
+            self.assertTrue(breaker.__class__ is Breaker)
+            self.assertEqual(breaker.name, "B1")
+            self.assertEqual(breaker.normalOpen, True)
+            self.assertEqual(breaker.Terminals, [d["_T1"]])
+
+        # Profiles read one at a time, with references to later files.
+        expected = cimread_many([ASSET_FILE, CONN_FILE, EQUIP_FILE, GEO_FILE],
+                                processes=1)
+        for processes in (None, 1):
+            d = {}
+            for path in [GEO_FILE, EQUIP_FILE, ASSET_FILE, CONN_FILE]:
+                cimread(path, start_dict=d, processes=processes,
+                        placeholders=True)
+            self.assertEqual(unresolved(d), {})
+            self.assertEqual(references(d), references(expected))
+            for uuid, obj in d.items():
+                self.assertTrue(obj.__class__ is expected[uuid].__class__)
+
+    def testPlaceholderAttributes(self):
+        # Attributes read for a placeholder are kept when it is filled.
+        from PyCIM.RDFXMLReader import unresolved
+        for single_pass in (False, True):
+            d = cimread(io.StringIO(ABOUT_CIM), single_pass=single_pass,
+                        placeholders=True)
+            cimread(io.StringIO(ID_CIM), start_dict=d,
+                    single_pass=single_pass)
+            terminal = d["_T1"]
+            self.assertEqual(unresolved(d), {})
+            self.assertEqual(terminal.name, "T1")
+            self.assertEqual(terminal.sequenceNumber, 7)
+            self.assertEqual(terminal.connected, True)
+
+    def testPlaceholderMismatch(self):
+        # Objects of another class than their placeholder are not read.
+        import tempfile
+        from PyCIM.RDFXMLReader import unresolved, ReaderIssue, ReaderIssues
+        from CIM15.IEC61970.Core.Terminal import Terminal
+
+        fd, path = tempfile.mkstemp(".xml")
+        try:
+            os.write(fd, MISMATCH_CIM.encode("utf-8"))
+            os.close(fd)
+            for kwargs in ({}, {"single_pass": True}, {"processes": 1}):
+                d = cimread(io.StringIO(ABOUT_CIM), placeholders=True)
+                issues = ReaderIssues()
+                cimread(path, start_dict=d, issues=issues, **kwargs)
+                terminal = d["_T1"]
+                self.assertEqual(unresolved(d), {"_T1": terminal})
+                self.assertTrue(terminal.__class__ is Terminal)
+                self.assertEqual(terminal.name, "")
+                self.assertEqual(terminal.sequenceNumber, 7)
+                self.assertEqual(list(issues), [ReaderIssue(
+                    "class mismatch", "Breaker", None, 1, ["_T1"])])
+        finally:
+            os.remove(path)
+
+    def testSharedValues(self):
+        from CIM15.IEC61970.Core.Terminal import Terminal
+        from CIM15.IEC61970.Wires.ACLineSegment import ACLineSegment
+
+        for kwargs in ({}, {"processes": 1}):
+            d = cimread(RDFXML_FILE, **kwargs)
+            terminals = [obj for obj in d.values()
+                         if isinstance(obj, Terminal)]
+            phases = dict((t.phases, t.phases) for t in terminals)
+            for t in terminals:
+                self.assertTrue(t.phases is phases[t.phases])
+
+            lines = [obj for obj in d.values()
+                     if isinstance(obj, ACLineSegment)]
+            lengths = {}
+            for line in lines:
+                self.assertTrue(
+                    lengths.setdefault(line.length, line.length)
+                    is line.length)
+            self.assertTrue(len(lengths) < len(lines))
+
+        # Enumeration literals are interned.
+        t = Terminal()
+        literal = "".join(["s12", "N"])
+        self.assertFalse(literal is t.phases)
+        p = RDFXMLReader._Literals()
+        self.assertTrue(p["http://iec.ch#PhaseCode." + literal] is t.phases)
+
+        # References of records share the uuids of the objects.
+        records = list(cimiter(RDFXML_FILE, raw=True))
+        uuids = dict((r.uuid, r.uuid) for r in records)
+        n = 0
+        for r in records:
+            for refs in r.references.values():
+                for uuid in (refs if isinstance(refs, list) else [refs]):
+                    if uuid in uuids:
+                        self.assertTrue(uuids[uuid] is uuid)
+                        n += 1
+        self.assertTrue(n > 0)
+
+    def testStats(self):
+        from PyCIM import ReaderStats
+
+        d = cimread(RDFXML_FILE)
+        for kwargs, phases in [
+                ({}, ["namespaces", "instantiate", "link", "finish"]),
+                ({"single_pass": True}, ["namespaces", "read", "finish"]),
+                ({"processes": 1}, ["parse", "build"])]:
+            stats = ReaderStats()
+            calls = []
+            cimread(RDFXML_FILE, stats=stats, progress=calls.append,
+                    progress_interval=0.0, **kwargs)
+            self.assertEqual(list(stats.phases), phases)
+            self.assertEqual(stats.bytes, os.path.getsize(RDFXML_FILE))
+            self.assertEqual(stats.elements, len(d))
+            self.assertEqual(stats.objects, len(d))
+            self.assertEqual(stats.classes["Terminal"],
+                             len([obj for obj in d.values()
+                                  if obj.__class__.__name__ == "Terminal"]))
+            self.assertEqual(stats.missing, {})
+            self.assertTrue(stats.elements_per_second > 0)
+            self.assertTrue(stats.phase is None and stats.time > 0)
+            # Called during the read and once at the end.
+            self.assertTrue(calls[-1] is stats)
+        self.assertTrue(stats.peak_rss is None or stats.peak_rss > 0)
+
+        # Progress alone collects the statistics.
+        calls = []
+        cimread(io.StringIO(PARTIAL_CIM), progress=calls.append)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0].bytes, None)
+        self.assertEqual(calls[0].objects, 1)
+        self.assertTrue("Terminal" in calls[0].class_times)
+        self.assertEqual(calls[0].missing,
+                         {("Terminal", "ConnectivityNode"): 1,
+                          ("Terminal", "ConductingEquipment"): 1})
+
+    def testIssues(self):
+        import tempfile
+        from PyCIM import CIMFeedParser, ReaderIssues
+        from PyCIM.RDFXMLReader import ReaderIssue
+
+        expected = [
+            ReaderIssue("missing reference", "Terminal", "ConnectivityNode",
+                        2, ["_CN1", "_CN1"]),
+            ReaderIssue("unknown attribute", "Terminal", "foo", 2,
+                        ["_T1", "_T2"]),
+            ReaderIssue("invalid value", "Terminal", "sequenceNumber", 1,
+                        ["_T1"]),
+            ReaderIssue("missing object", "Breaker", None, 1, ["_B1"]),
+            ReaderIssue("unknown class", "Foo", None, 1, ["_F1"])]
+
+        class Handler(logging.Handler):
+            def emit(self, record):
+                messages.append(record.getMessage())
+
+        handler = Handler(logging.WARNING)
+        logger = logging.getLogger(RDFXMLReader.__name__)
+        logger.addHandler(handler)
+        fd, path = tempfile.mkstemp(".xml")
+        try:
+            os.write(fd, DIRTY_CIM.encode("utf-8"))
+            os.close(fd)
+            for kwargs in ({}, {"single_pass": True}, {"processes": 1}):
+                messages = []
+                issues = ReaderIssues()
+                cimread(path, issues=issues, **kwargs)
+                self.assertEqual(list(issues), expected)
+                self.assertEqual(issues.count(), 7)
+                self.assertEqual(issues.count("unknown attribute"), 2)
+                self.assertEqual(issues.missing(),
+                                 {("Terminal", "ConnectivityNode"): 2})
+                # One summary line instead of a line per occurrence.
+                self.assertEqual(len(messages), 1)
+                self.assertTrue(messages[0].startswith("7 issues"))
+
+            messages = []
+            cimread_many([path, path], processes=1, issues=issues)
+            self.assertEqual(issues.count(), 14)
+            self.assertEqual(len(messages), 1)
+        finally:
+            logger.removeHandler(handler)
+            os.remove(path)
+
+        issues = ReaderIssues(samples=1)
+        list(cimiter(io.StringIO(DIRTY_CIM), issues=issues))
+        self.assertEqual(list(issues)[0].samples, ["_CN1"])
+        self.assertEqual(len(issues), 5)
+
+        parser = CIMFeedParser()
+        parser.feed(DIRTY_CIM.encode("utf-8"))
+        parser.close()
+        self.assertEqual(list(parser.issues), expected)
+
     def testGetNamespaces(self):
         ns = RDFXMLReader.xmlns(RDFXML_FILE)
         self.assertEqual(ns, {
@@ -85,6 +767,94 @@ class RDFXMLReaderTestCase(unittest.TestCase):
         self.assertEqual(RDFXMLReader.get_cim_ns(ns),
                 (nsURICIM15, packageMapCIM15))
 
+    def testSniff(self):
+        import gzip
+        import shutil
+        import subprocess
+        import sys
+        import tempfile
+        import zipfile
+        from PyCIM import sniff
+        import CIM14
+
+        header = sniff(RDFXML_FILE)
+        self.assertEqual(header, ("CIM15", nsURICIM15, (), "CIM15"))
+        self.assertEqual(header.packageMap, packageMapCIM15)
+        self.assertEqual(sniff(join(dirname(__file__), "Data",
+                                    "EDF_AIGUE_v9.xml")),
+                         ("CIM14", CIM14.nsURI, (), "CIM14"))
+
+        # The CDPSM files of the test data are split by profile but do not
+        # declare it, so they are read with the classes of the version.
+        for path in [ASSET_FILE, CONN_FILE, EQUIP_FILE, GEO_FILE]:
+            header = sniff(path)
+            self.assertEqual(header, ("CIM15", nsURICIM15, (), "CIM15"))
+            d = cimread(path, header.packageMap, header.nsURI)
+            self.assertEqual(references(d), references(cimread(path)))
+
+        # Profile of the namespace, from a file-like object.
+        source = io.StringIO(u'<?xml version="1.0"?>\n<rdf:RDF '
+            u'xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" '
+            u'xmlns:cim="%s#"/>' % geoNsURI)
+        header = sniff(source)
+        self.assertEqual(header.package, "CIM15.CDPSM.Geographical")
+        self.assertEqual(header.packageMap, geoMap)
+        self.assertEqual(source.tell(), 0)
+
+        # Profiles of a model header, in a compressed file.
+        text = (b'<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"'
+            b' xmlns:cim="http://iec.ch/TC57/2013/CIM-schema-cim16#"'
+            b' xmlns:md="http://iec.ch/TC57/61970-552/ModelDescription/1#">'
+            b'<md:FullModel rdf:about="urn:uuid:1">'
+            b'<md:Model.profile>http://entsoe.eu/CIM/EquipmentCore/3/1'
+            b'</md:Model.profile></md:FullModel></rdf:RDF>')
+        directory = tempfile.mkdtemp()
+        try:
+            path = join(directory, "model.xml.gz")
+            f = gzip.open(path, "wb")
+            f.write(text)
+            f.close()
+            self.assertEqual(sniff(path), ("CIM16",
+                "http://iec.ch/TC57/2013/CIM-schema-cim16",
+                ("http://entsoe.eu/CIM/EquipmentCore/3/1",), "CIM15"))
+        finally:
+            shutil.rmtree(directory)
+
+        # Profiles are found in zipped packages.
+        directory = tempfile.mkdtemp()
+        try:
+            path = join(directory, "CIM15.zip")
+            archive = zipfile.ZipFile(path, "w")
+            root = dirname(CIM14.__path__[0])
+            for base, _, names in os.walk(join(root, "CIM15")):
+                for name in names:
+                    if name.endswith(".py"):
+                        filename = join(base, name)
+                        archive.write(filename, os.path.relpath(filename,
+                                                                root))
+            archive.close()
+            code = ("import io, CIM15; from PyCIM import sniff; "
+                    "print(CIM15.__file__.startswith(%r)); "
+                    "print(sniff(io.StringIO(%r)).package)" %
+                    (path, source.getvalue()))
+            env = dict(os.environ,
+                       PYTHONPATH=os.pathsep.join([path] + sys.path))
+            output = subprocess.check_output([sys.executable, "-c", code],
+                                             env=env, cwd=directory)
+            self.assertEqual(output.split(),
+                             [b"True", b"CIM15.CDPSM.Geographical"])
+        finally:
+            shutil.rmtree(directory)
+
+        # Only the package of the version is imported.
+        code = ("import sys; from PyCIM import RDFXMLReader; "
+                "RDFXMLReader.get_cim_ns({'cim': '%s'}); "
+                "print('CIM14' in sys.modules)" % nsURICIM15)
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        output = subprocess.check_output([sys.executable, "-c", code],
+                                         env=env)
+        self.assertEqual(output.strip(), b"False")
+
 
 if __name__ == "__main__":
     import logging
@@ -0,0 +1,271 @@
+# Copyright (C) 2010-2011 Richard Lincoln
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal in the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+"""Benchmarks for the CIM RDF/XML serialiser.
+
+Run all benchmarks or only the named ones with::
+
+  $ python -m PyCIM.Test.RDFXMLWriterBenchmark [name ...]
+"""
+
+import os
+import sys
+import logging
+import tempfile
+
+from os.path import join
+
+from PyCIM import cimread, cimwrite
+from PyCIM.RDFXMLWriter import nsURI, nsPrefix, nsPrefixRDF, nsRDF, \
+    serialisation_plan, ATTRIBUTE, ENUM
+from PyCIM.SimpleXMLWriter import XMLWriter
+from PyCIM.Test.RDFXMLReaderBenchmark import RDFXML_FILE, replicate, \
+    timed, report
+
+
+def model(copies):
+    """Returns a model of the given number of copies of the test model.
+    """
+    tmp = tempfile.mkdtemp()
+    try:
+        path = replicate(RDFXML_FILE, copies, join(tmp, "replicated.xml"))
+        return cimread(path, bulk_link=True)
+    finally:
+        for name in os.listdir(tmp):
+            os.remove(join(tmp, name))
+        os.rmdir(tmp)
+
+
+def _write_dynamic(d, source):
+    """Serialises the model by inspecting the classes of each object, as
+    the writer did before serialisation plans.
+    """
+    w = XMLWriter(source, "utf-8")
+    w.declaration()
+    nsCIM = nsURI if nsURI[-1] == "#" else nsURI + "#"
+    xmlns = {u"xmlns:%s" % nsPrefixRDF: nsRDF, u"xmlns:%s" % nsPrefix: nsCIM}
+    rdf = w.start(u"%s:RDF" % nsPrefixRDF, xmlns)
+
+    for uuid, obj in d.items():
+        w.start(u"%s:%s" % (nsPrefix, obj.__class__.__name__),
+                {u"%s:ID" % nsPrefixRDF: obj.UUID})
+
+        mro = obj.__class__.mro()
+        mro.reverse()
+
+        for klass in mro[2:]:
+            attrs = [a for a in klass._attrs if a not in klass._enums]
+            for attr in attrs:
+                val = getattr(obj, attr)
+                if val != klass._defaults[attr]:
+                    w.element(u"%s:%s.%s" % (nsPrefix, klass.__name__, attr),
+                              str(val))
+
+        for klass in mro[2:]:
+            enums = [a for a in klass._attrs if a in klass._enums]
+            for enum in enums:
+                val = getattr(obj, enum)
+                dt = klass._enums[enum]
+                w.element(u"%s:%s.%s" % (nsPrefix, klass.__name__, enum),
+                          attrib={u"%s:resource" % nsPrefixRDF:
+                                  u"%s%s.%s" % (nsCIM, dt, val)})
+
+        for klass in mro[2:]:
+            refs = [r for r in klass._refs if r not in klass._many_refs]
+            for ref in refs:
+                val = getattr(obj, ref)
+                if val is not None:
+                    w.element(u"%s:%s.%s" % (nsPrefix, klass.__name__, ref),
+                          attrib={u"%s:resource" % nsPrefixRDF:
+                                  u"#%s" % val.UUID})
+
+        w.end()
+
+    w.close(rdf)
+    w.flush()
+
+
+def _write_simple(d, source):
+    """Serialises the model through serialisation plans and the XMLWriter,
+    as the writer did before the buffered emitter.
+    """
+    w = XMLWriter(source, "utf-8")
+    w.declaration()
+    nsCIM = nsURI if nsURI[-1] == "#" else nsURI + "#"
+    xmlns = {u"xmlns:%s" % nsPrefixRDF: nsRDF, u"xmlns:%s" % nsPrefix: nsCIM}
+    rdf = w.start(u"%s:RDF" % nsPrefixRDF, xmlns)
+    rdfID = u"%s:ID" % nsPrefixRDF
+    resource = u"%s:resource" % nsPrefixRDF
+
+    for uuid, obj in d.items():
+        plan = serialisation_plan(obj.__class__)
+        w.start(plan.tag, {rdfID: obj.UUID})
+        for tag, attr, value, kind in plan.attributes:
+            val = getattr(obj, attr)
+            if kind == ATTRIBUTE:
+                if val != value:
+                    w.element(tag, str(val))
+            elif kind == ENUM:
+                w.element(tag, attrib={resource: u"%s%s" % (value, val)})
+            elif val is not None:
+                w.element(tag, attrib={resource: u"#%s" % val.UUID})
+        for tag, slot in plan.many:
+            for val in getattr(obj, slot):
+                w.element(tag, attrib={resource: u"#%s" % val.UUID})
+        w.end()
+
+    w.close(rdf)
+    w.flush()
+
+
+def _null(write, mode="w"):
+    """Calls write with a file-like object that discards the output.
+    """
+    with open(os.devnull, mode) as f:
+        write(f)
+
+
+def bench_plans(copies=170):
+    """Serialisation with and without per-class serialisation plans."""
+    d = model(copies)
+    n = len(d)
+    print("%d objects" % n)
+
+    t0, _ = timed(_null, lambda f: _write_dynamic(d, f))
+    report("dynamic", t0, n)
+    t, _ = timed(_null, lambda f: _write_simple(d, f))
+    report("plans", t, n, t0)
+
+
+def bench_emitter(copies=30):
+    """Serialisation through the XMLWriter versus the buffered emitter."""
+    import io
+
+    d = model(copies)
+    n = len(d)
+    output = io.BytesIO()
+    cimwrite(d, output)
+    size = len(output.getvalue())
+    del output
+    print("%d objects, %d bytes" % (n, size))
+
+    t0, _ = timed(_null, lambda f: _write_simple(d, f))
+    report("XMLWriter", t0, n)
+    t, _ = timed(_null, lambda f: cimwrite(d, f))
+    report("emitter, text file", t, n, t0)
+    t, _ = timed(_null, lambda f: cimwrite(d, f), "wb")
+    report("emitter, binary file", t, n, t0)
+    print("  %.1f MB/s" % (size / t / 1e6))
+
+
+def bench_parallel(copies=30, processes=(1, 2, 4)):
+    """Serial versus parallel serialisation."""
+    from multiprocessing import cpu_count
+
+    d = model(copies)
+    n = len(d)
+    print("%d objects, %d CPUs" % (n, cpu_count()))
+
+    t0, _ = timed(_null, lambda f: cimwrite(d, f), "wb")
+    report("serial", t0, n)
+    for p in processes:
+        t, _ = timed(_null, lambda f: cimwrite(d, f, processes=p), "wb")
+        report("%d processes" % p, t, n, t0)
+
+
+def network(n):
+    """Yields n connectivity nodes, each with two terminals, created on the
+    fly.
+    """
+    from CIM15.IEC61970.Core.ConnectivityNode import ConnectivityNode
+    from CIM15.IEC61970.Core.Terminal import Terminal
+
+    for i in range(n):
+        node = ConnectivityNode(UUID="_CN%d" % i, name="CN%d" % i)
+        yield node
+        for j in range(2):
+            yield Terminal(UUID="_T%d_%d" % (i, j), sequenceNumber=j + 1,
+                           ConnectivityNode=node)
+
+
+def bench_streaming(n=100000):
+    """Writing a model built in a dict versus streaming a generator."""
+    from PyCIM.Test.RDFXMLReaderBenchmark import traced
+
+    def built():
+        d = dict((obj.UUID, obj) for obj in network(n))
+        _null(lambda f: cimwrite(d, f), "wb")
+
+    def streamed():
+        _null(lambda f: cimwrite(network(n), f), "wb")
+
+    print("%d objects" % (3 * n))
+    t0, _ = timed(built)
+    report("dict", t0, 3 * n)
+    t, _ = timed(streamed)
+    report("generator", t, 3 * n, t0)
+    print("  peak memory: dict %.1f MB, generator %.1f MB" % (
+        traced(built) / 1e6, traced(streamed) / 1e6))
+
+
+def bench_compression(copies=10):
+    """Writing uncompressed and compressed files."""
+    d = model(copies)
+    n = len(d)
+    print("%d objects" % n)
+
+    tmp = tempfile.mkdtemp()
+    try:
+        t0 = None
+        for name, level in (("model.xml", None), ("model.xml.gz", 1),
+                            ("model.xml.gz", 6), ("model.xml.gz", 9),
+                            ("model.xml.bz2", 9), ("model.xml.xz", 1),
+                            ("model.zip", 6)):
+            path = join(tmp, name)
+            t, _ = timed(cimwrite, d, path, compresslevel=level)
+            label = name if level is None else "%s, level %d" % (name, level)
+            report(label, t, n, t0)
+            print("  %-28s %8.1f MB" % ("", os.path.getsize(path) / 1e6))
+            if t0 is None:
+                t0 = t
+            os.remove(path)
+    finally:
+        os.rmdir(tmp)
+
+
+BENCHMARKS = [
+    ("plans", bench_plans),
+    ("emitter", bench_emitter),
+    ("parallel", bench_parallel),
+    ("streaming", bench_streaming),
+    ("compression", bench_compression),
+]
+
+
+def main(names):
+    logging.basicConfig(level=logging.CRITICAL)
+    for name, bench in BENCHMARKS:
+        if not names or name in names:
+            print("%s: %s" % (name, bench.__doc__))
+            bench()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -25,6 +25,7 @@ except ImportError:
     from io import StringIO
 
 from PyCIM import cimread, cimwrite
+from PyCIM.Test.ModelGraph import references
 
 from os.path import dirname, join
 
@@ -51,6 +52,280 @@ class RDFXMLWriterTestCase(unittest.TestCase):
 
         self.assertEqual(len(dd), 5894)
 
+    def testRoundTrip(self):
+        """Test that all associations are read back.
+        """
+        from CIM15.IEC61968.Assets.Asset import Asset
+        from CIM15.IEC61970.Core.PsrList import PsrList
+        from CIM15.IEC61970.Wires.Breaker import Breaker
+
+        d = cimread(RDFXML_FILE)
+        # Many-to-many associations.
+        breakers = [obj for obj in d.values() if isinstance(obj, Breaker)]
+        for i in range(3):
+            asset = d["_A%d" % i] = Asset(UUID="_A%d" % i)
+            psrs = d["_L%d" % i] = PsrList(UUID="_L%d" % i)
+            for breaker in breakers[i:]:
+                breaker.addAssets(asset)
+                psrs.addPowerSystemResources(breaker)
+
+        output = StringIO()
+        cimwrite(d, output)
+        text = output.getvalue()
+        output.seek(0)
+        dd = cimread(output)
+
+        self.assertEqual(references(dd), references(d))
+        # Each association is written from one end.
+        self.assertEqual(text.count("PowerSystemResource.Assets"), 21)
+        self.assertEqual(text.count("Asset.PowerSystemResources"), 0)
+        self.assertEqual(
+            text.count("PowerSystemResource.PsrLists") +
+            text.count("PsrList.PowerSystemResources"), 21)
+        self.assertEqual(text.count("ConnectivityNode.Terminals"), 0)
+
+    def testOutputs(self):
+        """Test writing strings, bytes and files.
+        """
+        import io
+        import os
+        import tempfile
+        from CIM15.IEC61970.Wires.Breaker import Breaker
+
+        d = cimread(RDFXML_FILE)
+        breaker = [obj for obj in d.values() if isinstance(obj, Breaker)][0]
+        breaker.name = u"<B&1> 'x' \"y\" \u00e9"
+        d["_E1"] = Breaker(UUID="_E1")
+
+        output = StringIO()
+        cimwrite(d, output)
+        text = output.getvalue()
+        self.assertTrue(u'<cim:Breaker rdf:ID="_E1" />' in text)
+        self.assertTrue(u"&lt;B&amp;1&gt; 'x' \"y\" \u00e9" in text)
+
+        output = io.BytesIO()
+        cimwrite(d, output)
+        self.assertEqual(output.getvalue(), text.encode("utf-8"))
+
+        output = io.BytesIO()
+        cimwrite(d, output, "us-ascii")
+        self.assertTrue(b"'x' \"y\" &#233;" in output.getvalue())
+
+        fd, path = tempfile.mkstemp(".xml")
+        os.close(fd)
+        try:
+            cimwrite(d, path)
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), text.encode("utf-8"))
+            dd = cimread(path)
+        finally:
+            os.remove(path)
+        self.assertEqual(dd[breaker.UUID].name, breaker.name)
+
+        output = StringIO()
+        cimwrite({}, output)
+        self.assertTrue(output.getvalue().endswith(u"#\" />"))
+
+    def testParallel(self):
+        """Test serialising objects in worker processes.
+        """
+        import io
+
+        d = cimread(RDFXML_FILE)
+        expected = io.BytesIO()
+        cimwrite(d, expected)
+
+        for processes in (1, 3):
+            output = io.BytesIO()
+            cimwrite(d, output, processes=processes)
+            self.assertEqual(output.getvalue(), expected.getvalue())
+
+        output = StringIO()
+        cimwrite(d, output, processes=2)
+        self.assertEqual(output.getvalue().encode("utf-8"),
+                         expected.getvalue())
+
+        output = StringIO()
+        cimwrite({}, output, processes=2)
+        self.assertTrue(output.getvalue().endswith(u"#\" />"))
+
+    def testIterable(self):
+        """Test streaming objects from a generator.
+        """
+        import io
+        from CIM15.IEC61970.Core.Terminal import Terminal
+
+        d = cimread(RDFXML_FILE)
+        expected = io.BytesIO()
+        cimwrite(d, expected)
+
+        output = io.BytesIO()
+        cimwrite((obj for obj in d.values()), output)
+        self.assertEqual(output.getvalue(), expected.getvalue())
+
+        output = io.BytesIO()
+        cimwrite(iter(list(d.values())), output, processes=2)
+        self.assertEqual(output.getvalue(), expected.getvalue())
+
+        output = io.BytesIO()
+        cimwrite(iter([]), output)
+        self.assertTrue(output.getvalue().endswith(b"#\" />"))
+
+        # Objects are written while the generator is consumed.
+        yielded = []
+        writes = []
+
+        class Output(io.RawIOBase):
+            def writable(self):
+                return True
+
+            def write(self, data):
+                writes.append(len(yielded))
+                return len(data)
+
+        def terminals(n):
+            for i in range(n):
+                yielded.append(i)
+                yield Terminal(UUID="_T%d" % i, sequenceNumber=i + 1)
+
+        cimwrite(terminals(20000), Output())
+        self.assertTrue(len(writes) > 3)
+        self.assertTrue(writes[1] < 20000)
+
+    def testCount(self):
+        """Test the number of objects serialised.
+        """
+        import io
+        import logging
+        from PyCIM.RDFXMLWriter import _serialise, logger
+
+        d = cimread(RDFXML_FILE)
+        blocks = []
+        self.assertEqual(_serialise(d.values(), blocks.append), len(d))
+        self.assertEqual(_serialise([], blocks.append), 0)
+
+        messages = []
+        handler = logging.Handler()
+        handler.emit = lambda record: messages.append(record.getMessage())
+        logger.addHandler(handler)
+        level = logger.level
+        logger.setLevel(logging.INFO)
+        try:
+            for processes in (None, 2):
+                cimwrite(d, io.BytesIO(), processes=processes)
+        finally:
+            logger.removeHandler(handler)
+            logger.setLevel(level)
+        self.assertEqual(len(messages), 2)
+        for message in messages:
+            self.assertTrue(message.startswith("%d CIM objects" % len(d)))
+
+    def testCompressed(self):
+        """Test writing compressed files.
+        """
+        import io
+        import os
+        import shutil
+        import tempfile
+
+        d = cimread(RDFXML_FILE)
+        expected = io.BytesIO()
+        cimwrite(d, expected)
+
+        tmp = tempfile.mkdtemp()
+        try:
+            for name in ("model.xml.gz", "model.xml.bz2", "model.xml.xz",
+                         "model.zip"):
+                path = os.path.join(tmp, name)
+                cimwrite(d, path)
+                dd = cimread(path)
+                self.assertEqual(references(dd), references(d))
+
+            import zipfile
+            archive = zipfile.ZipFile(os.path.join(tmp, "model.zip"))
+            self.assertEqual(archive.namelist(), ["model.xml"])
+            self.assertEqual(archive.read("model.xml"),
+                             expected.getvalue())
+            archive.close()
+
+            import gzip
+            sizes = []
+            for level in (1, 9):
+                path = os.path.join(tmp, "model%d.xml.gz" % level)
+                cimwrite(d.values(), path, compresslevel=level)
+                with gzip.open(path, "rb") as f:
+                    self.assertEqual(f.read(), expected.getvalue())
+                sizes.append(os.path.getsize(path))
+            self.assertTrue(sizes[0] > sizes[1])
+
+            # Path objects are written like the paths they stand for.
+            try:
+                from pathlib import Path
+            except ImportError:
+                return
+            for name in ("model.xml", "model.xml.gz", "model.zip"):
+                path = Path(tmp) / ("path-" + name)
+                cimwrite(d, path)
+                dd = cimread(str(path))
+                self.assertEqual(references(dd), references(d))
+            archive = zipfile.ZipFile(os.path.join(tmp, "path-model.zip"))
+            self.assertEqual(archive.namelist(), ["path-model.xml"])
+            archive.close()
+        finally:
+            shutil.rmtree(tmp)
+
+    def testPublicLists(self):
+        """Test many valued references that are plain lists.
+        """
+        import CIM14
+        from CIM15 import nsURI
+        from CIM14.IEC61970.Protection.CurrentRelay import CurrentRelay
+        from CIM14.IEC61970.Wires.Breaker import Breaker
+
+        breakers = [Breaker(UUID="_B1"), Breaker(UUID="_B2")]
+        relay = CurrentRelay(UUID="_R1", highLimit=5.0,
+                             ProtectedSwitches=breakers)
+        d = dict((obj.UUID, obj) for obj in breakers + [relay])
+
+        output = StringIO()
+        cimwrite(d, output)
+        output.seek(0)
+        d = cimread(output, CIM14.packageMap, nsURI)
+        relay = d["_R1"]
+        self.assertTrue(relay.__class__ is CurrentRelay)
+        self.assertEqual(relay.highLimit, 5.0)
+        self.assertEqual(relay.ProtectedSwitches, [d["_B1"], d["_B2"]])
+
+    def testPlan(self):
+        """Test the serialisation plans of classes.
+        """
+        from CIM15 import nsURI
+        from CIM15.IEC61970.Core.Terminal import Terminal
+        from PyCIM.RDFXMLWriter import serialisation_plan, \
+            ATTRIBUTE, ENUM, REFERENCE
+
+        plan = serialisation_plan(Terminal)
+        self.assertTrue(serialisation_plan(Terminal) is plan)
+        self.assertEqual(plan.tag, "cim:Terminal")
+
+        entries = dict((attr, (tag, value, kind))
+                       for tag, attr, value, kind in plan.attributes)
+        self.assertEqual(entries["name"],
+                         ("cim:IdentifiedObject.name", "", ATTRIBUTE))
+        self.assertEqual(entries["phases"],
+                         ("cim:Terminal.phases", nsURI + "#PhaseCode.", ENUM))
+        self.assertEqual(entries["ConnectivityNode"],
+                         ("cim:Terminal.ConnectivityNode", None, REFERENCE))
+        # Attributes first, then enumerations and references.
+        kinds = [kind for _, _, _, kind in plan.attributes]
+        self.assertEqual(kinds, sorted(kinds))
+
+        # Many ends of one-to-many associations are not serialised.
+        from CIM15.IEC61970.Wires.Breaker import Breaker
+        many = dict(serialisation_plan(Breaker).many)
+        self.assertEqual(many["cim:PowerSystemResource.Assets"], "_Assets")
+        self.assertFalse("cim:ConductingEquipment.Terminals" in many)
+
 
 if __name__ == "__main__":
     import logging
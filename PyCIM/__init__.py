@@ -18,7 +18,11 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 # IN THE SOFTWARE.
 
-from PyCIM.RDFXMLReader import cimread
+from PyCIM.RDFXMLReader import cimread, cimiter, cimread_many, CIMFeedParser, \
+    ReaderStats, ReaderIssues, sniff
 from PyCIM.RDFXMLWriter import cimwrite
+from PyCIM.ClassRegistry import class_registry
+from PyCIM.ModelCache import ModelCache
+from PyCIM.DifferenceModel import apply_difference
 
 __version__ = "15.15.0"